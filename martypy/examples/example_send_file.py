@@ -50,23 +50,12 @@ def progressCB(bytesSent, totalBytes):
     logging.info(f"Progress {bytesSent}/{totalBytes}")
     return True
 
-# Debug
-logging.info(f"Deleting file {fileName}")
-
-# Delete file initially
-result = my_marty.delete_file(fileName)
-if not result:
-    logging.warning(f"Error deleting file {fileName}")
-    sys.exit(1)
-
-# Debug
-logging.info(f"File {fileName} deleted successfully")
-
 # Debug
 logging.info(f"Sending file {fileName}")
 
-# Send a file to marty's file system
-my_marty.send_file(cur_path.joinpath(fileName), progressCB)
+# Send a file to marty's file system - skip_if_same means the file isn't sent again
+# if this Marty already has an identical copy (and an interrupted upload is resumed)
+my_marty.send_file(cur_path.joinpath(fileName), progressCB, skip_if_same=True)
 
 # Debug
 logging.info(f"File sent - getting file list")
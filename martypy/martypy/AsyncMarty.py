@@ -0,0 +1,122 @@
+'''
+asyncio interface to Marty the Robot V2 by Robotical
+
+```python
+import asyncio
+from martypy import AsyncMarty
+
+async def main():
+    my_marty = await AsyncMarty.create("wifi", "192.168.0.53")
+    await my_marty.dance()
+    await my_marty.close()
+
+asyncio.run(main())
+```
+'''
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional
+from .Marty import Marty
+from .AsyncRICInterface import AsyncRICInterface
+from .RICCommsAsyncSerial import RICCommsAsyncSerial
+from .RICCommsAsyncWiFi import RICCommsAsyncWiFi
+from .Exceptions import MartyConfigException
+
+class AsyncMarty:
+    '''
+    AsyncMarty
+    Mirrors the Marty API with each method being a coroutine. The connection is
+    serviced by the event loop (no reader or timer threads) and the Marty methods
+    run in order on a single worker thread so blocking moves don't hold up the loop.
+    Use create() to connect
+    '''
+    def __init__(self, marty: Marty, ricIF: AsyncRICInterface, executor: ThreadPoolExecutor) -> None:
+        '''
+        Use AsyncMarty.create() rather than constructing directly
+        '''
+        self._marty = marty
+        self._ricIF = ricIF
+        self._executor = executor
+
+    @classmethod
+    async def create(cls, method: str, locator: str = "",
+                blocking: Optional[bool] = None, *args, **kwargs) -> 'AsyncMarty':
+        '''
+        Connect to Marty V2 :two:
+        Args:
+            method: "wifi", "usb" or "exp" (see Marty)
+            locator: IP address, hostname or serial port
+            blocking: default movement command mode (see Marty)
+            port, wsPath, serialBaud and other keyword args are as for Marty
+        Returns:
+            AsyncMarty
+        Raises:
+            * MartyConfigException if the parameters are invalid
+            * MartyConnectException if Marty couldn't be contacted
+        '''
+        if type(method) is not str:
+            raise MartyConfigException("Method must be one of 'wifi', 'usb' or 'exp'")
+        if '://' in method:
+            method, _, locator = method.partition('://')
+        method = method.lower()
+        if method == "wifi":
+            rifConfig = {
+                "ipAddrOrHostname": locator,
+                "ipPort": kwargs.pop("port", 80),
+                "wsPath": kwargs.pop("wsPath", "/ws"),
+            }
+            ricIF = AsyncRICInterface(RICCommsAsyncWiFi())
+        elif method == "usb" or method == "exp":
+            serialBaud = kwargs.pop("serialBaud", None)
+            if serialBaud is None:
+                serialBaud = 115200 if method == "usb" else 921600
+            rifConfig = {
+                "serialPort": locator,
+                "serialBaud": serialBaud,
+                "ifType": "overascii" if method == "usb" else "plain",
+            }
+            ricIF = AsyncRICInterface(RICCommsAsyncSerial())
+        else:
+            raise MartyConfigException(f'Unrecognised method "{method}"')
+
+        # Open the connection on the event loop then get Marty details on the worker thread
+        await ricIF.openAsync(rifConfig)
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncMarty")
+        try:
+            marty = await asyncio.get_running_loop().run_in_executor(executor,
+                        partial(Marty, method, locator, *args, blocking=blocking, ricInterface=ricIF, **kwargs))
+        except Exception:
+            executor.shutdown(wait=False)
+            await ricIF.closeAsync()
+            raise
+        return cls(marty, ricIF, executor)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._marty, name)
+        if not inspect.ismethod(attr):
+            return attr
+        async def callOnWorker(*args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(self._executor, partial(attr, *args, **kwargs))
+        callOnWorker.__name__ = name
+        callOnWorker.__doc__ = attr.__doc__
+        return callOnWorker
+
+    async def send_ric_rest_cmd_sync(self, ricRestCmd: str) -> Dict:
+        '''
+        Send a command in RIC REST format to Marty and await the response :two:
+        Args:
+            ricRestCmd: string containing the command to send to Marty
+        Returns:
+            Dictionary containing the response received from Marty
+        '''
+        return await self._ricIF.cmdRICRESTURLAsync(ricRestCmd)
+
+    async def close(self) -> None:
+        '''
+        Close connection to Marty
+        '''
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._marty.close)
+        await self._ricIF.closeAsync()
+        self._executor.shutdown(wait=False)
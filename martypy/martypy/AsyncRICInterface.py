@@ -0,0 +1,109 @@
+'''
+AsyncRICInterface
+'''
+import asyncio
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+from .RICInterface import RICInterface
+from .RICCommsAsyncBase import RICCommsAsyncBase
+from .RICScheduler import RICLoopScheduler
+
+class AsyncRICInterface(RICInterface):
+    '''
+    AsyncRICInterface
+    RICInterface for an asyncio connection (RICCommsAsyncWiFi or RICCommsAsyncSerial)
+    with awaitable commands - message time-outs and the timer callback are run on the
+    event loop rather than by the scheduler thread. The blocking methods of RICInterface may still be used
+    from threads other than the event loop's
+    '''
+    def __init__(self, commsHandler: RICCommsAsyncBase) -> None:
+        '''
+        Initialise AsyncRICInterface
+        '''
+        super().__init__(commsHandler, RICLoopScheduler())
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __del__(self) -> None:
+        pass
+
+    async def openAsync(self, openParams: Dict) -> bool:
+        '''
+        Open interface to RIC from the event loop
+        Args:
+            openParams: dict containing params used to open the connection
+                    (see RICCommsBase and derived classes for details)
+        Returns:
+            True if open succeeded or port is already open
+        Throws:
+            MartyConnectException: if the connection cannot be opened
+        '''
+        self._loop = asyncio.get_running_loop()
+        self._scheduler.setLoop(self._loop)
+        self.commsHandler.setRxFrameCB(self._onRxFrameCB)
+        self.commsHandler.setRxLogLineCB(self._onLogLineCB)
+        self.commsHandler.setScheduler(self._scheduler)
+        openOk = await self.commsHandler.openAsync(openParams)
+        self.msgRespTimeoutSecs = self.commsHandler.getMsgRespTimeoutSecs(self.msgRespTimeoutSecs)
+        self._startTimer()
+        return openOk
+
+    async def closeAsync(self) -> None:
+        '''
+        Close interface to RIC from the event loop
+        '''
+        if self._timerJob is not None:
+            self._timerJob.cancel()
+            self._timerJob = None
+        await self.commsHandler.closeAsync()
+
+    def open(self, openParams: Dict) -> bool:
+        if self._loop is None:
+            self._loop = self.commsHandler._loop
+            self._scheduler.setLoop(self._loop)
+        return super().open(openParams)
+
+    async def cmdRICRESTURLAsync(self, msg: str, timeOutSecs: Optional[float] = None) -> Dict:
+        '''
+        Send RICREST URL message and await the response
+        Args:
+            msg: string containing command URL
+            timeOutSecs: message time-out override in seconds (or None to use default)
+        Returns:
+            Response turned into a dictionary (from JSON)
+        '''
+        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
+        return await self._awaitResult(self.submit(msg, timeOutSecs), timeOutSecs)
+
+    async def cmdRICRESTRsltAsync(self, msg: str, timeOutSecs: Optional[float] = None) -> bool:
+        '''
+        Send RICREST URL message and await the response
+        Args:
+            msg: string containing command URL
+            timeOutSecs: message time-out override in seconds (or None to use default)
+        Returns:
+            True if the response has rslt ok
+        '''
+        response = await self.cmdRICRESTURLAsync(msg, timeOutSecs)
+        return response.get("rslt", "") == "ok"
+
+    async def gatherResultsAsync(self, futures: List[Future], timeOutSecs: Optional[float] = None) -> List[Dict]:
+        '''
+        Await the responses to messages sent using submit()
+        Args:
+            futures: futures returned by submit()
+            timeOutSecs: maximum time to wait for all responses (or None to use
+                twice the default message time-out)
+        Returns:
+            List of responses in the same order as futures
+        '''
+        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs * 2
+        return list(await asyncio.gather(*[self._awaitResult(future, timeOutSecs) for future in futures]))
+
+    async def _awaitResult(self, future: Future, timeOutSecs: float) -> Dict:
+        # Nothing more to send before waiting so don't hold back coalesced frames
+        self.commsHandler.flush()
+        # Shielded so that a time-out here doesn't cancel the future the rx side completes
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeOutSecs)
+        except asyncio.TimeoutError:
+            return {"rslt":"failTimeout"}
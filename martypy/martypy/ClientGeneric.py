@@ -401,9 +401,14 @@ class ClientGeneric(ABC):
     @abstractmethod
     def send_file(self, filename: str, 
                 progress_callback: Callable[[int, int], bool] = None,
-                file_dest:str = "fs") -> bool:
+                file_dest:str = "fs", skip_if_same: bool = False) -> bool:
         return False
 
+    @abstractmethod
+    def get_transfer_manager(self,
+                progress_callback: Callable[[Dict, object], None] = None) -> object:
+        return None
+
     @abstractmethod
     def play_mp3(self, filename: str,
                 progress_callback: Callable[[int, int], bool] = None) -> bool:
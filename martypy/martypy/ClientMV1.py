@@ -874,7 +874,11 @@ class ClientMV1(ClientGeneric):
 
     def send_file(self, filename: str,
                 progress_callback: Callable[[int, int], bool] = None,
-                file_dest:str = "fs") -> bool:
+                file_dest:str = "fs", skip_if_same: bool = False) -> bool:
+        raise MartyCommandException(ClientGeneric.NOT_IMPLEMENTED)
+
+    def get_transfer_manager(self,
+                progress_callback: Callable[[Dict, object], None] = None) -> object:
         raise MartyCommandException(ClientGeneric.NOT_IMPLEMENTED)
 
     def play_mp3(self, filename: str,
@@ -1,6 +1,5 @@
 import logging
 import os
-import time
 import re
 from typing import Callable, Dict, List, Optional, Union, Tuple
 from packaging import version
@@ -9,9 +8,13 @@ from .ClientGeneric import ClientGeneric
 from .RICCommsSerial import RICCommsSerial
 from .RICCommsWiFi import RICCommsWiFi
 from .RICCommsTest import RICCommsTest
+from .RICCommsSim import RICCommsSim
 from .RICProtocols import DecodedMsg, RICProtocols
 from .RICROSSerial import RICROSSerial
+from .RICClock import RICClock
 from .RICInterface import RICInterface
+from .RICUploadManifest import RICUploadManifest
+from .RICTransferManager import RICTransferManager
 from .RICHWElems import RICHWElems
 from .Exceptions import (MartyConnectException,
                          MartyCommandException)
@@ -31,24 +34,33 @@ class ClientMV2(ClientGeneric):
                 wsPath = "/ws",
                 subscribeRateHz = 10.0,
                 ricInterface: Optional[RICInterface] = None,
+                clock: Optional[RICClock] = None,
                 *args, **kwargs):
         '''
         Initialise connection to remote Marty
         Args:
             client_type: 'wifi' (for WiFi), 'usb' (for usb serial), 'exp' (for expansion serial),
-                'test' (output is available via get_test_output())
+                'test' (output is available via get_test_output()), 'sim' (simulated Marty)
             locator: str, ipAddress, hostname, serial-port, name of test file etc
                     depending on method
             serialBaud: serial baud rate
             port: IP port for websockets
             wsPath: path to use for websocket connection
             subscribeRateHz: rate of fastest subscription to events
+            clock: clock for time-outs and waits (None for real time) - a RICVirtualClock
+                with method 'sim' runs a simulated Marty faster than real time
         Raises:
             MartyConnectException if the connection to the host failed
         '''
         # Call base constructor
         super().__init__(*args, **kwargs)
 
+        # Clock - a RICInterface that is passed in brings its own
+        if clock is not None:
+            self.clock = clock
+        else:
+            self.clock = ricInterface.clock if ricInterface is not None else RICClock()
+
         # Initialise vars
         self.subscribeRateHz = subscribeRateHz
         self.lastRICSerialMsgTime = None
@@ -56,7 +68,7 @@ class ClientMV2(ClientGeneric):
         self.maxTimeBetweenPubs = 10
         self.minTimeBetweenSubReqs = 10
         self.max_blocking_wait_time = 120  # seconds
-        self.ricHardware = RICHWElems()
+        self.ricHardware = RICHWElems(self.clock)
         self.isClosing = False
         self.ricSystemInfo = {}
         self.ricHwElemsInfoByIDNo = {}
@@ -71,6 +83,8 @@ class ClientMV2(ClientGeneric):
         self._numHwStatusRetries = 10
         self._sendFileProgressCB = None
         self._playMP3ProgressCB = None
+        self.uploadManifest = RICUploadManifest()
+        self._transferManager: Optional[RICTransferManager] = None
         # Debug
         self.DEBUG_RECEIVE_PUBLISHED_MSG = False
         self.DEBUG_RECEIVE_RICREST_MSGS = False
@@ -101,12 +115,15 @@ class ClientMV2(ClientGeneric):
                     "serialBaud": serialBaud,
                     "ifType": ifType,
                 }
-                self.ricIF = RICInterface(RICCommsSerial())
+                self.ricIF = RICInterface(RICCommsSerial(), clock=clock)
             elif method == "test":
                 rifConfig = {
                     "testFileName": locator
                 }
-                self.ricIF = RICInterface(RICCommsTest())
+                self.ricIF = RICInterface(RICCommsTest(), clock=clock)
+            elif method == "sim":
+                rifConfig = {}
+                self.ricIF = RICInterface(RICCommsSim(clock=clock), clock=clock)
             else:
                 rifConfig = {
                     "ipAddrOrHostname": locator,
@@ -114,7 +131,7 @@ class ClientMV2(ClientGeneric):
                     "wsPath": wsPath,
                     "ifType": "plain"
                 }
-                self.ricIF = RICInterface(RICCommsWiFi(self._onReconnect))
+                self.ricIF = RICInterface(RICCommsWiFi(self._onReconnect), clock=clock)
         else:
             rifConfig = {
                 "ipAddrOrHostname": locator,
@@ -123,7 +140,7 @@ class ClientMV2(ClientGeneric):
             self.ricIF = ricInterface
 
         # Debug
-        ricConnStartTime = time.time()
+        ricConnStartTime = self.clock.time()
         if self.DEBUG_CONNECTION_PROCESS:
             logger.debug("Starting to connect to RIC")
 
@@ -134,7 +151,7 @@ class ClientMV2(ClientGeneric):
 
         # Debug
         if self.DEBUG_CONNECTION_PROCESS:
-            logger.debug(f"RIC interface connection took {time.time() - ricConnStartTime} seconds")
+            logger.debug(f"RIC interface connection took {self.clock.time() - ricConnStartTime} seconds")
 
         # Callbacks
         self.ricIF.setDecodedMsgCB(self._rxDecodedMsg)
@@ -143,8 +160,8 @@ class ClientMV2(ClientGeneric):
 
     def start(self):
         # Debug
-        debugRICOverallStart = time.time()
-        debugStartTime = time.time()
+        debugRICOverallStart = self.clock.time()
+        debugStartTime = self.clock.time()
         if self.DEBUG_CONNECTION_PROCESS:
             logger.debug("Starting to communicate with RIC")
 
@@ -153,15 +170,15 @@ class ClientMV2(ClientGeneric):
 
         # Debug
         if self.DEBUG_CONNECTION_PROCESS:
-            logger.debug(f"Got RIC version in {time.time() - debugStartTime} seconds")
-        debugStartTime = time.time()
+            logger.debug(f"Got RIC version in {self.clock.time() - debugStartTime} seconds")
+        debugStartTime = self.clock.time()
 
         # Get HWElems
         self._updateHwElemsInfo()
 
         # Debug
         if self.DEBUG_CONNECTION_PROCESS:
-            logger.debug(f"Got HWElems in {time.time() - debugStartTime} seconds")
+            logger.debug(f"Got HWElems in {self.clock.time() - debugStartTime} seconds")
 
         # Now completed init
         self._initComplete = True
@@ -170,23 +187,23 @@ class ClientMV2(ClientGeneric):
         # self._updateHwElemsInfo()
 
         # Wait for connection to be ready
-        waitStartTime = time.time()
+        waitStartTime = self.clock.time()
         while not self.is_conn_ready():
-            if time.time() - waitStartTime > self.maxWaitForConnReadySecs:
+            if self.clock.time() - waitStartTime > self.maxWaitForConnReadySecs:
                 raise MartyConnectException("Connection to Marty not ready")
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
 
         # Debug
         if self.DEBUG_CONNECTION_PROCESS:
-            logger.debug(f"Marty wait for ready time {time.time() - debugStartTime} seconds")
+            logger.debug(f"Marty wait for ready time {self.clock.time() - debugStartTime} seconds")
 
         # A flag is set on the first subscribed message - wait a little longer
         # to ensure that one of each subscribed message type has been received
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
 
         # Debug
         if self.DEBUG_CONNECTION_PROCESS:
-            logger.debug(f"Marty overall start time {time.time() - debugRICOverallStart} seconds")
+            logger.debug(f"Marty overall start time {self.clock.time() - debugRICOverallStart} seconds")
 
     def close(self):
         if self.isClosing:
@@ -194,6 +211,9 @@ class ClientMV2(ClientGeneric):
         self.isClosing = True
         # Send unsubscribe request
         self._unsubscribeFromPubMessages()
+        # Cancel queued uploads
+        if self._transferManager is not None:
+            self._transferManager.close()
         # Close the RIC interface
         self.ricIF.close()
 
@@ -203,14 +223,14 @@ class ClientMV2(ClientGeneric):
         if self.subscribeRateHz <= 0:
             return
 
-        deadline = time.time() + expected_wait_ms/1000 + self.max_blocking_wait_time
-        time.sleep(2.5 * 1/self.subscribeRateHz)  # Give Marty time to report it is moving
+        deadline = self.clock.time() + expected_wait_ms/1000 + self.max_blocking_wait_time
+        self.clock.sleep(2.5 * 1/self.subscribeRateHz)  # Give Marty time to report it is moving
 
         # The is_moving flag may be cleared briefly between 2 queued trajectories
         # Robot status may not be available for a while after Marty is turned on / connected to
         while self.is_moving() or self.get_robot_status().get('workQCount', 1) > 0:
-            time.sleep(0.2 * 1/self.subscribeRateHz)
-            if time.time() > deadline:
+            self.clock.sleep(0.2 * 1/self.subscribeRateHz)
+            if self.clock.time() > deadline:
                 raise TimeoutError("Marty wouldn't stop moving. Are you also controlling it via another method?"
                                    f"{os.linesep}If you issued some very long-running non-blocking commands, "
                                    "try increasing `marty.client.max_blocking_wait_time` (the current value "
@@ -247,7 +267,10 @@ class ClientMV2(ClientGeneric):
         return self.ricIF.cmdRICRESTRslt(f"traj/hold?moveTime={hold_time}")
 
     def move_joint(self, joint_id: int, position: int, move_time: int) -> bool:
-        return self.ricIF.cmdRICRESTRslt(f"traj/joint?jointID={joint_id}&angle={position}&moveTime={move_time}")
+        return self.ricIF.cmdRICRESTRslt(self._move_joint_cmd(joint_id, position, move_time))
+
+    def _move_joint_cmd(self, joint_id: int, position: int, move_time: int) -> str:
+        return f"traj/joint?jointID={joint_id}&angle={position}&moveTime={move_time}"
 
     def get_joint_position(self, joint_id: Union[int, str]) -> float:
         return self.ricHardware.getServoPos(joint_id, self.ricHwElemsInfoByIDNo)
@@ -323,8 +346,10 @@ class ClientMV2(ClientGeneric):
         return self.ricIF.cmdRICRESTRslt(f"traj/kick?side={ClientGeneric.SIDE_CODES[side]}&moveTime={move_time}&turn={twist}")
 
     def arms(self, left_angle: int, right_angle: int, move_time: int) -> bool:
-        self.move_joint(6, left_angle, move_time)
-        return self.move_joint(7, right_angle, move_time)
+        # Both joints are commanded without waiting for the first response
+        futures = [self.ricIF.submit(self._move_joint_cmd(6, left_angle, move_time)),
+                   self.ricIF.submit(self._move_joint_cmd(7, right_angle, move_time))]
+        return self.ricIF.gatherRslt(futures)
 
     def celebrate(self, move_time: int = 4000) -> bool:
 
@@ -469,7 +494,7 @@ class ClientMV2(ClientGeneric):
             addon_statuses = self.get_add_ons_status().values()
             if len(addon_statuses) != 0:
                 break
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
 
         # Get the add-on values
         for attached_add_on in addon_statuses:
@@ -519,7 +544,7 @@ class ClientMV2(ClientGeneric):
             addon_statuses = self.get_add_ons_status().values()
             if len(addon_statuses) != 0:
                 break
-            time.sleep(0.1)
+            self.clock.sleep(0.1)
 
         # Get the add-on values
         for attached_add_on in addon_statuses:
@@ -863,14 +888,22 @@ class ClientMV2(ClientGeneric):
             True if Marty accepted all requests
         '''
         result = True
-        # if any of the whoamis is equal to "00000089" then 
-        # we need to also send to LEDeye in case the new LEDeyes (batch 4) are connected
-        if "00000089" in whoamis and api == 'led':
-            result = result and disco_operation(add_on="LEDeye", **operation_kwargs)
-        for attached_add_on in self.get_add_ons_status().values():
-            if type(attached_add_on) == dict and attached_add_on['whoAmI'] in whoamis:
-                addon_name = attached_add_on['name']
-                result = result and disco_operation(add_on=addon_name, **operation_kwargs)
+        # LED api commands to different add ons are independent so they are sent as a
+        # batch and all of the responses are awaited together
+        if api == 'led':
+            self.ricIF.startCmdBatch()
+        try:
+            # if any of the whoamis is equal to "00000089" then 
+            # we need to also send to LEDeye in case the new LEDeyes (batch 4) are connected
+            if "00000089" in whoamis and api == 'led':
+                result = result and disco_operation(add_on="LEDeye", **operation_kwargs)
+            for attached_add_on in self.get_add_ons_status().values():
+                if type(attached_add_on) == dict and attached_add_on['whoAmI'] in whoamis:
+                    addon_name = attached_add_on['name']
+                    result = result and disco_operation(add_on=addon_name, **operation_kwargs)
+        finally:
+            if api == 'led':
+                result = self.ricIF.endCmdBatch() and result
         return result
 
     def disco_color_led_api(self, color: Union[str, Tuple[int, int, int]], add_on: str, region: Union[int, str]) -> bool:
@@ -1035,6 +1068,9 @@ class ClientMV2(ClientGeneric):
         ricIFStats = self.ricIF.getStats()
         publishInfo = self.ricHardware.getPublishStats()
         ricIFStats.update(publishInfo)
+        for windowSecs in RICInterface.STATS_WINDOWS_SECS:
+            ricIFStats["windowStats"][f"{windowSecs}s"]["publishRatesPS"] = \
+                        self.ricHardware.getPublishRates(windowSecs)
         return ricIFStats
 
     def preException(self, isFatal: bool) -> None:
@@ -1046,7 +1082,7 @@ class ClientMV2(ClientGeneric):
         if decodedMsg.protocolID == RICProtocols.PROTOCOL_ROSSERIAL:
             if self.DEBUG_RECEIVE_PUBLISHED_MSG:
                 logger.debug(f"ROSSERIAL message received {len(decodedMsg.payload)}")
-            self.lastRICSerialMsgTime = time.time()
+            self.lastRICSerialMsgTime = self.clock.time()
             if decodedMsg.payload:
                 RICROSSerial.decode(decodedMsg.payload, 0, self._rxPublishedMsg)
         elif decodedMsg.protocolID == RICProtocols.PROTOCOL_RICREST:
@@ -1117,8 +1153,8 @@ class ClientMV2(ClientGeneric):
 
     def _subscribeToPubMessages(self, forceResubscribe: bool):
         versOk = self._systemVersionGtEq(self._minSysVersForSubscribeAPI)
-        timeForSubscr = self.lastRICSerialMsgTime is None or time.time() > self.lastRICSerialMsgTime + self.maxTimeBetweenPubs
-        resubscrReqd = self.lastSubscrReqMsgTime is None or time.time() > self.lastSubscrReqMsgTime + self.minTimeBetweenSubReqs
+        timeForSubscr = self.lastRICSerialMsgTime is None or self.clock.time() > self.lastRICSerialMsgTime + self.maxTimeBetweenPubs
+        resubscrReqd = self.lastSubscrReqMsgTime is None or self.clock.time() > self.lastSubscrReqMsgTime + self.minTimeBetweenSubReqs
         if versOk and self._initComplete and self.subscribeRateHz != 0 and (forceResubscribe or (timeForSubscr and resubscrReqd)):
             # Subscribe for publication messages
             if self.DEBUG_SUBSCRIBE_TO_PUB_MSGS:
@@ -1129,7 +1165,7 @@ class ClientMV2(ClientGeneric):
                                 '{"name":"PowerStatus","rateHz":1.0},' + \
                                 '{' + f'"name":"AddOnStatus","rateHz":{self.subscribeRateHz}' + '}' + \
                             ']}')
-            self.lastSubscrReqMsgTime = time.time()
+            self.lastSubscrReqMsgTime = self.clock.time()
 
     def _unsubscribeFromPubMessages(self):
         # Send unsubscribe request
@@ -1140,7 +1176,7 @@ class ClientMV2(ClientGeneric):
                 '{"name":"AddOnStatus","rateHz":0}' + \
             ']}')
         # Allow message to be sent
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
 
     def _onReconnect(self):
         self._subscribeToPubMessages(True)
@@ -1153,9 +1189,51 @@ class ClientMV2(ClientGeneric):
 
     def send_file(self, filename: str,  
                 progress_callback: Callable[[int, int], bool] = None,
-                file_dest:str = "fs") -> bool:
+                file_dest:str = "fs", skip_if_same: bool = False) -> bool:
         self._sendFileProgressCB = progress_callback
-        return self.ricIF.sendFile(filename, self._sendFileProgressAdapter, file_dest)
+        robotId = self._getRobotId()
+        if not skip_if_same or file_dest != "fs" or not robotId:
+            return self.ricIF.sendFile(filename, self._sendFileProgressAdapter, file_dest)
+
+        # Check the manifest of files this robot has received
+        uploadName = os.path.basename(filename)
+        fileLen, fileHash = RICUploadManifest.getFileDigest(filename)
+        fileRec = self.uploadManifest.get(robotId, uploadName)
+        resumeFrom = 0
+        if fileRec is not None and fileRec.get("size") == fileLen and fileRec.get("sha256") == fileHash:
+            if fileRec.get("okTo", 0) < fileLen:
+                resumeFrom = fileRec.get("okTo", 0)
+            elif any(fileInfo.get("name") == uploadName and fileInfo.get("size") == fileLen
+                        for fileInfo in self.get_file_list()):
+                # The robot still has an identical file
+                if progress_callback:
+                    progress_callback(fileLen, fileLen)
+                return True
+
+        # Send (or resume) keeping track of how much is acknowledged so an interrupted
+        # upload can be resumed (from the same place if it fails before any progress)
+        okTo = resumeFrom
+        def progressAdapter(bytesSent: int, totalBytes: int, ricIF: RICInterface) -> bool:
+            nonlocal okTo
+            okTo = bytesSent
+            return self._sendFileProgressAdapter(bytesSent, totalBytes, ricIF)
+        sendOk = False
+        try:
+            sendOk = self.ricIF.sendFile(filename, progressAdapter, file_dest, resumeFrom=resumeFrom)
+        finally:
+            self.uploadManifest.record(robotId, uploadName, fileLen, fileHash, fileLen if sendOk else okTo)
+        return sendOk
+
+    def get_transfer_manager(self,
+                progress_callback: Callable[[Dict, RICTransferManager], None] = None) -> RICTransferManager:
+        if self._transferManager is None:
+            self._transferManager = RICTransferManager(self.ricIF)
+        if progress_callback is not None:
+            self._transferManager.progressCB = progress_callback
+        return self._transferManager
+
+    def _getRobotId(self) -> str:
+        return self.ricSystemInfo.get("SerialNo", "") or self.ricSystemInfo.get("MAC", "")
 
     def _playMP3ProgressAdapter(self, fileSize: int, bytesSent: int,
                 progress_callback: Callable[[int, int, 'RICInterface'], bool] = None):
@@ -1176,7 +1254,11 @@ class ClientMV2(ClientGeneric):
 
     def delete_file(self, filename: str) -> bool:
         result = self.ricIF.cmdRICRESTURLSync(f"filedelete/local/{filename}", timeOutSecs=5)
-        return result.get("rslt", "") == "ok"
+        if result.get("rslt", "") != "ok":
+            return False
+        if self._getRobotId():
+            self.uploadManifest.remove(self._getRobotId(), filename)
+        return True
 
     def rgb_to_hex(self, rgb: Tuple[int, int, int]) -> str:
         """Convert an RGB color to its hexadecimal representation."""
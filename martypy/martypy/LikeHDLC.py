@@ -7,8 +7,12 @@ __version__ = '0.7.0'
 import logging
 import struct
 import time
+try:
+    from binascii import crc_hqx
+except ImportError:
+    crc_hqx = None
 from enum import Enum
-from typing import Callable, Union
+from typing import Callable, Dict, Union
 
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG)
@@ -17,8 +21,31 @@ class HDLCStats:
     '''
     HDLCStats - statistics on HDLC-like communication
     '''
-    crcErrors = 0
-    framesRxOk = 0
+    def __init__(self) -> None:
+        self.bytesIn = 0
+        self.framesRxOk = 0
+        self.crcErrors = 0
+        self.oversizeDrops = 0
+        self.resyncs = 0
+        self.escapesIn = 0
+
+    def getEscapeRatio(self) -> float:
+        '''
+        Proportion of received bytes that were escape codes
+        '''
+        if self.bytesIn == 0:
+            return 0
+        return self.escapesIn / self.bytesIn
+
+    def toDict(self) -> Dict:
+        return {
+            "bytesIn": self.bytesIn,
+            "framesRxOk": self.framesRxOk,
+            "crcErrors": self.crcErrors,
+            "oversizeDrops": self.oversizeDrops,
+            "resyncs": self.resyncs,
+            "escapeRatio": round(self.getEscapeRatio(), 4),
+        }
 
 class HDLCState(Enum):
     STATE_READ = 1
@@ -84,6 +111,7 @@ class Frame(object):
         self.error = False
         self.state = HDLCState.STATE_READ
         self.data = bytearray()
+        self.rawLen = 0
         self.crc = bytearray()
         self.reader = None
         self.delimiterCode = delimiterCode
@@ -102,6 +130,7 @@ class Frame(object):
         Returns:
             None
         '''
+        self.rawLen += 1
         if b == self.escapeCode:
             self.state = HDLCState.STATE_ESCAPE
         elif self.state == HDLCState.STATE_ESCAPE:
@@ -149,18 +178,23 @@ class LikeHDLC:
     '''
     HDLC-like with encode and decode capabilities
     To decode, construct LikeHDLC and supply onFrame callback -
-        then send data to decodeData() and onFrame
-        callback will be called for each frame decoded
+        then send data to decodeData() (a byte at a time) or decodeBuffer()
+        (a block at a time) and onFrame callback will be called for each frame decoded
     To encode use class method encode()
     The communications protocol is based on HDLC but with some simplifications:
     - byte-wise only, escape codes can be modified from standard
     - encoding and decoding only
+    Received frames longer than maxFrameLen (before un-escaping) are dropped and
+    the decoder discards data until the next delimiter
     '''
+    MAX_FRAME_LEN_DEFAULT = 20000
+
     def __init__(self, 
             onFrame: Callable[[Union[bytes, str]], None],
             onError: Callable[[], None],
             asciiEscapes: bool = False,
-            payloadsAreStrings: bool = False) -> None:
+            payloadsAreStrings: bool = False,
+            maxFrameLen: int = MAX_FRAME_LEN_DEFAULT) -> None:
         '''
         Initialise LikeHDLC
         Args:
@@ -168,16 +202,24 @@ class LikeHDLC:
             onError: callback function (0 parameters) when an error occurs
             asciiEscapes: bool - use the standard HDLC escape codes (which are ASCII values)
             payloadsAreStrings: bool - received frames are returned as strings (as opposed to bytes)
+            maxFrameLen: maximum received frame length in bytes (0 for no limit)
         Returns:
             None
         '''
         self.payloadsAreStrings = payloadsAreStrings
+        self.maxFrameLen = maxFrameLen
         self.onFrame = onFrame
         self.onError = onError
         self.asciiEscapes = asciiEscapes
         self.setAsciiEscapes(asciiEscapes)
         self.clear()
         self.clearStats()
+        # When traceTiming is set decodeBuffer() records (perf_counter_ns) when the
+        # block holding the start of the frame arrived and when the frame was complete
+        # - they are valid during the onFrame callback
+        self.traceTiming = False
+        self.frameRxStartNs = 0
+        self.frameRxEndNs = 0
 
     def setAsciiEscapes(self, asciiEscapes: bool = False) -> None:
         '''
@@ -203,6 +245,9 @@ class LikeHDLC:
             None
         '''
         self.currentFrame = None
+        self._bufInFrame = False
+        self._bufRawFrame = bytearray()
+        self._rxDiscarding = False
 
     def clearStats(self) -> None:
         '''
@@ -224,11 +269,15 @@ class LikeHDLC:
         '''
         if b < 0 or b > 255:
             return
+        self.stats.bytesIn += 1
+        if b == self.escapeCode:
+            self.stats.escapesIn += 1
         if b == self.delimiterCode:
             # Start or End
             if (self.currentFrame is None) or len(self.currentFrame) < 1:
                 # Start
                 self.currentFrame = Frame(self.delimiterCode, self.escapeCode)
+                self._rxDiscarding = False
                 # logger.debug(f"START time {time.time()}")
             else:
                 # End
@@ -240,22 +289,133 @@ class LikeHDLC:
                 if not self.currentFrame.finished:
                     # Add to current frame
                     self.currentFrame.addByte(b)
+                    if self.maxFrameLen and self.currentFrame.rawLen > self.maxFrameLen:
+                        self.currentFrame = None
+                        self._onOversizeFrame()
+            elif not self._rxDiscarding:
+                # Data outside a frame
+                self._rxDiscarding = True
+                self.stats.resyncs += 1
 
         # Validate and callback if finished
         if (self.currentFrame is not None) and self.currentFrame.finished:
             rxFrame = self.currentFrame
             self.currentFrame = None
-            if not rxFrame.error:
-                # Success
-                if self.payloadsAreStrings:
-                    self.onFrame(rxFrame.toString())
-                else:
-                    self.onFrame(rxFrame.data)
-                self.stats.framesRxOk += 1
-            elif rxFrame.finished:
-                # Error
-                self.stats.crcErrors += 1
-                self.onError()
+            self._handleFrame(rxFrame)
+
+    def decodeBuffer(self, buf: Union[bytes, bytearray, memoryview]) -> None:
+        '''
+        Add a block of bytes to be decoded
+        Delimiters are located with bytes.find() and escapes are removed a run at a
+        time so the per-byte cost is paid in C rather than Python. A partial frame
+        at the end of the block is held until the next call. Frames and statistics
+        are identical to feeding the same bytes to decodeData() one at a time but
+        the two methods keep separate partial-frame state so don't interleave them
+        Args:
+            buf: bytes to add
+        Returns:
+            None
+        '''
+        if isinstance(buf, memoryview):
+            buf = buf.tobytes()
+        rxTimeNs = time.perf_counter_ns() if self.traceTiming else 0
+        bufLen = len(buf)
+        self.stats.bytesIn += bufLen
+        self.stats.escapesIn += buf.count(self.escapeCode)
+        pos = 0
+        while pos < bufLen:
+            delimPos = buf.find(self.delimiterCode, pos)
+            if not self._bufInFrame:
+                # Discard anything before a start delimiter
+                if delimPos != pos and not self._rxDiscarding:
+                    self._rxDiscarding = True
+                    self.stats.resyncs += 1
+                if delimPos < 0:
+                    return
+                self._bufInFrame = True
+                self._rxDiscarding = False
+                self._bufRawFrame.clear()
+                if rxTimeNs:
+                    self.frameRxStartNs = rxTimeNs
+                pos = delimPos + 1
+                continue
+            runEnd = bufLen if delimPos < 0 else delimPos
+            if self.maxFrameLen and len(self._bufRawFrame) + runEnd - pos > self.maxFrameLen:
+                # Drop the frame - the delimiter (if any) then starts a new frame
+                self._bufInFrame = False
+                self._bufRawFrame.clear()
+                self._onOversizeFrame()
+                pos = runEnd
+                continue
+            if delimPos < 0:
+                # Frame continues in the next block
+                self._bufRawFrame += buf[pos:]
+                return
+            self._bufRawFrame += buf[pos:delimPos]
+            pos = delimPos + 1
+            frameData = self._unescape(self._bufRawFrame)
+            self._bufRawFrame.clear()
+            if len(frameData) < 1:
+                # Empty frame so treat the delimiter as a new start
+                continue
+            # End of frame
+            self._bufInFrame = False
+            rxFrame = Frame(self.delimiterCode, self.escapeCode)
+            rxFrame.data = frameData
+            rxFrame.finish()
+            rxFrame.checkCRC()
+            if rxTimeNs:
+                self.frameRxEndNs = time.perf_counter_ns()
+            self._handleFrame(rxFrame)
+
+    def _onOversizeFrame(self) -> None:
+        '''
+        Handle a frame that has exceeded maxFrameLen and been dropped
+        '''
+        self.stats.oversizeDrops += 1
+        self.stats.resyncs += 1
+        self._rxDiscarding = True
+        logger.debug(f"LikeHDLC frame exceeds max length {self.maxFrameLen} - dropped")
+        self.onError()
+
+    def _unescape(self, rawData: bytearray) -> bytearray:
+        '''
+        Remove escape codes from a block of raw frame data
+        Args:
+            rawData: frame data without delimiters
+        Returns:
+            unescaped data
+        '''
+        if self.escapeCode not in rawData:
+            return bytearray(rawData)
+        runs = rawData.split(bytes((self.escapeCode,)))
+        frameData = bytearray(runs[0])
+        for run in runs[1:]:
+            # Consecutive escape codes produce empty runs which add nothing
+            if run:
+                frameData.append(run[0] ^ 0x20)
+                frameData += run[1:]
+        return frameData
+
+    def _handleFrame(self, rxFrame: Frame) -> None:
+        '''
+        Callback and update stats for a finished frame
+        Args:
+            rxFrame: frame that has been finished and CRC checked
+        Returns:
+            None
+        '''
+        if not rxFrame.error:
+            # Success
+            if self.payloadsAreStrings:
+                self.onFrame(rxFrame.toString())
+            else:
+                self.onFrame(rxFrame.data)
+            self.stats.framesRxOk += 1
+        else:
+            # Error
+            self.stats.crcErrors += 1
+            self.onError()
 
     def getStats(self) -> HDLCStats:
         '''
@@ -280,22 +440,56 @@ class LikeHDLC:
         Returns:
             bytes representing the frame
         '''
-        delimiterCode = Frame.DELIMITER_CODE_ASCII if asciiEscapes \
-                    else Frame.DELIMITER_CODE_NON_ASCII
-        escapeCode = Frame.ESCAPE_CODE_ASCII if asciiEscapes \
-                    else Frame.ESCAPE_CODE_NON_ASCII
-        frame = bytearray()
-        frame.append(delimiterCode)
-        crc = cls.calcCRC(data)
-        data = data + crc
-        for byte in data:
-            if byte == delimiterCode or byte == escapeCode:
-                frame.append(escapeCode)
-                frame.append(byte ^ 0x20)
-            else:
-                frame.append(byte)
-        frame.append(delimiterCode)
-        return bytes(frame)
+        delimiterCode, escapeCode = cls._getCodes(asciiEscapes)
+        delimiter = bytes((delimiterCode,))
+        return b"".join((delimiter,
+                    cls._escape(data, delimiterCode, escapeCode),
+                    cls._escape(cls.calcCRC(data), delimiterCode, escapeCode),
+                    delimiter))
+
+    @classmethod
+    def encodeInto(cls, data: bytes, outBuf: bytearray, asciiEscapes: bool = False) -> int:
+        '''
+        Encode data into an HDLC-like frame written to a caller-supplied buffer
+        The buffer's previous contents are replaced so the same bytearray can be
+        reused for every frame sent
+
+        Args:
+            data: bytes representing the data
+            outBuf: bytearray to hold the frame
+            asciiEscapes: use the standard HDLC escape codes
+
+        Returns:
+            length of the frame in outBuf
+        '''
+        delimiterCode, escapeCode = cls._getCodes(asciiEscapes)
+        del outBuf[:]
+        outBuf.append(delimiterCode)
+        outBuf += cls._escape(data, delimiterCode, escapeCode)
+        outBuf += cls._escape(cls.calcCRC(data), delimiterCode, escapeCode)
+        outBuf.append(delimiterCode)
+        return len(outBuf)
+
+    @classmethod
+    def _getCodes(cls, asciiEscapes: bool):
+        if asciiEscapes:
+            return Frame.DELIMITER_CODE_ASCII, Frame.ESCAPE_CODE_ASCII
+        return Frame.DELIMITER_CODE_NON_ASCII, Frame.ESCAPE_CODE_NON_ASCII
+
+    @classmethod
+    def _escape(cls, data: bytes, delimiterCode: int, escapeCode: int) -> bytes:
+        '''
+        Escape delimiter and escape codes in a block of data
+        The escape code must be replaced first so the escapes added for
+        delimiters aren't escaped again
+        '''
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)
+        if escapeCode in data:
+            data = data.replace(bytes((escapeCode,)), bytes((escapeCode, escapeCode ^ 0x20)))
+        if delimiterCode in data:
+            data = data.replace(bytes((delimiterCode,)), bytes((escapeCode, delimiterCode ^ 0x20)))
+        return data
 
     @classmethod
     def calcCRC(cls, data: bytes) -> bytes:
@@ -309,11 +503,27 @@ class LikeHDLC:
         Returns:
             bytes representing the checksum (2 bytes big-endian)
         '''
+        return bytearray(struct.pack(">H", cls.calcCRCValue(data)))
+
+    @classmethod
+    def calcCRCValue(cls, data: bytes) -> int:
+        '''
+        Calculate CRC-CCITT 16Bit check code as an integer
+        Uses binascii.crc_hqx (same polynomial, initial value 0xffff) where
+        available and otherwise falls back to the lookup table
+
+        Args:
+            data: bytes representing the data
 
+        Returns:
+            checksum value
+        '''
+        if crc_hqx is not None:
+            return crc_hqx(data, 0xffff)
         crc = 0xffff
         for c in data:
             crc = ((crc<<8)&0xff00) ^ Frame.CRC16_LUT[((crc>>8)&0xff)^c]
-        return bytearray(struct.pack(">H", crc))
+        return crc
 
     @classmethod
     def toBytes(cls, data):
@@ -32,6 +32,7 @@ class Marty(object):
         'usb'    : ClientMV2,
         'wifi'   : ClientMV2,
         'test'   : ClientMV2,
+        'sim'    : ClientMV2,
     }
 
     STOP_TYPE = {
@@ -146,8 +147,8 @@ class Marty(object):
 
         Args:
             method: method of connecting to Marty - it may be: "usb",
-                "wifi", "socket" (Marty V1) or "exp" (expansion port used to connect
-                to a Raspberry Pi, etc)
+                "wifi", "socket" (Marty V1), "exp" (expansion port used to connect
+                to a Raspberry Pi, etc) or "sim" (a simulated Marty V2 for testing without a robot)
             locator: location to connect to, depending on the method of connection this
                 is the serial port name, network (IP) Address or network name (hostname) of Marty
                 that the computer should use to communicate with Marty.
@@ -1470,8 +1471,8 @@ class Marty(object):
         Returns:
             A dictionary of interface statistics including:
                 roundTripAvgMS: average round trip time for command/response messages in milliseconds
-                msgRxRatePS: max number of messages received per second
-                msgTxRatePS: max number of messages sent per second
+                msgRxRatePS: number of messages received per second (over the last second)
+                msgTxRatePS: number of messages sent per second (over the last second)
                 unmatched: number of unmatched messages
                 matched: number of matched messages
                 unnumbered: number of unnumbered messages
@@ -1479,9 +1480,16 @@ class Marty(object):
                 uploadBPS: upload speed in bytes per second (for file uploads, etc)
                 rxCount: number of messages received
                 txCount: number of messages sent
+                roundTripP50MS, roundTripP95MS, roundTripP99MS: percentiles of the round trip time
+                       over the last minute in milliseconds
+                windowStats: statistics over the last 1s, 10s and 60s (keyed "1s", "10s" and "60s")
+                       each with msgRxRatePS, msgTxRatePS, publishRatesPS (messages published per
+                       second on each topic) and roundTrips which has the count, p50MS, p95MS and
+                       p99MS of round trips for each kind of command (e.g. traj, led or filelist)
             The dictionary may also include several records of the form:
-                <topic>PS: number of messages published on each topic where <topic> is the topic name
-                       and can be servos, imu, robot, power or addons
+                <topic>PS: number of messages published on each topic (over the last 10s) where
+                       <topic> is the topic name and can be servos, imu, robot, power or addons
+            Reading the statistics doesn't change them so they can be read from more than one place
         '''
         return self.client.get_interface_stats()
 
@@ -1494,7 +1502,7 @@ class Marty(object):
 
     def send_file(self, filename: str, 
                 progress_callback: Callable[[int, int], bool] = None,
-                file_dest:str = "fs") -> bool:
+                file_dest:str = "fs", skip_if_same: bool = False) -> bool:
         '''
         Send a file to Marty. :two:
 
@@ -1504,13 +1512,33 @@ class Marty(object):
                     which are bytesSent and totalBytes and
                     returns a bool which should be True to continue the file upload or False to abort
             file_dest: "fs" to upload to file system, "ricfw" for new RIC firmware
+            skip_if_same: True to skip the upload if this robot already has an identical copy of
+                    the file and to resume an upload that was interrupted - a record of the files
+                    sent to each robot is kept in ~/.martypy/upload_manifest.json
         Returns:
-            True if the file was sent successfully
+            True if the file was sent successfully (or skipped)
         Throws:
             OSError: operating system exceptions
             May throw other exceptions so include a general exception handler
         '''
-        return self.client.send_file(filename, progress_callback, file_dest)
+        return self.client.send_file(filename, progress_callback, file_dest, skip_if_same)
+
+    def get_transfer_manager(self,
+                progress_callback: Callable[[Dict, object], None] = None) -> object:
+        '''
+        Get the transfer manager used to send many files to Marty. :two:
+        Files queued with `add(filename, fileDest, priority)` are sent one after another in the
+        background, highest priority first. Jobs returned by `add()` can be cancelled and have a
+        `future` holding the result. `getProgress()` gives the aggregate progress including the
+        throughput and estimated time to finish, and `waitAll()` waits for all files to be sent.
+
+        Args:
+            progress_callback: callback with the aggregate progress (a dict as returned by
+                    `getProgress()`) and the transfer manager, called as files are sent
+        Returns:
+            The transfer manager (a `RICTransferManager`)
+        '''
+        return self.client.get_transfer_manager(progress_callback)
 
     def play_mp3(self, filename: str,
                 progress_callback: Callable[[int, int], bool] = None) -> bool:
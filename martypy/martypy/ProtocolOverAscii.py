@@ -1,6 +1,9 @@
 '''
 Implements a frame protocol on top of a standard ASCII interface
 '''
+import re
+from typing import Iterator, Tuple
+
 class ProtocolOverAscii():
     '''
     ProtocolOverAscii
@@ -13,6 +16,23 @@ class ProtocolOverAscii():
     OVERASCII_ESCAPE_3 = 0x8F
     OVERASCII_MOD_CODE = 0x20
 
+    # Tables used to split and decode blocks of received data - every
+    # encoded byte has bit-7 set so bit-7 is stripped from all bytes other
+    # than the escape codes and escape pairs are then looked up in full
+    _ASCII_BYTES = bytes(range(0x80))
+    _NON_ASCII_BYTES = bytes(range(0x80, 0x100))
+    _ESCAPE_CODES = bytes([OVERASCII_ESCAPE_1, OVERASCII_ESCAPE_2, OVERASCII_ESCAPE_3])
+    _ESCAPE_PAIR_RE = re.compile(b"([\x85\x8e\x8f][\x00-\x7f\x85\x8e\x8f])")
+    _STRIP_MSB_TABLE = None
+    _ESCAPE_PAIR_TABLE = None
+
+    # Translation tables used to encode giving the first and second byte of the
+    # encoded sequence for each byte value (single-byte sequences have a zero
+    # second byte which is then removed as zero never appears in encoded data)
+    _ENCODE_FIRST_BYTES: bytes = None
+    _ENCODE_SECOND_BYTES: bytes = None
+    ENCODE_STREAM_CHUNK_LEN = 4096
+
     def __init__(self):
         self.escapeSeqCode = 0
 
@@ -46,33 +66,134 @@ class ProtocolOverAscii():
         else:
             return ch & 0x7f
 
+    def decodeBuffer(self, buf: bytes) -> Tuple[bytes, bytes]:
+        '''
+        Split a block of received data into plain-text and decoded frame data
+        Bytes with bit-7 clear are plain-text and are returned unchanged, the
+        remaining bytes are decoded as with decodeByte(). Escape state is kept
+        so an escape sequence can be split across blocks
+        Args:
+            buf: block of received bytes
+        Returns:
+            tuple of plain-text bytes and decoded frame bytes
+        '''
+        textBytes = buf.translate(None, self._NON_ASCII_BYTES)
+        encBytes = buf.translate(None, self._ASCII_BYTES)
+        if not encBytes:
+            return textBytes, b""
+        # Complete an escape sequence started in the previous block
+        firstByte = b""
+        if self.escapeSeqCode != 0:
+            firstByte = bytes((self.decodeByte(encBytes[0]),))
+            encBytes = encBytes[1:]
+        # Hold back a trailing escape code until the next block
+        if encBytes and encBytes[-1] in self._ESCAPE_CODES:
+            # Could be the second byte of a pair so only an odd-length run of
+            # escape codes at the end actually leaves an escape pending
+            runLen = len(encBytes) - len(encBytes.rstrip(self._ESCAPE_CODES))
+            if runLen % 2 == 1:
+                self.decodeByte(encBytes[-1])
+                encBytes = encBytes[:-1]
+        # Decode escape pairs with a lookup and other bytes by stripping bit-7
+        if self._ESCAPE_PAIR_TABLE is None:
+            self._initDecodeTables()
+        parts = self._ESCAPE_PAIR_RE.split(encBytes.translate(self._STRIP_MSB_TABLE))
+        parts[1::2] = map(self._ESCAPE_PAIR_TABLE.__getitem__, parts[1::2])
+        return textBytes, firstByte + b"".join(parts)
+
     @classmethod
-    def encode(cls, inData: bytes) -> bytes:
+    def _initDecodeTables(cls) -> None:
         '''
-        Encode frame
+        Build the tables used by decodeBuffer() - a translation table that strips
+        bit-7 from everything other than escape codes and a dict mapping each
+        escape code plus (bit-7 stripped) value to the decoded byte
+        '''
+        cls._STRIP_MSB_TABLE = bytes(b if b in cls._ESCAPE_CODES else b & 0x7f for b in range(0x100))
+        table = {}
+        for escCode in cls._ESCAPE_CODES:
+            for val in list(range(0x80)) + list(cls._ESCAPE_CODES):
+                decoder = cls()
+                decoder.decodeByte(escCode)
+                table[bytes((escCode, val))] = bytes((decoder.decodeByte(val | 0x80),))
+        cls._ESCAPE_PAIR_TABLE = table
+
+    @classmethod
+    def _encodeByte(cls, toEnc: int) -> bytes:
+        '''
+        Encode a single byte
         Values 0x00-0x0F map to ESCAPE_CODE_1, VALUE_XOR_20H_AND_MSB_SET
         Values 0x10-0x7f map to VALUE_WITH_MSB_SET
         Values 0x80-0x8F map to ESCAPE_CODE_2, VALUE_XOR_20H
         Values 0x90-0xff map to ESCAPE_CODE_3, VALUE
-        Value ESCAPE_CODE_1 maps to ESCAPE_CODE_1 + VALUE
+        Args:
+            toEnc: byte value to encode
+        Returns:
+            encoded sequence (bytes)
+        '''
+        if toEnc <= 0x0f:
+            return bytes((cls.OVERASCII_ESCAPE_1, (toEnc ^ cls.OVERASCII_MOD_CODE) | 0x80))
+        elif toEnc <= 0x7f:
+            return bytes((toEnc | 0x80,))
+        elif toEnc <= 0x8f:
+            return bytes((cls.OVERASCII_ESCAPE_2, toEnc ^ cls.OVERASCII_MOD_CODE))
+        return bytes((cls.OVERASCII_ESCAPE_3, toEnc))
+
+    @classmethod
+    def _initEncodeTables(cls) -> None:
+        encodeTable = [cls._encodeByte(b) for b in range(0x100)]
+        cls._ENCODE_FIRST_BYTES = bytes(seq[0] for seq in encodeTable)
+        cls._ENCODE_SECOND_BYTES = bytes(seq[1] if len(seq) > 1 else 0 for seq in encodeTable)
+
+    @classmethod
+    def encode(cls, inData: bytes) -> bytes:
+        '''
+        Encode frame
+        Each byte is encoded as described in _encodeByte() - the work is done
+        with translation tables rather than a byte at a time
         Args:
             inData: data to encode (bytes)
         Returns:
             encoded frame (bytes)
         '''
-        # Iterate over frame
         encodedFrame = bytearray()
-        for toEnc in inData:
-            # Handle escape chars
-            if toEnc <= 0x0f:
-                encodedFrame.append(ProtocolOverAscii.OVERASCII_ESCAPE_1)
-                encodedFrame.append((toEnc ^ ProtocolOverAscii.OVERASCII_MOD_CODE) | 0x80)
-            elif (toEnc >= 0x10) and (toEnc <= 0x7f):
-                encodedFrame.append(toEnc | 0x80)
-            elif (toEnc >= 0x80) and (toEnc <= 0x8f):
-                encodedFrame.append(ProtocolOverAscii.OVERASCII_ESCAPE_2)
-                encodedFrame.append(toEnc ^ ProtocolOverAscii.OVERASCII_MOD_CODE)
-            else:
-                encodedFrame.append(ProtocolOverAscii.OVERASCII_ESCAPE_3)
-                encodedFrame.append(toEnc)
+        cls.encodeInto(inData, encodedFrame)
         return encodedFrame
+
+    @classmethod
+    def encodeInto(cls, inData: bytes, outBuf: bytearray) -> int:
+        '''
+        Encode frame into a caller-supplied buffer (previous contents are replaced) -
+        the buffer is resized in place but this isn't allocation-free as the first
+        and second bytes of each sequence are translated into temporary copies
+        (which is still much quicker than looking up each byte)
+        Args:
+            inData: data to encode (bytes)
+            outBuf: bytearray to hold the encoded frame
+        Returns:
+            length of the encoded frame
+        '''
+        if cls._ENCODE_FIRST_BYTES is None:
+            cls._initEncodeTables()
+        if not isinstance(inData, (bytes, bytearray)):
+            inData = bytes(inData)
+        outBuf[:] = bytes(len(inData) * 2)
+        outBuf[0::2] = inData.translate(cls._ENCODE_FIRST_BYTES)
+        outBuf[1::2] = inData.translate(cls._ENCODE_SECOND_BYTES)
+        outBuf[:] = outBuf.translate(None, b"\x00")
+        return len(outBuf)
+
+    @classmethod
+    def encodeStream(cls, inData: bytes, chunkLen: int = None) -> Iterator[bytes]:
+        '''
+        Encode a large payload in chunks so that sending can start before
+        the whole payload has been encoded
+        Args:
+            inData: data to encode (bytes)
+            chunkLen: number of input bytes per chunk (defaults to ENCODE_STREAM_CHUNK_LEN)
+        Returns:
+            iterator over encoded chunks
+        '''
+        chunkLen = chunkLen if chunkLen else cls.ENCODE_STREAM_CHUNK_LEN
+        inView = memoryview(inData)
+        for chunkPos in range(0, len(inView), chunkLen):
+            yield cls.encode(inView[chunkPos:chunkPos+chunkLen])
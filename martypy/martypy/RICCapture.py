@@ -0,0 +1,149 @@
+'''
+RICCapture
+Recording of the frames sent to and received from RIC
+'''
+from typing import Iterator, NamedTuple
+import struct
+import threading
+import time
+
+class RICCaptureRec(NamedTuple):
+    '''
+    A captured frame - timeNs is nanoseconds since the capture started
+    '''
+    direction: int
+    timeNs: int
+    frame: bytes
+
+class RICCaptureFile:
+    '''
+    RICCaptureFile
+    Capture file format - a header (magic, wall-clock time and monotonic time at
+    the start) followed by records of direction, time since the start (monotonic
+    nanoseconds) and length, each followed by the frame (the RICREST/ROSSerial
+    frame without HDLC encoding)
+    '''
+    DIR_TX = 0
+    DIR_RX = 1
+    MAGIC = b"RICCAP\x00\x01"
+    HEADER = struct.Struct("<8sdq")
+    REC_HEADER = struct.Struct("<BqI")
+
+    # pcap (nanosecond resolution) with the direction as the first byte of each packet
+    PCAP_MAGIC_NS = 0xa1b23c4d
+    PCAP_LINKTYPE_USER0 = 147
+    PCAP_HEADER = struct.Struct("<IHHiIII")
+    PCAP_REC_HEADER = struct.Struct("<IIII")
+
+    @classmethod
+    def readHeader(cls, f) -> float:
+        '''
+        Read the header of a capture file
+        Returns:
+            wall-clock time (epoch seconds) when the capture started
+        Throws:
+            ValueError: if the file isn't a capture file
+        '''
+        header = f.read(cls.HEADER.size)
+        if len(header) < cls.HEADER.size:
+            raise ValueError("Not a RIC capture file")
+        magic, startWallTime, _ = cls.HEADER.unpack(header)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a RIC capture file")
+        return startWallTime
+
+    @classmethod
+    def read(cls, fileName: str) -> Iterator[RICCaptureRec]:
+        '''
+        Read the frames in a capture file - a partly written record at the end (e.g.
+        if the capturing process was killed) is ignored
+        Args:
+            fileName: capture file
+        Returns:
+            iterator of RICCaptureRec
+        Throws:
+            OSError: operating system exceptions
+            ValueError: if the file isn't a capture file
+        '''
+        with open(fileName, "rb") as f:
+            cls.readHeader(f)
+            while True:
+                recHeader = f.read(cls.REC_HEADER.size)
+                if len(recHeader) < cls.REC_HEADER.size:
+                    return
+                direction, timeNs, frameLen = cls.REC_HEADER.unpack(recHeader)
+                frame = f.read(frameLen)
+                if len(frame) < frameLen:
+                    return
+                yield RICCaptureRec(direction, timeNs, frame)
+
+    @classmethod
+    def exportPcap(cls, fileName: str, pcapFileName: str) -> int:
+        '''
+        Export a capture file as pcap (link type USER0) - the first byte of each packet
+        is the direction (0 sent to RIC, 1 received from RIC)
+        Args:
+            fileName: capture file
+            pcapFileName: pcap file to write
+        Returns:
+            number of frames exported
+        Throws:
+            OSError: operating system exceptions
+            ValueError: if the file isn't a capture file
+        '''
+        with open(fileName, "rb") as f:
+            startWallTimeNs = int(cls.readHeader(f) * 1e9)
+        numFrames = 0
+        with open(pcapFileName, "wb") as pcapFile:
+            pcapFile.write(cls.PCAP_HEADER.pack(cls.PCAP_MAGIC_NS, 2, 4, 0, 0, 65535, cls.PCAP_LINKTYPE_USER0))
+            for captureRec in cls.read(fileName):
+                timeSecs, timeNs = divmod(startWallTimeNs + captureRec.timeNs, 1000000000)
+                packetLen = len(captureRec.frame) + 1
+                pcapFile.write(cls.PCAP_REC_HEADER.pack(timeSecs, timeNs, packetLen, packetLen))
+                pcapFile.write(bytes([captureRec.direction]))
+                pcapFile.write(captureRec.frame)
+                numFrames += 1
+        return numFrames
+
+class RICCaptureWriter:
+    '''
+    RICCaptureWriter
+    Appends frames to a capture file (see RICCaptureFile) - frames can be added
+    from any thread and writes are buffered so capturing doesn't slow the link
+    '''
+    def __init__(self, fileName: str) -> None:
+        '''
+        Initialise RICCaptureWriter
+        Args:
+            fileName: capture file (replaced if it exists)
+        Throws:
+            OSError: operating system exceptions
+        '''
+        self.fileName = fileName
+        self._startNs = time.monotonic_ns()
+        self._file = open(fileName, "wb")
+        self._file.write(RICCaptureFile.HEADER.pack(RICCaptureFile.MAGIC, time.time(), self._startNs))
+        self._lock = threading.Lock()
+        self.numFrames = 0
+
+    def add(self, direction: int, frame: bytes) -> None:
+        '''
+        Add a frame
+        Args:
+            direction: RICCaptureFile.DIR_TX or RICCaptureFile.DIR_RX
+            frame: frame (not HDLC encoded)
+        '''
+        timeNs = time.monotonic_ns() - self._startNs
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(RICCaptureFile.REC_HEADER.pack(direction, timeNs, len(frame)))
+            self._file.write(frame)
+            self.numFrames += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
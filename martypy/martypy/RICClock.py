@@ -0,0 +1,150 @@
+'''
+RICClock
+Source of time for RIC connections - timing-heavy code (time-outs, pacing and
+waits for Marty) gets the time and sleeps through a clock so tests can run it
+faster than real time
+'''
+from concurrent.futures import Future
+from typing import Callable, Iterable, Optional, Set, Tuple
+import concurrent.futures
+import threading
+import time
+import weakref
+
+class RICClock:
+    '''
+    RICClock
+    Real time - time() is wall-clock time and monotonic() is for measuring
+    intervals. Waits on threading objects go through wait() and waitFor() so
+    a clock running at a different speed can scale their time-outs
+    '''
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, secs: float) -> None:
+        if secs > 0:
+            time.sleep(secs)
+
+    def toRealSecs(self, secs: Optional[float]) -> Optional[float]:
+        '''
+        Convert a duration in this clock's time to real seconds (None stays None)
+        '''
+        return secs
+
+    def wait(self, waitable, timeOutSecs: Optional[float] = None) -> bool:
+        '''
+        Wait on an Event or Condition (the Condition's lock must be held)
+        Args:
+            waitable: threading.Event or threading.Condition
+            timeOutSecs: maximum time to wait in this clock's time (None to wait forever)
+        Returns:
+            result of the wait (False if it timed out)
+        '''
+        return waitable.wait(self.toRealSecs(timeOutSecs))
+
+    def waitFor(self, cond: threading.Condition, predicate: Callable[[], bool],
+                timeOutSecs: Optional[float] = None) -> bool:
+        '''
+        Wait on a Condition until predicate() is True (the Condition's lock must be held)
+        Returns:
+            last result of predicate()
+        '''
+        return cond.wait_for(predicate, self.toRealSecs(timeOutSecs))
+
+    def waitFutures(self, futures: Iterable[Future],
+                timeOutSecs: Optional[float] = None) -> Tuple[Set[Future], Set[Future]]:
+        '''
+        Wait for futures to complete (see concurrent.futures.wait())
+        Returns:
+            done and not done futures
+        '''
+        return concurrent.futures.wait(futures, self.toRealSecs(timeOutSecs))
+
+class RICVirtualClock(RICClock):
+    '''
+    RICVirtualClock
+    Virtual time which runs speed times faster than real time - sleeps and wait
+    time-outs are shortened to match. advance() moves virtual time on at once
+    (e.g. to expire data without waiting) and wakes sleep() and waits on Conditions
+    (such as the scheduler's) - waits on Events aren't woken so run until their
+    scaled time-out. Everything sharing a connection (RICInterface, its scheduler
+    and a simulated RIC) should use the same clock
+    '''
+    def __init__(self, speed: float = 10.0, startTime: Optional[float] = None) -> None:
+        '''
+        Initialise RICVirtualClock
+        Args:
+            speed: how many times faster than real time the clock runs
+            startTime: wall-clock time (epoch seconds) the clock starts at (None for now)
+        '''
+        if speed <= 0:
+            raise ValueError("Clock speed must be more than zero")
+        self.speed = speed
+        self._realStart = time.monotonic()
+        self._startTime = startTime if startTime is not None else time.time()
+        self._advancedSecs = 0.0
+        self._advanced = threading.Condition()
+        # Conditions waited on through the clock which advance() notifies
+        self._waitedConds: 'weakref.WeakSet[threading.Condition]' = weakref.WeakSet()
+
+    def time(self) -> float:
+        return self._startTime + self.elapsed()
+
+    def monotonic(self) -> float:
+        return self._realStart + self.elapsed()
+
+    def elapsed(self) -> float:
+        '''
+        Virtual seconds since the clock started
+        '''
+        return (time.monotonic() - self._realStart) * self.speed + self._advancedSecs
+
+    def sleep(self, secs: float) -> None:
+        deadline = self.monotonic() + secs
+        with self._advanced:
+            while True:
+                remainingSecs = deadline - self.monotonic()
+                if remainingSecs <= 0:
+                    return
+                self._advanced.wait(remainingSecs / self.speed)
+
+    def advance(self, secs: float) -> None:
+        '''
+        Move virtual time on by secs
+        '''
+        with self._advanced:
+            self._advancedSecs += secs
+            self._advanced.notify_all()
+            waitedConds = list(self._waitedConds)
+        # Notified without holding _advanced as waiters hold their Condition when registering
+        for cond in waitedConds:
+            with cond:
+                cond.notify_all()
+
+    def wait(self, waitable, timeOutSecs: Optional[float] = None) -> bool:
+        # Conditions are registered so advance() can wake them (which looks like a spurious wake-up)
+        if isinstance(waitable, threading.Condition):
+            with self._advanced:
+                self._waitedConds.add(waitable)
+        return super().wait(waitable, timeOutSecs)
+
+    def waitFor(self, cond: threading.Condition, predicate: Callable[[], bool],
+                timeOutSecs: Optional[float] = None) -> bool:
+        if timeOutSecs is None:
+            return super().waitFor(cond, predicate)
+        # The time-out is checked against virtual time as advance() may move it on
+        deadline = self.monotonic() + timeOutSecs
+        result = predicate()
+        while not result:
+            remainingSecs = deadline - self.monotonic()
+            if remainingSecs <= 0:
+                break
+            self.wait(cond, remainingSecs)
+            result = predicate()
+        return result
+
+    def toRealSecs(self, secs: Optional[float]) -> Optional[float]:
+        return secs / self.speed if secs is not None else None
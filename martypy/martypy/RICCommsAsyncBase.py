@@ -0,0 +1,82 @@
+'''
+asyncio communications with a Robotical RIC
+'''
+from abc import abstractmethod
+import asyncio
+from typing import Callable, Dict, Optional
+from .Exceptions import MartyConnectException
+
+class RICCommsAsyncBase:
+    '''
+    RICCommsAsyncBase
+    Mixin for RICComms classes whose receive side is driven by an asyncio event
+    loop rather than a reader thread. Connections are opened with openAsync() from
+    the event loop - open(), close() and send() may still be called from other
+    threads and are handed over to the loop
+    '''
+    def _initAsync(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __del__(self) -> None:
+        '''
+        Destructor - the event loop may already have gone so don't close here
+        '''
+        pass
+
+    @abstractmethod
+    async def openAsync(self, openParams: Dict) -> bool:
+        '''
+        Open connection from the event loop (see open() for params)
+        Returns:
+            True if open succeeded or already open
+        Throws:
+            MartyConnectException: if a connection cannot be opened
+        '''
+        return False
+
+    @abstractmethod
+    async def closeAsync(self) -> None:
+        '''
+        Close connection from the event loop
+        '''
+        pass
+
+    def open(self, openParams: Dict) -> bool:
+        '''
+        Open connection from a thread other than the event loop's
+        Returns:
+            True if open succeeded or already open
+        Throws:
+            MartyConnectException: if a connection cannot be opened
+        '''
+        if self.isOpen():
+            return True
+        if self._loop is None or self._isLoopThread():
+            raise MartyConnectException("Use openAsync() to open an asyncio connection")
+        return asyncio.run_coroutine_threadsafe(self.openAsync(openParams), self._loop).result()
+
+    def close(self) -> None:
+        '''
+        Close connection
+        '''
+        if not self.isOpen():
+            return
+        if self._isLoopThread():
+            self._loop.create_task(self.closeAsync())
+        elif self._loop.is_closed():
+            self._isOpen = False
+        else:
+            asyncio.run_coroutine_threadsafe(self.closeAsync(), self._loop).result()
+
+    def _isLoopThread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _callOnLoop(self, fn: Callable, *args) -> None:
+        # Run fn on the event loop (immediately if already on it)
+        if self._isLoopThread():
+            fn(*args)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(fn, *args)
@@ -0,0 +1,83 @@
+'''
+asyncio serial communications with a Robotical RIC
+'''
+import asyncio
+import logging
+from typing import Dict
+from .RICCommsAsyncBase import RICCommsAsyncBase
+from .RICCommsSerial import RICCommsSerial
+from .Exceptions import MartyConnectException
+
+logger = logging.getLogger(__name__)
+
+class RICCommsAsyncSerial(RICCommsAsyncBase, RICCommsSerial):
+    '''
+    RICCommsAsyncSerial
+    Serial connection to RIC where received data is read by the event loop when
+    the port's file descriptor is readable (loop.add_reader) so no reader thread
+    is needed. This requires a selectable port so isn't available on Windows
+    '''
+    def __init__(self) -> None:
+        '''
+        Initialise RICCommsAsyncSerial
+        '''
+        super().__init__()
+        self._initAsync()
+        self._fileno = None
+
+    async def openAsync(self, openParams: Dict) -> bool:
+        '''
+        Open connection from the event loop (see RICCommsSerial.open() for params)
+        Returns:
+            True if open succeeded or already open
+        Throws:
+            MartyConnectException: if connection cannot be opened
+        '''
+        # Check not already open
+        if self._isOpen:
+            return True
+
+        # Open port
+        self._loop = asyncio.get_running_loop()
+        self._openPort(openParams)
+
+        # Read from the event loop
+        try:
+            self.serialDevice.timeout = 0
+            self._fileno = self.serialDevice.fileno()
+            self._loop.add_reader(self._fileno, self._onSerialReadable)
+        except Exception as excp:
+            self.serialDevice.close()
+            self.serialDevice = None
+            raise MartyConnectException("Serial port cannot be used with asyncio on this platform") from excp
+        self._isOpen = True
+        return True
+
+    async def closeAsync(self) -> None:
+        '''
+        Close serial port from the event loop
+        '''
+        if not self._isOpen:
+            return
+        self.flush()
+        self._isOpen = False
+        if self._fileno is not None:
+            self._loop.remove_reader(self._fileno)
+            self._fileno = None
+        if self.serialDevice is not None:
+            self.serialDevice.close()
+            self.serialDevice = None
+
+    def _onSerialReadable(self) -> None:
+        try:
+            byt = self.serialDevice.read(max(self.serialDevice.in_waiting, 1))
+        except Exception as excp:
+            # Port has gone (e.g. cable unplugged) - stop reading
+            logger.debug(f"Serial read problem {excp}")
+            self.serialPortErrors += 1
+            self._loop.remove_reader(self._fileno)
+            self._fileno = None
+            self._isOpen = False
+            return
+        if byt:
+            self._onRxBytes(byt)
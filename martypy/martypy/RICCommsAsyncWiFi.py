@@ -0,0 +1,156 @@
+'''
+asyncio WiFi communications with a Robotical RIC
+'''
+import asyncio
+from typing import Callable, Dict
+import logging
+from .RICCommsAsyncBase import RICCommsAsyncBase
+from .RICCommsWiFi import RICCommsWiFi
+from .LikeHDLC import LikeHDLC
+from .Exceptions import MartyConnectException
+from .WebSocket import WebSocket
+from .WebSocketFrame import WebSocketFrame
+
+logger = logging.getLogger(__name__)
+
+class RICCommsAsyncWiFi(RICCommsAsyncBase, RICCommsWiFi):
+    '''
+    RICCommsAsyncWiFi
+    WebSocket connection to RIC using asyncio streams - received data is
+    processed by a task on the event loop so no reader thread is needed.
+    The connection is not re-opened automatically if it is lost
+    '''
+    def __init__(self, onReconnect: Callable[[],None] = None) -> None:
+        '''
+        Initialise RICCommsAsyncWiFi
+        '''
+        super().__init__(onReconnect)
+        self._initAsync()
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._rxTask: asyncio.Task = None
+        self._wsFrameCodec = WebSocketFrame()
+        self.openTimeoutSecs = 5.0
+
+    async def openAsync(self, openParams: Dict) -> bool:
+        '''
+        Open connection from the event loop
+        Args:
+            openParams: dict containing params used to open the connection, may include
+                        "ipAddrOrHostname",
+                        "ipPort",
+                        "wsPath",
+                        "asciiEscapes",
+                        "hdlcMaxFrameLen",
+                        "txCoalesceSecs",
+                        "txCoalesceMaxBytes"
+        Returns:
+            True if open succeeded or already open
+        Throws:
+            MartyConnectException: if a connection cannot be opened
+        '''
+        # Check not already open
+        if self._isOpen:
+            return True
+
+        # Get params
+        self._loop = asyncio.get_running_loop()
+        self.commsParams.conn = openParams
+        self.commsParams.fileTransfer = {"fileBlockMax": 5000, "fileXferSync": False, "fileBatchAck": 10}
+        ipAddrOrHostname = openParams.get("ipAddrOrHostname", "")
+        ipPort = openParams.get("ipPort", 80)
+        wsPath = openParams.get("wsPath", "/ws")
+        hdlcAsciiEscapes = openParams.get("asciiEscapes", False)
+
+        # Validate
+        if len(ipAddrOrHostname) == 0:
+            return False
+
+        # Open socket and upgrade to websocket
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                        asyncio.open_connection(ipAddrOrHostname, ipPort), self.openTimeoutSecs)
+            self._writer.write(WebSocket.getUpgradeReq(wsPath))
+            upgradeResp = await asyncio.wait_for(self._reader.readuntil(b"\r\n\r\n"), self.openTimeoutSecs)
+        except Exception as excp:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            raise MartyConnectException("Websocket problem") from excp
+        if b"Sec-WebSocket-Accept" not in upgradeResp:
+            self._writer.close()
+            self._writer = None
+            raise MartyConnectException("Websocket upgrade failed")
+
+        # Configure HDLC
+        self._hdlc.setAsciiEscapes(hdlcAsciiEscapes)
+        self._hdlc.maxFrameLen = openParams.get("hdlcMaxFrameLen", LikeHDLC.MAX_FRAME_LEN_DEFAULT)
+        self._initTxCoalescing(openParams, self.TX_COALESCE_MAX_BYTES_DEFAULT)
+
+        # Start receive task
+        self._wsFrameCodec = WebSocketFrame()
+        self._rxTask = self._loop.create_task(self._rxLoop())
+        self._isOpen = True
+        return True
+
+    async def closeAsync(self) -> None:
+        '''
+        Close connection from the event loop
+        '''
+        if not self._isOpen:
+            return
+        self.flush()
+        self._isOpen = False
+        if self._rxTask is not None:
+            self._rxTask.cancel()
+            self._rxTask = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+
+    def _sendBytesToIF(self, bytesToSend: bytes) -> None:
+        if not self._isOpen or self._writer is None:
+            return
+        self._callOnLoop(self._writeFrame, WebSocketFrame.encode(bytesToSend, False, WebSocketFrame.OPCODE_BINARY, True))
+
+    def _writeFrame(self, frame: bytes) -> None:
+        if self._writer is None:
+            return
+        try:
+            self._writer.write(frame)
+        except Exception as excp:
+            # Runs on the loop so the error can't be raised to the sender
+            self.socketErrors += 1
+            logger.warning(f"WebSocket write failed {excp}")
+
+    async def _rxLoop(self) -> None:
+        '''
+        Task used to process websocket data
+        '''
+        try:
+            while True:
+                rxData = await self._reader.read(WebSocket.maxSocketBytes)
+                if not rxData:
+                    break
+                self._wsFrameCodec.addDataToDecode(rxData)
+                if self._wsFrameCodec.getPongRequired():
+                    self._writeFrame(WebSocketFrame.encode(self._wsFrameCodec.getPongData(),
+                                False, WebSocketFrame.OPCODE_PONG, True))
+                binaryFrame = self._wsFrameCodec.getBinaryMsg()
+                while binaryFrame is not None:
+                    self._onWSBinaryFrame(binaryFrame)
+                    binaryFrame = self._wsFrameCodec.getBinaryMsg()
+                textFrame = self._wsFrameCodec.getTextMsg()
+                while textFrame is not None:
+                    self._onWSTextFrame(textFrame)
+                    textFrame = self._wsFrameCodec.getTextMsg()
+        except asyncio.CancelledError:
+            return
+        except Exception as excp:
+            logger.debug(f"WebSocket exception {excp}")
+        logger.debug("Exiting WebSocket task")
+        self._isOpen = False
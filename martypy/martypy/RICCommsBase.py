@@ -3,10 +3,13 @@ Generic communications with a Robotical RIC
 '''
 from abc import abstractmethod
 from .RICCommsParams import RICCommsParams
-from typing import Callable, Dict, Union
+from typing import Callable, Dict, Optional, Tuple, Union
 import logging
 from .LikeHDLC import LikeHDLC
 from .ProtocolOverAscii import ProtocolOverAscii
+from .RICScheduler import RICScheduler
+from .RICTxCoalescer import RICTxCoalescer
+from .RICCapture import RICCaptureWriter
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +25,13 @@ class RICCommsBase:
         self.rxFrameCB = None
         self.logLineCB = None
         self.commsParams = RICCommsParams()
+        # Scheduler of the interface using the connection (see setScheduler())
+        self.scheduler: Optional[RICScheduler] = None
+        self._txCoalescer: RICTxCoalescer = None
+        # Decoder for received frames (if the link uses HDLC)
+        self._hdlc: LikeHDLC = None
+        # Recorder of frames sent and received (see startCapture())
+        self._capture: RICCaptureWriter = None
 
     def __del__(self) -> None:
         '''
@@ -58,6 +68,17 @@ class RICCommsBase:
         '''
         self.logLineCB = onLogLine
 
+    def setScheduler(self, scheduler: Optional[RICScheduler]) -> None:
+        '''
+        Set the scheduler for timed jobs of the connection (e.g. the end of a transmit
+        coalescing window) - set before opening
+        Args:
+            scheduler: scheduler of the interface using the connection (None for the default)
+        Returns:
+            None
+        '''
+        self.scheduler = scheduler
+
     @abstractmethod
     def open(self, openParams: Dict) -> bool:
         '''
@@ -89,7 +110,7 @@ class RICCommsBase:
         '''
         Send data
         Args:
-            data: bytes to send
+            data: bytes to send (the caller may reuse the buffer once send returns)
         Returns:
             none
         Throws:
@@ -97,6 +118,98 @@ class RICCommsBase:
         '''
         pass
 
+    def flush(self) -> None:
+        '''
+        Send any frames held back for transmit coalescing straight away
+        '''
+        if self._txCoalescer is not None:
+            self._txCoalescer.flush()
+
+    def _initTxCoalescing(self, openParams: Dict, defaultMaxBytes: int) -> None:
+        '''
+        Set up transmit coalescing from the open params "txCoalesceSecs" (time
+        frames can be held back, 0 (the default) disables coalescing) and
+        "txCoalesceMaxBytes" (byte budget for a single write)
+        '''
+        windowSecs = openParams.get("txCoalesceSecs", 0)
+        if windowSecs > 0:
+            self._txCoalescer = RICTxCoalescer(self._sendBytesToIF, windowSecs,
+                        openParams.get("txCoalesceMaxBytes", defaultMaxBytes), self.scheduler)
+        else:
+            self._txCoalescer = None
+
+    def _sendEncoded(self, encoded: bytes) -> None:
+        '''
+        Send encoded bytes to the interface - via the coalescer if enabled
+        '''
+        if self._txCoalescer is not None:
+            self._txCoalescer.add(encoded)
+        else:
+            self._sendBytesToIF(encoded)
+
+    def _getTxCoalesceStats(self) -> Dict:
+        if self._txCoalescer is None:
+            return {}
+        return {"txCoalesce" + key[0].upper() + key[1:]: val for key, val in self._txCoalescer.getStats().items()}
+
+    def getLinkStats(self) -> Dict:
+        '''
+        Get statistics on the health of the link - HDLC decoding (if the link uses
+        HDLC) and transmit coalescing (if enabled)
+        Returns:
+            dict of statistics (empty if the link doesn't keep any)
+        '''
+        linkStats = {}
+        if self._hdlc is not None:
+            linkStats = {"hdlc" + key[0].upper() + key[1:]: val for key, val in self._hdlc.getStats().toDict().items()}
+        linkStats.update(self._getTxCoalesceStats())
+        return linkStats
+
+    def setTraceTiming(self, traceTiming: bool) -> None:
+        '''
+        Set whether the arrival time of received frames is recorded (see getRxFrameTiming())
+        '''
+        if self._hdlc is not None:
+            self._hdlc.traceTiming = traceTiming
+
+    def getRxFrameTiming(self) -> Tuple[int, int]:
+        '''
+        Get the arrival time of the frame being passed to the rx frame callback
+        Returns:
+            perf_counter_ns when the first bytes and the end of the frame arrived (0 if not
+            recorded - see setTraceTiming())
+        '''
+        if self._hdlc is None or not self._hdlc.traceTiming:
+            return 0, 0
+        return self._hdlc.frameRxStartNs, self._hdlc.frameRxEndNs
+
+    def startCapture(self, fileName: str) -> None:
+        '''
+        Start recording every frame sent and received (with monotonic timestamps) to
+        a capture file - see RICCaptureFile for exporting as pcap and RICCommsReplay
+        for replaying
+        Args:
+            fileName: capture file (replaced if it exists)
+        Throws:
+            OSError: operating system exceptions
+        '''
+        prevCapture = self._capture
+        self._capture = RICCaptureWriter(fileName)
+        if prevCapture is not None:
+            prevCapture.close()
+
+    def stopCapture(self) -> None:
+        capture = self._capture
+        self._capture = None
+        if capture is not None:
+            capture.close()
+
+    def _captureFrame(self, direction: int, frame: bytes) -> None:
+        # The capture may be stopped by another thread so it is only read once
+        capture = self._capture
+        if capture is not None:
+            capture.add(direction, frame)
+
     @abstractmethod
     def getTestOutput(self) -> dict:
         return {}
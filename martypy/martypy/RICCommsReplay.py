@@ -0,0 +1,153 @@
+'''
+Replay of captured communications with a Robotical RIC
+'''
+from threading import Condition, Event, Thread
+from typing import Dict
+import time
+import logging
+from .RICCommsBase import RICCommsBase
+from .LikeHDLC import LikeHDLC
+from .RICCapture import RICCaptureFile
+
+logger = logging.getLogger(__name__)
+
+class RICCommsReplay(RICCommsBase):
+    '''
+    RICCommsReplay
+    Feeds the frames received in a capture (see RICCommsBase.startCapture()) back
+    through HDLC decoding to the rx frame callback, either at the speed they were
+    captured or as fast as possible. The capture is replayed in order and each
+    frame received is held back until as many frames have been sent as were sent
+    before it in the capture - so responses are matched to commands if the
+    application sends the same commands in the same order as when capturing (as
+    message numbers are allocated in order). Frames sent are counted and discarded
+    '''
+    def __init__(self, captureFileName: str, realTime: bool = True) -> None:
+        '''
+        Initialise RICCommsReplay
+        Args:
+            captureFileName: capture file to replay
+            realTime: True to replay at the captured speed, False as fast as possible
+        '''
+        super().__init__()
+        self.captureFileName = captureFileName
+        self.realTime = realTime
+        self._isOpen = False
+        self._hdlc = LikeHDLC(self._onHDLCFrame, self._onHDLCError)
+        self._replayThread: Thread = None
+        self._replayStop = Event()
+        self._replayDone = Event()
+        self._txSent = Condition()
+        self.txCount = 0
+        self.rxFramesReplayed = 0
+        self.rxBytesReplayed = 0
+        self.replaySecs = 0
+
+    def isOpen(self) -> bool:
+        return self._isOpen
+
+    def open(self, openParams: Dict) -> bool:
+        '''
+        Open connection - loads the capture and starts replaying it
+        Args:
+            openParams: dict containing params used to open the connection (not used)
+        Returns:
+            True if open succeeded or already open
+        Throws:
+            OSError: operating system exceptions
+            ValueError: if the file isn't a capture file
+        '''
+        if self._isOpen:
+            return True
+        self.commsParams.conn = openParams
+        self.commsParams.fileTransfer = {"fileBlockMax": 5000, "fileXferSync": False, "fileBatchAck": 1}
+        # Frames received are HDLC encoded before replay starts so only decoding is timed
+        # (frames sent are only needed to know when to continue)
+        captureRecs = [(captureRec.direction, captureRec.timeNs,
+                    LikeHDLC.encode(captureRec.frame) if captureRec.direction == RICCaptureFile.DIR_RX else None)
+                    for captureRec in RICCaptureFile.read(self.captureFileName)]
+        self._replayStop.clear()
+        self._replayDone.clear()
+        with self._txSent:
+            self.txCount = 0
+        self._replayThread = Thread(target=self._replayLoop, args=(captureRecs,), daemon=True)
+        self._isOpen = True
+        self._replayThread.start()
+        return True
+
+    def close(self) -> None:
+        if not self._isOpen:
+            return
+        self._replayStop.set()
+        with self._txSent:
+            self._txSent.notify_all()
+        if self._replayThread is not None:
+            self._replayThread.join()
+            self._replayThread = None
+        self._isOpen = False
+
+    def send(self, data: bytes) -> None:
+        with self._txSent:
+            self.txCount += 1
+            self._txSent.notify_all()
+
+    def waitReplayDone(self, timeOutSecs: float = None) -> bool:
+        '''
+        Wait for all captured frames to be replayed
+        Returns:
+            True if replay finished
+        '''
+        return self._replayDone.wait(timeOutSecs)
+
+    def getReplayStats(self) -> Dict:
+        '''
+        Get replay statistics (framesPerSec is over the whole replay once finished)
+        '''
+        return {
+            "rxFramesReplayed": self.rxFramesReplayed,
+            "rxBytesReplayed": self.rxBytesReplayed,
+            "replaySecs": self.replaySecs,
+            "framesPerSec": self.rxFramesReplayed / self.replaySecs if self.replaySecs > 0 else 0,
+            "txCount": self.txCount,
+        }
+
+    def _replayLoop(self, captureRecs) -> None:
+        startNs = time.monotonic_ns()
+        # Replay time of a frame is its capture time plus the offset - which moves on
+        # if the application sends later than when capturing
+        offsetNs = startNs - (captureRecs[0][1] if captureRecs else 0)
+        numTxRecs = 0
+        for direction, recTimeNs, block in captureRecs:
+            if self._replayStop.is_set():
+                break
+            if direction == RICCaptureFile.DIR_TX:
+                numTxRecs += 1
+                with self._txSent:
+                    self._txSent.wait_for(lambda: self.txCount >= numTxRecs or self._replayStop.is_set())
+                offsetNs = max(offsetNs, time.monotonic_ns() - recTimeNs)
+                continue
+            if self.realTime:
+                waitNs = recTimeNs + offsetNs - time.monotonic_ns()
+                if waitNs > 0 and self._replayStop.wait(waitNs / 1e9):
+                    break
+            self._hdlc.decodeBuffer(block)
+            self.rxFramesReplayed += 1
+            self.rxBytesReplayed += len(block)
+        self.replaySecs = (time.monotonic_ns() - startNs) / 1e9
+        self._replayDone.set()
+
+    def _onHDLCFrame(self, frame: bytes) -> None:
+        if self.rxFrameCB is not None:
+            self.rxFrameCB(frame)
+
+    def _onHDLCError(self) -> None:
+        pass
+
+    def getTestOutput(self) -> dict:
+        return {}
+
+    def getMsgRespTimeoutSecs(self, defaultValue):
+        return defaultValue
+
+    def hintMsgTimeout(self, numTimedOut):
+        pass
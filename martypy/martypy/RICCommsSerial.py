@@ -11,6 +11,7 @@ from typing import Dict, List
 from warnings import warn
 
 from .RICCommsBase import RICCommsBase
+from .RICCapture import RICCaptureFile
 from .LikeHDLC import LikeHDLC
 from .ProtocolOverAscii import ProtocolOverAscii
 from .Exceptions import MartyConnectException
@@ -23,6 +24,8 @@ class RICCommsSerial(RICCommsBase):
     RICCommsSerial
     Provides a serial interface for RIC communications
     '''
+    TX_COALESCE_MAX_BYTES_DEFAULT = 256
+
     def __init__(self) -> None:
         '''
         Initialise RICCommsSerial
@@ -34,7 +37,7 @@ class RICCommsSerial(RICCommsBase):
         self.serialThreadEnabled = False
         self._hdlc = LikeHDLC(self._onHDLCFrame, self._onHDLCError)
         self.overAscii = False
-        self.serialLogLine = ""
+        self.serialLogLine = bytearray()
         self.serialPortErrors = 0
         self.baudRateAlternates = [115200, 2000000]
         self.curBaudRate = 0
@@ -79,7 +82,10 @@ class RICCommsSerial(RICCommsBase):
                         "serialPort" (will be auto-detected if missing/empty),
                         "serialBaud",
                         "ifType" == "plain" or "overascii",
-                        "asciiEscapes"
+                        "asciiEscapes",
+                        "hdlcMaxFrameLen",
+                        "txCoalesceSecs",
+                        "txCoalesceMaxBytes"
         Returns:
             True if open succeeded or already open
         Throws:
@@ -89,6 +95,21 @@ class RICCommsSerial(RICCommsBase):
         if self._isOpen:
             return True
 
+        # Open port
+        self._openPort(openParams)
+
+        # Start receive loop
+        self.serialThreadEnabled = True
+        self.serialReaderThread = Thread(target=self._serialRxLoop)
+        self.serialReaderThread.daemon = True
+        self.serialReaderThread.start()
+        self._isOpen = True
+        return True
+
+    def _openPort(self, openParams: Dict) -> None:
+        '''
+        Open the serial port and configure HDLC (see open() for params)
+        '''
         # Get params
         self.commsParams.conn = openParams
         self.commsParams.fileTransfer = {"fileBlockMax": 5000, "fileXferSync": False, "fileBatchAck": 1}
@@ -128,14 +149,10 @@ class RICCommsSerial(RICCommsBase):
 
         # Configure HDLC
         self._hdlc.setAsciiEscapes(hdlcAsciiEscapes)
-        
-        # Start receive loop
-        self.serialThreadEnabled = True
-        self.serialReaderThread = Thread(target=self._serialRxLoop)
-        self.serialReaderThread.daemon = True
-        self.serialReaderThread.start()
-        self._isOpen = True
-        return True
+        self._hdlc.maxFrameLen = openParams.get("hdlcMaxFrameLen", LikeHDLC.MAX_FRAME_LEN_DEFAULT)
+
+        # Coalesced frames are sent in a single write
+        self._initTxCoalescing(openParams, self.TX_COALESCE_MAX_BYTES_DEFAULT)
 
     def close(self) -> None:
         '''
@@ -143,6 +160,7 @@ class RICCommsSerial(RICCommsBase):
         '''
         if not self._isOpen:
             return
+        self.flush()
         # Stop thread function
         if self.serialReaderThread is not None:
             self.serialThreadEnabled = False
@@ -167,17 +185,23 @@ class RICCommsSerial(RICCommsBase):
         '''
         if self.DEBUG_HDLC_TX:
             logger.debug(f"Sending to IF len {len(bytes)} {bytes.hex()}")
+        if self._capture is not None:
+            self._captureFrame(RICCaptureFile.DIR_TX, data)
         hdlcEncoded = self._hdlc.encode(data)
         try:
             if self.overAscii:
-                encodedFrame = ProtocolOverAscii.encode(hdlcEncoded)
                 if self.DEBUG_HDLC_TX:
-                    logger.info(f"RICCommsSerial send encoded length {len(encodedFrame)} unencoded {data.hex() if len(data) < 20 else data.hex()[:20] + '...'}")
-                self._sendBytesToIF(encodedFrame)
+                    logger.info(f"RICCommsSerial send unencoded length {len(hdlcEncoded)} unencoded {data.hex() if len(data) < 20 else data.hex()[:20] + '...'}")
+                if len(hdlcEncoded) <= ProtocolOverAscii.ENCODE_STREAM_CHUNK_LEN:
+                    self._sendEncoded(ProtocolOverAscii.encode(hdlcEncoded))
+                else:
+                    # Large frames (e.g. file blocks) are encoded and written in chunks
+                    for encodedChunk in ProtocolOverAscii.encodeStream(hdlcEncoded):
+                        self._sendEncoded(encodedChunk)
             else:
                 if self.DEBUG_HDLC_TX:
-                    logger.debug(f"RICCommsSerial sendRaw {encodedFrame.hex()}")
-                self._sendBytesToIF(hdlcEncoded)
+                    logger.debug(f"RICCommsSerial sendRaw {hdlcEncoded.hex()}")
+                self._sendEncoded(hdlcEncoded)
         except Exception as excp:
             raise MartyConnectException("Serial send problem") from excp
 
@@ -191,26 +215,33 @@ class RICCommsSerial(RICCommsBase):
                 time.sleep(0.001)
                 continue
             byt = self.serialDevice.read(i)
-            for b in byt:
-                if self.overAscii:
-                    if b >= 128:
-                        decodedVal = self.protocolOverAscii.decodeByte(b)
-                        if decodedVal >= 0:
-                            # logger.debug(f"{decodedVal:02x}")
-                            self._hdlc.decodeData(decodedVal)
-                    else:
-                        if b == 0x0a:
-                            if self.logLineCB:
-                                self.logLineCB(self.serialLogLine)
-                            self.serialLogLine = ""
-                        else:
-                            self.serialLogLine += chr(b)
-                else:
-                    self._hdlc.decodeData(b)
+            self._onRxBytes(byt)
             # logger.debug(f"CommsSerial rx {byt.hex()}")
         # logger.debug("Exiting serialRxLoop")
 
+    def _onRxBytes(self, byt: bytes) -> None:
+        '''
+        Handle a block of bytes received from the serial port
+        '''
+        if not self.overAscii:
+            self._hdlc.decodeBuffer(byt)
+            return
+        # Split into logging text and HDLC data
+        textBytes, hdlcBytes = self.protocolOverAscii.decodeBuffer(byt)
+        if hdlcBytes:
+            self._hdlc.decodeBuffer(hdlcBytes)
+        if textBytes:
+            lines = textBytes.split(b"\n")
+            for line in lines[:-1]:
+                self.serialLogLine += line
+                if self.logLineCB:
+                    self.logLineCB(self.serialLogLine.decode("ascii"))
+                self.serialLogLine.clear()
+            self.serialLogLine += lines[-1]
+
     def _onHDLCFrame(self, frame: bytes) -> None:
+        if self._capture is not None:
+            self._captureFrame(RICCaptureFile.DIR_RX, frame)
         if self.rxFrameCB is not None:
             if self.DEBUG_HDLC_RX:
                 logger.debug(f"RICCommsSerial rx {len(frame)} {frame.hex()}")
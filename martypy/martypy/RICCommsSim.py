@@ -0,0 +1,509 @@
+'''
+Simulated Robotical RIC
+'''
+from collections import deque
+from typing import Dict, List, Optional
+import json
+import logging
+import random
+import re
+import threading
+import zlib
+from .RICClock import RICClock
+from .RICCommsBase import RICCommsBase
+from .LikeHDLC import LikeHDLC
+from .RICCapture import RICCaptureFile
+from .RICProtocols import RICProtocols
+from .RICROSSerial import RICROSSerial
+from .RICScheduler import RICScheduler, RICSchedulerJob
+
+logger = logging.getLogger(__name__)
+
+class RICCommsSim(RICCommsBase):
+    '''
+    RICCommsSim
+    In-process simulated RIC for testing and load testing without a robot. It
+    answers the RICREST URLs and command frames used by ClientMV2 (system
+    version, hardware status, trajectories which keep the robot moving for their
+    move time, LEDs, raw add-on queries, file list, file uploads acknowledged
+    with okto which can be resumed and audio streams acknowledged with sokto)
+    and publishes the ROSSerial topics at the subscribed rates. Frames in each
+    direction are HDLC encoded and pass over a simulated link with latency,
+    jitter, loss and limited bandwidth - the link keeps frames in order like a
+    serial port or websocket. The simulated firmware runs on its own scheduler
+    thread - with a virtual clock (see RICVirtualClock) the link and robot run on
+    virtual time
+    '''
+    SERVO_NAMES = ("LeftHip", "LeftTwist", "LeftKnee", "RightHip", "RightTwist", "RightKnee",
+                   "LeftArm", "RightArm", "Eyes")
+    IMU_IDNO = 19
+    POWER_IDNO = 20
+    TRAJ_DEFAULT_MOVE_MS = 1500
+    STREAM_ID = 1
+    # Number of recent oktos an interrupted upload can be resumed from
+    UPLOAD_RESUME_POINTS = 8
+    # Topics published for each subscription name
+    PUBLISH_TOPICS = {
+        "MultiStatus": (RICROSSerial.ROSTOPIC_V2_SMART_SERVOS, RICROSSerial.ROSTOPIC_V2_ACCEL,
+                        RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS),
+        "PowerStatus": (RICROSSerial.ROSTOPIC_V2_POWER_STATUS,),
+        "AddOnStatus": (RICROSSerial.ROSTOPIC_V2_ADDONS,),
+    }
+    _PUB_REC_RE = re.compile(r'"name"\s*:\s*"(\w+)"\s*,\s*"rateHz"\s*:\s*([0-9.]+)')
+    _DIR_TO_RIC = 0
+    _DIR_FROM_RIC = 1
+
+    def __init__(self, latencySecs: float = 0.005, jitterSecs: float = 0, lossRate: float = 0,
+                bandwidthBPS: float = 0, seed: Optional[int] = None, fileBlockMax: int = 5000,
+                fileBatchAck: int = 10, ackTimeoutSecs: float = 0.2, streamBytesPerSec: float = 2000,
+                streamBufferBytes: int = 4096, uploadResume: bool = True,
+                clock: Optional[RICClock] = None) -> None:
+        '''
+        Initialise RICCommsSim
+        Args:
+            latencySecs: time for a frame to cross the link (each way)
+            jitterSecs: maximum extra random delay added to the latency
+            lossRate: probability (0..1) that a frame is lost (each way)
+            bandwidthBPS: link bytes per second (each way, 0 for unlimited)
+            seed: seed for the random jitter and loss (None for a different run each time)
+            fileBlockMax: largest file block accepted
+            fileBatchAck: number of file blocks received before an okto is sent
+            ackTimeoutSecs: time after the last file block before an okto is sent anyway
+            streamBytesPerSec: rate audio streams are played
+            streamBufferBytes: audio stream buffer size
+            uploadResume: True if an interrupted upload can be resumed (older firmware
+                    starts again)
+            clock: clock the simulation runs on (None for real time)
+        '''
+        super().__init__()
+        self.latencySecs = latencySecs
+        self.jitterSecs = jitterSecs
+        self.lossRate = lossRate
+        self.bandwidthBPS = bandwidthBPS
+        self.fileBlockMax = fileBlockMax
+        self.fileBatchAck = fileBatchAck
+        self.ackTimeoutSecs = ackTimeoutSecs
+        self.streamBytesPerSec = streamBytesPerSec
+        self.streamBufferBytes = streamBufferBytes
+        self.uploadResume = uploadResume
+        self.systemInfo = {"SystemName": "RicFirmwareESP32", "SystemVersion": "1.2.0", "RicHwRevNo": 2,
+                           "SerialNo": "5151515151515151", "MAC": "5c:51:51:51:51:51"}
+        self.friendlyName = "Marty"
+        self.files: Dict[str, int] = {}
+        # Uploads started (most recent last) - each has the fileName, fileLen, resumedFrom
+        # (None if not resumed), rxPos, blockCount, crc (CRC32 of the data received) and isEnded
+        self.uploads: List[Dict] = []
+        self._isOpen = False
+        self._hdlc = LikeHDLC(self._onHDLCFrame, self._onHDLCError)
+        self._random = random.Random(seed)
+        self._clock = clock if clock is not None else RICClock()
+        self._scheduler = RICScheduler(self._clock)
+        self._linkLock = threading.Lock()
+        self._linkFreeTime = [0.0, 0.0]
+        self._linkLastArrival = [0.0, 0.0]
+        self._resetRobot()
+        # Stats
+        self.statsFramesToRIC = 0
+        self.statsFramesFromRIC = 0
+        self.statsFramesLost = 0
+        self.statsPublishFrames = 0
+        self.statsStreamUnderruns = 0
+
+    def _resetRobot(self) -> None:
+        # Motion - the end time of the current trajectory and move times of those queued
+        self._motionEndTime = 0.0
+        self._motionQueue = deque()
+        self._isPaused = False
+        self._pausedRemainingSecs = 0.0
+        self._servoPos = [0] * len(self.SERVO_NAMES)
+        self._publishJobs: Dict[str, RICSchedulerJob] = {}
+        # File upload and audio stream
+        self._upload: Optional[Dict] = None
+        self._uploadCRCAtOkTo: Dict[int, int] = {}
+        self._uploadAckDue: Optional[float] = None
+        self._uploadAckJob: Optional[RICSchedulerJob] = None
+        self._stream: Optional[Dict] = None
+
+    def isOpen(self) -> bool:
+        return self._isOpen
+
+    def open(self, openParams: Dict) -> bool:
+        '''
+        Open connection to the simulated RIC
+        Args:
+            openParams: dict containing params used to open the connection (not used)
+        Returns:
+            True
+        '''
+        self.commsParams.conn = openParams
+        self.commsParams.fileTransfer = {"fileBlockMax": self.fileBlockMax, "fileXferSync": False,
+                                         "fileBatchAck": self.fileBatchAck}
+        self._isOpen = True
+        return True
+
+    def close(self) -> None:
+        if not self._isOpen:
+            return
+        self._isOpen = False
+        # Jobs not yet run (link delivery, acks and publishing) are dropped
+        for job in list(self._publishJobs.values()):
+            job.cancel()
+        self._publishJobs = {}
+        self._uploadAckJob = None
+        self._scheduler.stop()
+
+    def send(self, data: bytes) -> None:
+        '''
+        Send data to the simulated RIC
+        Args:
+            data: frame to send (the caller may reuse the buffer once send returns)
+        '''
+        if self._capture is not None:
+            self._captureFrame(RICCaptureFile.DIR_TX, data)
+        frame = bytes(data)
+        self._sendOverLink(self._DIR_TO_RIC, frame, len(LikeHDLC.encode(frame)) if self.bandwidthBPS else 0,
+                    self._ricRx)
+
+    def getLinkStats(self) -> Dict:
+        linkStats = super().getLinkStats()
+        linkStats["hdlcEscapeRatio"] = self._hdlc.getStats().getEscapeRatio()
+        return linkStats
+
+    def getSimStats(self) -> Dict:
+        '''
+        Get statistics of the simulated link and RIC
+        '''
+        return {
+            "framesToRIC": self.statsFramesToRIC,
+            "framesFromRIC": self.statsFramesFromRIC,
+            "framesLost": self.statsFramesLost,
+            "publishFrames": self.statsPublishFrames,
+            "streamUnderruns": self.statsStreamUnderruns,
+        }
+
+    def getTestOutput(self) -> dict:
+        return {}
+
+    def getMsgRespTimeoutSecs(self, defaultValue):
+        return defaultValue
+
+    def hintMsgTimeout(self, numTimedOut):
+        pass
+
+    def _onHDLCFrame(self, frame: bytes) -> None:
+        if self._capture is not None:
+            self._captureFrame(RICCaptureFile.DIR_RX, frame)
+        if self.rxFrameCB is not None:
+            self.rxFrameCB(frame)
+
+    def _onHDLCError(self) -> None:
+        pass
+
+    # Link
+
+    def _sendOverLink(self, direction: int, data: bytes, linkBytes: int, deliverFn) -> None:
+        with self._linkLock:
+            if self.lossRate > 0 and self._random.random() < self.lossRate:
+                self.statsFramesLost += 1
+                return
+            timeNow = self._clock.monotonic()
+            # Frames queue for the link then take the latency (plus jitter) to arrive - in order
+            linkFreeTime = max(self._linkFreeTime[direction], timeNow)
+            if self.bandwidthBPS > 0:
+                linkFreeTime += linkBytes / self.bandwidthBPS
+            self._linkFreeTime[direction] = linkFreeTime
+            arrivalTime = linkFreeTime + self.latencySecs
+            if self.jitterSecs > 0:
+                arrivalTime += self._random.uniform(0, self.jitterSecs)
+            arrivalTime = max(arrivalTime, self._linkLastArrival[direction])
+            self._linkLastArrival[direction] = arrivalTime
+            # Scheduled at the arrival time itself (under the lock) so frames stay in order
+            self._scheduler.callAt(arrivalTime, deliverFn, data)
+
+    def _ricSend(self, frame: bytes) -> None:
+        if not self._isOpen:
+            return
+        self.statsFramesFromRIC += 1
+        encoded = LikeHDLC.encode(frame)
+        self._sendOverLink(self._DIR_FROM_RIC, encoded, len(encoded), self._linkRx)
+
+    def _linkRx(self, encoded: bytes) -> None:
+        if self._isOpen:
+            self._hdlc.decodeBuffer(encoded)
+
+    def _respond(self, msgNum: int, respObj: Dict, msgType: int = RICProtocols.MSG_TYPE_RESPONSE) -> None:
+        self._ricSend(bytes([msgNum, (msgType << 6) + RICProtocols.PROTOCOL_RICREST,
+                    RICProtocols.RICREST_ELEM_CODE_JSON]) + json.dumps(respObj).encode() + b"\0")
+
+    # Simulated firmware (runs on the scheduler thread)
+
+    def _ricRx(self, frame: bytes) -> None:
+        if not self._isOpen or len(frame) < 3:
+            return
+        self.statsFramesToRIC += 1
+        msgNum = frame[0]
+        if frame[1] & 0x3f != RICProtocols.PROTOCOL_RICREST:
+            return
+        elemCode = frame[2]
+        if elemCode == RICProtocols.RICREST_ELEM_CODE_URL:
+            self._respond(msgNum, self._onURL(frame[3:].split(b"\0")[0].decode(errors="replace")))
+        elif elemCode == RICProtocols.RICREST_ELEM_CODE_CMD_FRAME:
+            respObj = self._onCmdFrame(frame[3:].split(b"\0")[0].decode(errors="replace"))
+            if respObj is not None:
+                self._respond(msgNum, respObj)
+        elif elemCode == RICProtocols.RICREST_ELEM_CODE_FILE_BLOCK:
+            if self._upload is not None:
+                self._onFileBlock(frame[3:])
+            elif self._stream is not None:
+                self._onStreamBlock(frame[3:])
+
+    def _onURL(self, url: str) -> Dict:
+        path, _, query = url.partition("?")
+        params = dict(param.partition("=")[::2] for param in re.split("[&;]", query) if param)
+        parts = [part for part in path.split("/") if part]
+        if not parts:
+            return {"rslt": "failUnknownAPI"}
+        api = parts[0]
+        if api == "v":
+            return dict(self.systemInfo, rslt="ok")
+        if api == "hwstatus":
+            return {"rslt": "ok", "hw": self._getHwElems()}
+        if api == "traj":
+            self._onTrajectory(parts[1:], params)
+        elif api == "robot" and len(parts) > 1:
+            self._onRobotCmd(parts[1])
+        elif api == "elem" and params.get("cmd", "") == "raw":
+            # The add-on is read after the response is sent - reported as zeros
+            numToRead = int(params.get("numToRd", 0))
+            self._scheduler.callLater(0, self._respond, 0, {"msgKey": params.get("msgKey", ""),
+                        "hexRd": "00" * numToRead}, RICProtocols.MSG_TYPE_REPORT)
+        elif api == "friendlyname":
+            if len(parts) > 1:
+                self.friendlyName = parts[1]
+            return {"rslt": "ok", "friendlyName": self.friendlyName, "friendlyNameIsSet": 1}
+        elif api == "filelist":
+            return {"rslt": "ok", "fsName": "local", "fsBase": "/local", "folder": "/",
+                    "files": [{"name": name, "size": size} for name, size in self.files.items()]}
+        elif api == "filedelete":
+            if self.files.pop(parts[-1], None) is None:
+                return {"rslt": "fail"}
+        elif api == "audio" and len(parts) == 2 and parts[1] == "vol":
+            return {"rslt": "ok", "vol": 50}
+        return {"rslt": "ok"}
+
+    def _onCmdFrame(self, cmdStr: str) -> Optional[Dict]:
+        cmdName = re.search(r'"cmdName"\s*:\s*"(\w+)"', cmdStr)
+        cmdName = cmdName.group(1) if cmdName else ""
+        if cmdName == "subscription":
+            # Parsed leniently (like the firmware) as ClientMV2 doesn't send strict JSON
+            for pubName, rateHz in self._PUB_REC_RE.findall(cmdStr):
+                self._setPublishRate(pubName, float(rateHz))
+            return {"rslt": "ok"}
+        try:
+            cmd = json.loads(cmdStr)
+        except ValueError:
+            return {"rslt": "failInvalidJSON"}
+        if cmdName == "ufStart":
+            return self._onUploadStart(cmd)
+        if cmdName == "ufEnd":
+            return self._onUploadEnd()
+        if cmdName == "ufCancel":
+            self._upload = None
+            self._stream = None
+        return {"rslt": "ok"}
+
+    def _getHwElems(self) -> List[Dict]:
+        hwElems = [{"name": name, "type": "SmartServo", "busName": "I2CA", "addr": f"0x{0x10 + IDNo:x}",
+                    "IDNo": IDNo, "whoAmI": "", "commsOk": "Y"} for IDNo, name in enumerate(self.SERVO_NAMES)]
+        hwElems.append({"name": "IMU0", "type": "IMU", "busName": "I2CA", "addr": "0x1d",
+                        "IDNo": self.IMU_IDNO, "whoAmI": "", "commsOk": "Y"})
+        hwElems.append({"name": "BattGauge", "type": "FuelGauge", "busName": "I2CA", "addr": "0x55",
+                        "IDNo": self.POWER_IDNO, "whoAmI": "", "commsOk": "Y"})
+        return hwElems
+
+    # Motion
+
+    def _onTrajectory(self, parts: List[str], params: Dict[str, str]) -> None:
+        if not parts:
+            return
+        if parts[0] == "joint":
+            jointId = int(params.get("jointID", -1))
+            if 0 <= jointId < len(self._servoPos):
+                self._servoPos[jointId] = int(float(params.get("angle", 0)))
+        # Trajectories with a count (e.g. traj/step/3) repeat the move time
+        repeats = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+        moveSecs = float(params.get("moveTime", self.TRAJ_DEFAULT_MOVE_MS)) * max(repeats, 1) / 1000
+        timeNow = self._clock.monotonic()
+        self._updateMotion(timeNow)
+        if self._isPaused:
+            self._motionQueue.append(moveSecs)
+        elif self._motionEndTime <= timeNow and not self._motionQueue:
+            self._motionEndTime = timeNow + moveSecs
+        else:
+            self._motionQueue.append(moveSecs)
+
+    def _onRobotCmd(self, robotCmd: str) -> None:
+        timeNow = self._clock.monotonic()
+        self._updateMotion(timeNow)
+        if robotCmd == "stopAfterMove":
+            self._motionQueue.clear()
+        elif robotCmd == "pause":
+            if not self._isPaused:
+                self._isPaused = True
+                self._pausedRemainingSecs = max(self._motionEndTime - timeNow, 0)
+        elif robotCmd == "resume":
+            if self._isPaused:
+                self._isPaused = False
+                self._motionEndTime = timeNow + self._pausedRemainingSecs
+        else:
+            self._motionQueue.clear()
+            self._motionEndTime = 0.0
+            self._isPaused = False
+
+    def _updateMotion(self, timeNow: float) -> None:
+        # Each queued trajectory starts when the one before it ends
+        if self._isPaused:
+            return
+        while self._motionEndTime <= timeNow and self._motionQueue:
+            self._motionEndTime += self._motionQueue.popleft()
+
+    # Publishing
+
+    def _setPublishRate(self, pubName: str, rateHz: float) -> None:
+        if pubName not in self.PUBLISH_TOPICS:
+            return
+        job = self._publishJobs.pop(pubName, None)
+        if job is not None:
+            job.cancel()
+        if rateHz > 0 and self._isOpen:
+            # Published straight away then at the rate
+            self._publish(pubName)
+            self._publishJobs[pubName] = self._scheduler.callEvery(1 / rateHz, self._publish, pubName)
+
+    def _publish(self, pubName: str) -> None:
+        if not self._isOpen:
+            return
+        timeNow = self._clock.monotonic()
+        self._updateMotion(timeNow)
+        rosSerialMsgs = [RICROSSerial.encode(topicID, self._getTopicPayload(topicID, timeNow))
+                         for topicID in self.PUBLISH_TOPICS[pubName]]
+        self.statsPublishFrames += 1
+        self._ricSend(bytes([0, (RICProtocols.MSG_TYPE_PUBLISH << 6) + RICProtocols.PROTOCOL_ROSSERIAL]) +
+                    b"".join(rosSerialMsgs))
+
+    def _getTopicPayload(self, topicID: int, timeNow: float) -> bytes:
+        if topicID == RICROSSerial.ROSTOPIC_V2_SMART_SERVOS:
+            return RICROSSerial.encodeSmartServos([(IDNo, pos, 10, 0x81) for IDNo, pos in enumerate(self._servoPos)])
+        if topicID == RICROSSerial.ROSTOPIC_V2_ACCEL:
+            return RICROSSerial.encodeAccel(0, 0, 1, self.IMU_IDNO)
+        if topicID == RICROSSerial.ROSTOPIC_V2_POWER_STATUS:
+            return RICROSSerial.encodePowerStatus(80, 25, 1600, 2000, -250, 600, 0x0002, self.POWER_IDNO)
+        if topicID == RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS:
+            isMoving = not self._isPaused and self._motionEndTime > timeNow
+            flags = (RICROSSerial.ROS_ROBOT_STATUS_IS_MOVING_MASK if isMoving else 0) | \
+                    (RICROSSerial.ROS_ROBOT_STATUS_IS_PAUSED_MASK if self._isPaused else 0)
+            return RICROSSerial.encodeRobotStatus(flags, len(self._motionQueue), 120000, 90000, (0, 0, 0), 2, 10)
+        # No add-ons are attached
+        return b""
+
+    # File upload and audio streaming
+
+    def _onUploadStart(self, cmd: Dict) -> Dict:
+        if cmd.get("fileType", "") == "rtstream":
+            self._stream = {"rxPos": 0, "playedPos": 0.0, "playTime": None, "stalled": False}
+            return {"rslt": "ok", "streamID": self.STREAM_ID, "maxBlkSize": 1024}
+        resp = {"rslt": "ok", "batchMsgSize": min(cmd.get("batchMsgSize", self.fileBlockMax), self.fileBlockMax),
+                "batchAckSize": self.fileBatchAck}
+        fileName = cmd.get("fileName", "")
+        fileLen = cmd.get("fileLen", 0)
+        resumeFrom = cmd.get("resumeFrom", 0)
+        # An upload which didn't end (cancelled or the connection lost) can be resumed
+        interrupted = self.uploads[-1] if self.uploads and not self.uploads[-1]["isEnded"] else None
+        self._upload = {"fileName": fileName, "fileLen": fileLen, "resumedFrom": None, "rxPos": 0,
+                        "blockCount": 0, "crc": 0, "isEnded": False, "blocksSinceAck": 0}
+        self.uploads.append(self._upload)
+        if self.uploadResume and interrupted is not None and interrupted["fileName"] == fileName and \
+                    interrupted["fileLen"] == fileLen and resumeFrom in self._uploadCRCAtOkTo:
+            self._upload.update(resumedFrom=resumeFrom, rxPos=resumeFrom, crc=self._uploadCRCAtOkTo[resumeFrom])
+            resp["resumeFrom"] = resumeFrom
+        else:
+            self._uploadCRCAtOkTo = {0: 0}
+        return resp
+
+    def _onUploadEnd(self) -> Dict:
+        if self._stream is not None:
+            self._stream = None
+            return {"rslt": "ok"}
+        upload = self._upload
+        self._upload = None
+        if upload is None or upload["rxPos"] != upload["fileLen"]:
+            return {"rslt": "fail"}
+        upload["isEnded"] = True
+        self.files[upload["fileName"]] = upload["fileLen"]
+        return {"rslt": "ok"}
+
+    def _onFileBlock(self, block: bytes) -> None:
+        upload = self._upload
+        blockPos = int.from_bytes(block[:4], 'big')
+        if blockPos != upload["rxPos"]:
+            # Missed a block - the okto is sent when blocks stop arriving
+            self._startUploadAckTimer()
+            return
+        upload["rxPos"] += len(block) - 4
+        upload["crc"] = zlib.crc32(block[4:], upload["crc"])
+        upload["blockCount"] += 1
+        upload["blocksSinceAck"] += 1
+        if upload["blocksSinceAck"] >= self.fileBatchAck or upload["blockCount"] == 1 or \
+                    upload["rxPos"] >= upload["fileLen"]:
+            self._sendUploadOkTo()
+        else:
+            self._startUploadAckTimer()
+
+    def _startUploadAckTimer(self) -> None:
+        # One timer job is used - it waits again if more blocks arrived while it was waiting
+        self._uploadAckDue = self._clock.monotonic() + self.ackTimeoutSecs
+        if self._uploadAckJob is None:
+            self._uploadAckJob = self._scheduler.callAt(self._uploadAckDue, self._onUploadAckTimer)
+
+    def _onUploadAckTimer(self) -> None:
+        self._uploadAckJob = None
+        if self._uploadAckDue is None or self._upload is None:
+            return
+        if self._uploadAckDue > self._clock.monotonic():
+            self._uploadAckJob = self._scheduler.callAt(self._uploadAckDue, self._onUploadAckTimer)
+            return
+        self._sendUploadOkTo()
+
+    def _sendUploadOkTo(self) -> None:
+        upload = self._upload
+        self._uploadAckDue = None
+        upload["blocksSinceAck"] = 0
+        self._uploadCRCAtOkTo[upload["rxPos"]] = upload["crc"]
+        if len(self._uploadCRCAtOkTo) > self.UPLOAD_RESUME_POINTS:
+            self._uploadCRCAtOkTo.pop(next(iter(self._uploadCRCAtOkTo)))
+        self._respond(0, {"okto": upload["rxPos"]})
+
+    def _onStreamBlock(self, block: bytes) -> None:
+        stream = self._stream
+        if block[0] != self.STREAM_ID:
+            return
+        timeNow = self._clock.monotonic()
+        # Playing starts when the first block arrives and stalls (an underrun) if it
+        # runs out of data before the next block
+        if stream["playTime"] is None:
+            stream["playTime"] = timeNow
+        playedPos = stream["playedPos"] + (timeNow - stream["playTime"]) * self.streamBytesPerSec
+        if playedPos > stream["rxPos"]:
+            if stream["rxPos"] > 0 and not stream["stalled"]:
+                self.statsStreamUnderruns += 1
+            stream["stalled"] = True
+            playedPos = stream["rxPos"]
+        stream["playedPos"] = playedPos
+        stream["playTime"] = timeNow
+        streamPos = int.from_bytes(block[1:4], 'big')
+        blockLen = len(block) - 4
+        # Blocks are accepted if they are next and there is room in the buffer
+        if streamPos == stream["rxPos"] and stream["rxPos"] + blockLen - playedPos <= self.streamBufferBytes:
+            stream["rxPos"] += blockLen
+            stream["stalled"] = False
+        self._respond(0, {"sokto": stream["rxPos"]})
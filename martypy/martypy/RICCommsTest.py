@@ -36,7 +36,8 @@ class RICCommsTest(RICCommsBase):
         self._isOpen = False
 
     def send(self, data: bytes) -> None:
-        self.outputInfo["buf"].append(data)
+        # Copied as the sender may reuse the buffer
+        self.outputInfo["buf"].append(bytes(data))
 
     def getTestOutput(self) -> dict:
         dictCopy = copy.deepcopy(self.outputInfo)
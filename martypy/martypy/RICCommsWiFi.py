@@ -6,6 +6,7 @@ from typing import Callable, Dict, Union
 import time
 import logging
 from .RICCommsBase import RICCommsBase
+from .RICCapture import RICCaptureFile
 from .LikeHDLC import LikeHDLC
 from .Exceptions import MartyConnectException
 from .WebSocket import WebSocket
@@ -18,6 +19,9 @@ class RICCommsWiFi(RICCommsBase):
     RICCommsWiFi
     Provides an interface for RIC communications
     '''
+    # Keeps a coalesced websocket frame within a typical TCP segment
+    TX_COALESCE_MAX_BYTES_DEFAULT = 1400
+
     def __init__(self, onReconnect: Callable[[],None]) -> None:
         '''
         Initialise RICCommsWiFi
@@ -59,7 +63,10 @@ class RICCommsWiFi(RICCommsBase):
                         "ipPort",
                         "wsPath",
                         "asciiEscapes",
-                        "autoReconnect"
+                        "autoReconnect",
+                        "hdlcMaxFrameLen",
+                        "txCoalesceSecs",
+                        "txCoalesceMaxBytes"
         Returns:
             True if open succeeded or already open
         Throws:
@@ -99,6 +106,10 @@ class RICCommsWiFi(RICCommsBase):
 
         # Configure HDLC
         self._hdlc.setAsciiEscapes(hdlcAsciiEscapes)
+        self._hdlc.maxFrameLen = openParams.get("hdlcMaxFrameLen", LikeHDLC.MAX_FRAME_LEN_DEFAULT)
+
+        # Coalesced frames are sent in a single websocket frame
+        self._initTxCoalescing(openParams, self.TX_COALESCE_MAX_BYTES_DEFAULT)
 
         # Start receive loop
         self.webSocketThreadEnabled = True
@@ -114,6 +125,7 @@ class RICCommsWiFi(RICCommsBase):
         '''
         if not self._isOpen:
             return
+        self.flush()
         # Stop thread function
         if self.webSocketThread is not None:
             self.webSocketThreadEnabled = False
@@ -137,13 +149,17 @@ class RICCommsWiFi(RICCommsBase):
             MartyConnectException: if the connection has an error
         '''
         # logger.debug(f"WiFi send len {len(data)} {''.join('{:02x}'.format(x) for x in data)}")
+        if self._capture is not None:
+            self._captureFrame(RICCaptureFile.DIR_TX, data)
         hdlcEncoded = self._hdlc.encode(data)
         try:
-            self._sendBytesToIF(hdlcEncoded)
+            self._sendEncoded(hdlcEncoded)
         except Exception as excp:
             raise MartyConnectException("Connection send problem") from excp
 
     def _onHDLCFrame(self, frame: bytes) -> None:
+        if self._capture is not None:
+            self._captureFrame(RICCaptureFile.DIR_RX, frame)
         if self.rxFrameCB is not None:
             self.rxFrameCB(frame)
         
@@ -182,8 +198,7 @@ class RICCommsWiFi(RICCommsBase):
 
     def _onWSBinaryFrame(self, rxFrame: bytes) -> None:
         # logger.debug(f"webSocketRx {rxFrame.hex()}")
-        for rxByte in rxFrame:
-            self._hdlc.decodeData(rxByte)
+        self._hdlc.decodeBuffer(rxFrame)
 
     def _onWSTextFrame(self, rxFrame: str) -> None:
         logger.debug(f"webSocketRx TEXT UNEXPECTED {rxFrame}")
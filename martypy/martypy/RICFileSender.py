@@ -0,0 +1,245 @@
+'''
+RICFileSender
+'''
+from typing import Callable, Deque, Optional, Tuple
+from collections import deque
+import logging
+import threading
+from .RICClock import RICClock
+
+logger = logging.getLogger(__name__)
+
+class RICFileUpload:
+    '''
+    RICFileUpload
+    State of a single file upload - the position RIC has acknowledged (okto) and
+    any problem RIC reports - held per upload so nothing is left over from an
+    earlier transfer
+    '''
+    # Reasons reported by RIC (in ufBlock, ufStatus or ufCancel) which end the upload
+    FAIL_REASONS = ("OTAStartFailed", "notStarted", "userCancel", "failRetries", "failTimeout", "failFileWrite")
+
+    def __init__(self, fileName: str, fileLen: int, clock: Optional[RICClock] = None) -> None:
+        self.fileName = fileName
+        self.fileLen = fileLen
+        self.okTo = 0
+        self.failReason = ""
+        self.otaStartedOK = False
+        self.cancelRequested = False
+        self._newOkTo = False
+        self._cond = threading.Condition()
+        self._clock = clock if clock is not None else RICClock()
+
+    def setStartPos(self, startPos: int) -> None:
+        with self._cond:
+            self.okTo = startPos
+            self._newOkTo = False
+
+    def onOkTo(self, okTo: int) -> None:
+        with self._cond:
+            if self.okTo < okTo:
+                self.okTo = okTo
+            self._newOkTo = True
+            self._cond.notify_all()
+
+    def onStatus(self, reason: str) -> None:
+        with self._cond:
+            if reason == "OTAStartedOK":
+                self.otaStartedOK = True
+            elif reason in self.FAIL_REASONS:
+                self.failReason = reason
+            self._cond.notify_all()
+
+    def requestCancel(self) -> None:
+        with self._cond:
+            self.cancelRequested = True
+            self._cond.notify_all()
+
+    def isFailed(self) -> bool:
+        return self.failReason != ""
+
+    def waitForOkTo(self, timeOutSecs: float) -> Tuple[bool, int]:
+        '''
+        Wait for an okto (or for the upload to fail or be cancelled)
+        Returns:
+            isNewOkTo: True if an okto has arrived since the last call
+            okTo: highest okto received
+        '''
+        with self._cond:
+            self._clock.waitFor(self._cond, lambda: self._newOkTo or self.isFailed() or self.cancelRequested, timeOutSecs)
+            isNew = self._newOkTo
+            self._newOkTo = False
+            return isNew, self.okTo
+
+    def waitForOTAStart(self, timeOutSecs: float) -> bool:
+        with self._cond:
+            return self._clock.waitFor(self._cond, lambda: self.otaStartedOK or self.isFailed() or self.cancelRequested,
+                        timeOutSecs) and self.otaStartedOK
+
+class RICFileSender:
+    '''
+    RICFileSender
+    Sends file blocks to RIC with a sliding window - blocks are sent while fewer than
+    the window's bytes are unacknowledged and the window moves on as soon as an okto
+    arrives. The window tracks the measured upload rate and round-trip time and, if
+    no progress is acknowledged within the ack time-out, blocks are sent again from
+    the last okto
+    '''
+    # Limits on the adaptive ack time-out (the upper limit is RICInterface.BLOCK_ACK_TIMEOUT)
+    ACK_TIMEOUT_MIN_SECS = 0.5
+    # Longest wait before the progress callback is called again
+    PROGRESS_CHECK_SECS = 1.0
+
+    def __init__(self, ricInterface: 'RICInterface'):
+        self._ricInterface = ricInterface
+        # Maximum bytes in flight - the window is never smaller than two ack batches
+        self.maxWindowBytes = 200000
+        # Blocks are made smaller than negotiated (down to this size) after time-outs
+        self.minBlockSize = 500
+        # Stats for the last transfer
+        self.statsBlocksSent = 0
+        self.statsRetransmits = 0
+        self.statsTimeouts = 0
+        self.windowBytes = 0
+        self.blockSize = 0
+        self.srttSecs = 0.0
+        self.DEBUG_FILE_SENDER = False
+
+    def sendData(self, upload: RICFileUpload, fileData: memoryview, blockMaxSize: int, batchAckSize: int,
+                progressCB: Callable[[int, int, 'RICInterface'], bool] = None) -> bool:
+        '''
+        Send file data once the transfer has been started with ufStart
+        Args:
+            upload: state of the upload (sending starts from its okto, which is more than
+                    zero when resuming an upload)
+            fileData: contents of the file
+            blockMaxSize: block size negotiated with RIC
+            batchAckSize: number of blocks RIC receives before sending an okto
+            progressCB: see RICInterface.sendFile()
+        Returns:
+            True if all of the data was acknowledged
+        '''
+        ricIF = self._ricInterface
+        clock = ricIF.clock
+        fileLen = len(fileData)
+        startPos = upload.okTo
+        frameBuf = bytearray()
+        self.statsBlocksSent = 0
+        self.statsRetransmits = 0
+        self.statsTimeouts = 0
+
+        # RIC only sends an okto when a batch is complete so the window is at least two
+        # batches - one batch is on its way while the okto for the other comes back
+        self.blockSize = blockMaxSize
+        minWindowBytes = 2 * blockMaxSize * max(batchAckSize, 1)
+        self.windowBytes = minWindowBytes
+        maxWindowBytes = max(self.maxWindowBytes, minWindowBytes)
+
+        # Round-trip time estimates (the minimum is used to size the window so queueing
+        # in the link doesn't inflate it) - until the first okto the time-out is long
+        # as RIC may start a long-running task when the first block arrives
+        self.srttSecs = 0.0
+        rttVarSecs = 0.0
+        minRttSecs = 0.0
+        ackTimeoutSecs = ricIF.BLOCK_ACK_TIMEOUT
+
+        # Send positions - inFlight has the end position and send time of each block
+        # which hasn't been acknowledged
+        okTo = startPos
+        sendPos = startPos
+        inFlight: Deque[Tuple[int, float]] = deque()
+        rttValidFrom = 0
+        retryCount = 0
+        lastAckTime = clock.monotonic()
+        ignoreDupOkToUntil = 0.0
+
+        while okTo < fileLen:
+
+            # Send blocks to fill the window (the first block is sent on its own)
+            windowEnd = min(okTo + self.windowBytes if okTo > startPos else okTo + self.blockSize, fileLen)
+            if sendPos < windowEnd:
+                while sendPos < windowEnd:
+                    blockLen = min(self.blockSize, fileLen - sendPos)
+                    ricIF.ricProtocols.encodeRICRESTFileBlockInto(frameBuf, sendPos,
+                                fileData[sendPos:sendPos+blockLen])
+                    ricIF._sendFileBlockFrame(frameBuf)
+                    sendPos += blockLen
+                    inFlight.append((sendPos, clock.monotonic()))
+                    self.statsBlocksSent += 1
+                ricIF.commsHandler.flush()
+
+            # Wait for an okto
+            timeNow = clock.monotonic()
+            isNewOkTo, newOkTo = upload.waitForOkTo(
+                        min(max(lastAckTime + ackTimeoutSecs - timeNow, 0), self.PROGRESS_CHECK_SECS))
+            if ricIF._sendFileProgressCheckAbort(upload, progressCB, newOkTo, fileLen):
+                return False
+            timeNow = clock.monotonic()
+
+            if isNewOkTo and newOkTo > okTo:
+                # Round-trip time of the last block acknowledged (not measured for resent
+                # blocks as the okto may be for the original)
+                blockSendTime = None
+                while inFlight and inFlight[0][0] <= newOkTo:
+                    _, blockSendTime = inFlight.popleft()
+                if blockSendTime is not None and newOkTo > rttValidFrom:
+                    rttSecs = timeNow - blockSendTime
+                    if self.srttSecs == 0:
+                        self.srttSecs = rttSecs
+                        rttVarSecs = rttSecs / 2
+                        minRttSecs = rttSecs
+                    else:
+                        rttVarSecs = 0.75 * rttVarSecs + 0.25 * abs(self.srttSecs - rttSecs)
+                        self.srttSecs = 0.875 * self.srttSecs + 0.125 * rttSecs
+                        minRttSecs = min(minRttSecs, rttSecs)
+                    ackTimeoutSecs = min(max(self.srttSecs + 4 * rttVarSecs, self.ACK_TIMEOUT_MIN_SECS),
+                                ricIF.BLOCK_ACK_TIMEOUT)
+
+                # Upload rate
+                elapsedTime = timeNow - lastAckTime
+                if elapsedTime > 0 and okTo > startPos:
+                    ricIF.uploadBytesPerSec.add((newOkTo - okTo) / elapsedTime)
+
+                # Window is twice the bandwidth-delay product so the link stays busy
+                # while oktos are on their way back
+                bytesPerSec = ricIF.uploadBytesPerSec.getAvg()
+                if bytesPerSec > 0 and minRttSecs > 0:
+                    self.windowBytes = int(min(max(2 * bytesPerSec * minRttSecs, minWindowBytes), maxWindowBytes))
+
+                # Blocks go back up to the negotiated size while data is getting through
+                self.blockSize = min(self.blockSize * 2, blockMaxSize)
+                okTo = newOkTo
+                lastAckTime = timeNow
+                retryCount = 0
+                if self.DEBUG_FILE_SENDER:
+                    logger.debug(f"RICFileSender okto {okTo} window {self.windowBytes} srtt {self.srttSecs} " +
+                                f"timeout {ackTimeoutSecs}")
+                continue
+
+            # An okto without progress means RIC has missed data (unless it is for data
+            # sent before blocks were resent) - otherwise wait until the ack time-out
+            if isNewOkTo and (sendPos <= okTo or timeNow < ignoreDupOkToUntil):
+                continue
+            if not isNewOkTo and timeNow < lastAckTime + ackTimeoutSecs:
+                continue
+            if not isNewOkTo:
+                self.statsTimeouts += 1
+                ackTimeoutSecs = min(ackTimeoutSecs * 2, ricIF.BLOCK_ACK_TIMEOUT)
+                self.blockSize = max(self.blockSize // 2, min(self.minBlockSize, blockMaxSize))
+            retryCount += 1
+            if retryCount > ricIF.BATCH_RETRY_MAX:
+                logger.warning(f"RICFileSender no progress from {okTo} after {retryCount} retries")
+                return False
+
+            # Send again from the last okto with the window back at its minimum
+            if self.DEBUG_FILE_SENDER:
+                logger.debug(f"RICFileSender resending from {okTo} sent to {sendPos} newOkTo {isNewOkTo}")
+            if sendPos > okTo:
+                self.statsRetransmits += 1
+            rttValidFrom = sendPos
+            sendPos = okTo
+            inFlight.clear()
+            self.windowBytes = minWindowBytes
+            lastAckTime = timeNow
+            ignoreDupOkToUntil = timeNow + max(self.srttSecs, self.ACK_TIMEOUT_MIN_SECS)
+        return True
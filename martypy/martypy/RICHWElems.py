@@ -5,24 +5,26 @@ Class supporting the hardware on RIC
 
 import logging
 import time
+from .RICClock import RICClock
 from .RICROSSerial import RICROSSerial
-from typing import Dict, List, Tuple, Union
-from .ValueAverager import ValueAverager
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from .WindowedStats import WindowedCounter
 
 logger = logging.getLogger(__name__)
 
 class RICHwSmartServos:
-    def __init__(self) -> None:
+    def __init__(self, timeFn: Callable[[], float] = time.time) -> None:
+        self._timeFn = timeFn
         self.latestMsg: bytes = None
         self.latestMsgTime: float = None
         self.validForSecs = 3
 
     def update(self, msgPayload: bytes) -> None:
         self.latestMsg = msgPayload
-        self.latestMsgTime = time.time()
+        self.latestMsgTime = self._timeFn()
 
     def status(self, dictOfHwElemsByIdNo: Dict) -> Dict:
-        if self.latestMsgTime is None or time.time() > self.latestMsgTime + self.validForSecs:
+        if self.latestMsgTime is None or self._timeFn() > self.latestMsgTime + self.validForSecs:
             return {}
         servosStatus = RICROSSerial.extractSmartServos(self.latestMsg)
         fieldsToCopy = ["name"]
@@ -39,7 +41,8 @@ class RICHwSmartServos:
         return status.get(servoId, {})
 
 class RICHwIMU:
-    def __init__(self) -> None:
+    def __init__(self, timeFn: Callable[[], float] = time.time) -> None:
+        self._timeFn = timeFn
         self.latestMsg: bytes = None
         self.latestMsgTime: float = None
         self.validForSecs = 3
@@ -48,7 +51,7 @@ class RICHwIMU:
         if len(msgPayload) < RICROSSerial.ROS_ACCEL_BYTES:
             return
         self.latestMsg = msgPayload
-        self.latestMsgTime = time.time()
+        self.latestMsgTime = self._timeFn()
         # logger.debug(f"IMU update len {len(msgPayload)}")
 
     def xyz(self) -> Tuple[float, float, float]:
@@ -57,13 +60,14 @@ class RICHwIMU:
         return RICROSSerial.extractAccel(self.latestMsg)
 
     def axisVal(self, axisCode: int) -> float:
-        if self.latestMsgTime is None or time.time() > self.latestMsgTime + self.validForSecs:
+        if self.latestMsgTime is None or self._timeFn() > self.latestMsgTime + self.validForSecs:
             return 0
         xyzTuple = RICROSSerial.extractAccel(self.latestMsg)
         return xyzTuple[axisCode]
 
 class RICHwPowerStatus:
-    def __init__(self) -> None:
+    def __init__(self, timeFn: Callable[[], float] = time.time) -> None:
+        self._timeFn = timeFn
         self.latestMsg: bytes = None
         self.latestMsgTime: float = None
         self.validForSecs = 5
@@ -72,17 +76,18 @@ class RICHwPowerStatus:
         if len(msgPayload) < RICROSSerial.ROS_POWER_STATUS_BYTES:
             return
         self.latestMsg = msgPayload
-        self.latestMsgTime = time.time()
+        self.latestMsgTime = self._timeFn()
 
     def powerStatus(self) -> Dict:
-        if self.latestMsgTime is None or time.time() > self.latestMsgTime + self.validForSecs:
+        if self.latestMsgTime is None or self._timeFn() > self.latestMsgTime + self.validForSecs:
             return {}
         curPowerStatus = RICROSSerial.extractPowerStatus(self.latestMsg)
         curPowerStatus["updateTime"] = self.latestMsgTime
         return curPowerStatus
 
 class RICHwAddOnStatus:
-    def __init__(self):
+    def __init__(self, timeFn: Callable[[], float] = time.time) -> None:
+        self._timeFn = timeFn
         self.latestMsg: bytes = None
         self.latestMsgTime: float = None
         self.addOnNameToIdMap = {}
@@ -90,10 +95,10 @@ class RICHwAddOnStatus:
 
     def update(self, msgPayload: bytes) -> None:
         self.latestMsg = msgPayload
-        self.latestMsgTime = time.time()
+        self.latestMsgTime = self._timeFn()
 
     def status(self, dictOfHwElemsByIdNo: Dict) -> Dict:
-        if self.latestMsgTime is None or time.time() > self.latestMsgTime + self.validForSecs:
+        if self.latestMsgTime is None or self._timeFn() > self.latestMsgTime + self.validForSecs:
             return {}
         addOnStatus = RICROSSerial.extractAddOnStatus(self.latestMsg)
         addOnStatus["updateTime"] = self.latestMsgTime
@@ -116,7 +121,8 @@ class RICHwAddOnStatus:
         return status.get(addOnId, {})
 
 class RICHwRobotStatus:
-    def __init__(self):
+    def __init__(self, timeFn: Callable[[], float] = time.time) -> None:
+        self._timeFn = timeFn
         self.latestMsg: bytes = None
         self.latestMsgTime: float = None
         self.validForSecs = 3
@@ -125,43 +131,43 @@ class RICHwRobotStatus:
         if len(msgPayload) < RICROSSerial.ROS_ROBOT_STATUS_BYTES_MINIMAL:
             return
         self.latestMsg = msgPayload
-        self.latestMsgTime = time.time()
+        self.latestMsgTime = self._timeFn()
 
     def status(self) -> Dict:
-        if self.latestMsgTime is None or time.time() > self.latestMsgTime + self.validForSecs:
+        if self.latestMsgTime is None or self._timeFn() > self.latestMsgTime + self.validForSecs:
             return {}
         curRobotStatus = RICROSSerial.extractRobotStatus(self.latestMsg)
         curRobotStatus["updateTime"] = self.latestMsgTime
         return curRobotStatus
 class RICHwPublishMonitor:
     
-    def __init__(self):
-        self._pubRecs = {}
+    # Window (in seconds) for the <topic>PS publish rates
+    PUBLISH_RATE_WINDOW_SECS = 10
+
+    def __init__(self, timeFn: Callable[[], float] = time.monotonic):
+        # Messages on each topic are counted per second so rates can be read over any
+        # window up to a minute
+        self._timeFn = timeFn
+        self._pubCounters: Dict[int, WindowedCounter] = {}
 
     def update(self, topicID):
-        nowTime = time.time()
-        if topicID in self._pubRecs:
-            pubData = self._pubRecs[topicID]
-            lastMsgTime = pubData.get("lastMsgTime", 0)
-            timeInterval = nowTime - lastMsgTime
-            pubData["averager"].add(timeInterval)
-            pubData["lastMsgTime"] = nowTime
-        else:
-            self._pubRecs[topicID] = {
-                "averager": ValueAverager(10),
-                "lastMsgTime": nowTime
-            }
+        pubCounter = self._pubCounters.get(topicID)
+        if pubCounter is None:
+            pubCounter = self._pubCounters.setdefault(topicID, WindowedCounter(60, self._timeFn))
+        pubCounter.add()
 
     def getPublishStats(self):
         pubRateStats = {}
-        for topicID in self._pubRecs:
-            timeAvgPerMsg = self._pubRecs[topicID]["averager"].getAvg()
-            pubRateAvg = 0
-            if timeAvgPerMsg > 0:
-                pubRateAvg = round(1/timeAvgPerMsg, 2)
-            pubRateStats[self.topicIDToStr(topicID)+"PS"] = pubRateAvg
+        for topicName, pubRate in self.getPublishRates(self.PUBLISH_RATE_WINDOW_SECS).items():
+            pubRateStats[topicName+"PS"] = pubRate
         return pubRateStats
 
+    def getPublishRates(self, windowSecs: int) -> Dict[str, float]:
+        pubRates = {}
+        for topicID, pubCounter in list(self._pubCounters.items()):
+            pubRates[self.topicIDToStr(topicID)] = round(pubCounter.getRate(windowSecs), 2)
+        return pubRates
+
     def topicIDToStr(self, topicID):
         if topicID == RICROSSerial.ROSTOPIC_V2_SMART_SERVOS:
             return "servos"
@@ -176,13 +182,15 @@ class RICHwPublishMonitor:
         return "unknown"
 class RICHWElems:
 
-    def __init__(self):
-        self._smartServos = RICHwSmartServos()
-        self._IMU = RICHwIMU()
-        self._powerStatus = RICHwPowerStatus()
-        self._addOnsStatus = RICHwAddOnStatus()
-        self._robotStatus = RICHwRobotStatus()
-        self._publishMonitor = RICHwPublishMonitor()
+    def __init__(self, clock: Optional[RICClock] = None):
+        # Published data is timed (and expires) using the connection's clock
+        clock = clock if clock is not None else RICClock()
+        self._smartServos = RICHwSmartServos(clock.time)
+        self._IMU = RICHwIMU(clock.time)
+        self._powerStatus = RICHwPowerStatus(clock.time)
+        self._addOnsStatus = RICHwAddOnStatus(clock.time)
+        self._robotStatus = RICHwRobotStatus(clock.time)
+        self._publishMonitor = RICHwPublishMonitor(clock.monotonic)
 
     def updateWithROSSerialMsg(self, topicID: int, payload: bytes) -> None:
         # logger.debug(f"Received ROSSerial topicID {topicID}")
@@ -236,3 +244,6 @@ class RICHWElems:
 
     def getPublishStats(self):
         return self._publishMonitor.getPublishStats()
+
+    def getPublishRates(self, windowSecs: int) -> Dict[str, float]:
+        return self._publishMonitor.getPublishRates(windowSecs)
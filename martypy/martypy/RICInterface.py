@@ -1,17 +1,27 @@
 '''
 RICInterface
 '''
-from typing import Callable, Dict, Union, Optional
+from typing import Callable, Dict, Iterator, List, Union, Optional
+from concurrent.futures import Future
+import concurrent.futures
+import contextlib
+import mmap
 import time
 import threading
 import logging
-import json
 import os
+import re
 from .RICProtocols import DecodedMsg, RICProtocols
+from .RICClock import RICClock
 from .RICCommsBase import RICCommsBase
+from .RICMsgTable import RICMsgRec, RICMsgTable
+from .RICScheduler import RICScheduler
+from .RICFileSender import RICFileSender, RICFileUpload
+from .RICTracer import RICTracer, RICTraceRec
 from .RateAverager import RateAverager
 from .ValueAverager import ValueAverager
-from .Exceptions import MartyTransferException
+from .WindowedStats import WindowedHistogram
+from .Exceptions import MartyCommandException, MartyTransferException
 
 logger = logging.getLogger(__name__)
 
@@ -19,49 +29,76 @@ class RICInterface:
     '''
     RICInterface
     '''
-    def __init__(self, commsHandler: RICCommsBase) -> None:
+    # Commands sent straight away when the connection coalesces transmitted frames
+    FLUSH_NOW_URL_PREFIXES = ("robot/stop", "robot/panic", "robot/pause")
+    # Windows (in seconds) statistics are reported over
+    STATS_WINDOWS_SECS = (1, 10, 60)
+    # Round-trip histograms cover 0.1ms to 60s with buckets 10% apart
+    ROUND_TRIP_BUCKET_EDGES = WindowedHistogram.logBucketEdges(0.0001, 60, 1.1)
+    # Commands of other kinds share a round-trip histogram once there are this many kinds
+    ROUND_TRIP_FAMILIES_MAX = 32
+    _CMD_NAME_RE = re.compile(rb'"cmdName"\s*:\s*"([^"]*)"')
+
+    def __init__(self, commsHandler: RICCommsBase, scheduler: Optional[RICScheduler] = None,
+                clock: Optional[RICClock] = None) -> None:
         '''
         Initialise RICInterface
+        Args:
+            commsHandler: connection to RIC
+            scheduler: runs message time-outs and the timer callback (None to use
+                the scheduler shared by all connections in the process or, if a
+                clock is given, a scheduler on that clock)
+            clock: time-outs, waits, file and stream pacing and statistics use this
+                clock (None for real time) - see RICVirtualClock
         '''
         self.commsHandler = commsHandler
+        self.clock = clock if clock is not None else RICClock()
+        # A scheduler created here is stopped when the interface closes
+        self._ownScheduler = scheduler is None and clock is not None
+        if scheduler is None:
+            scheduler = RICScheduler.getDefault() if clock is None else RICScheduler(clock)
+        self._scheduler = scheduler
+        self._timerJob = None
         self.ricProtocols = RICProtocols()
         self.decodedMsgCB = None
         self.logLineCB = None
         # Message command/response matching
         self.msgTimerCB = None
-        self._msgsOutstanding: Dict = {}
-        self._msgsOutstandingLock = threading.Lock()
+        self._msgsOutstanding = RICMsgTable(clock=self.clock)
         self.msgRespTimeoutSecs = 1.5
+        # Command batches (per thread) - see startCmdBatch()
+        self._cmdBatch = threading.local()
         # AddOn QueryRaw message matching
         self._rawQueryOutstanding: Dict = {}
         self._rawQueryOutstandingLock = threading.Lock()
         self._rawQueryMsgKey = 1
         # Stats
-        self.msgRxRate = RateAverager()
-        self.msgTxRate = RateAverager()
+        self.msgRxRate = RateAverager(timeFn=self.clock.monotonic)
+        self.msgTxRate = RateAverager(timeFn=self.clock.monotonic)
         self.roundTripInfo = ValueAverager()
+        self._roundTripHists: Dict[str, WindowedHistogram] = \
+                    {"": WindowedHistogram(self.ROUND_TRIP_BUCKET_EDGES, timeFn=self.clock.monotonic)}
+        self._roundTripHistsLock = threading.Lock()
+        # Message lifecycle tracing (see setTracer())
+        self.tracer: Optional[RICTracer] = None
         self.statsMatched = 0
         self.statsUnMatched = 0
         self.statsUnNumbered = 0
         self.statsTimedOut = 0
         self.uploadBytesPerSec = ValueAverager()
-        # File send vars
-        self._fileOTAStartFailed = False
-        self._fileOTAStartedOK = False
-        self._fileNotStarted = False
-        self._fileUserCancel = False
-        self._fileSendOkTo = 0
-        self._fileSendNewOkTo = False
-        self._fileFailedInFirmware = False
+        # File send vars - the upload in progress (RIC handles one at a time)
+        self._fileUpload: Optional[RICFileUpload] = None
         self.BLOCK_ACK_TIMEOUT = 15
         self.BATCH_RETRY_MAX = 3
-        self._fileFailedWrite = False
         self._streamSendOkTo = 0
         self._streamClosed = False
         self._streamSendNewOkTo = False
+        self._streamOkToEvent = threading.Event()
         # Streaming
         from .RICStreamHandler import RICStreamHandler
         self._ricStreamHandler = RICStreamHandler(self)
+        # File upload
+        self._fileSender = RICFileSender(self)
         # Debug
         self.DEBUG_RIC_SEND_MSG = False
         self.DEBUG_RIC_SEND_FILE_BLOCK = False
@@ -86,15 +123,14 @@ class RICInterface:
         '''
         self.commsHandler.setRxFrameCB(self._onRxFrameCB)
         self.commsHandler.setRxLogLineCB(self._onLogLineCB)
+        self.commsHandler.setScheduler(self._scheduler)
         openOk = self.commsHandler.open(openParams)
 
         # Set default timeout based on interface
         self.msgRespTimeoutSecs = self.commsHandler.getMsgRespTimeoutSecs(self.msgRespTimeoutSecs)
 
-        # Start timer to check message completion
-        self.msgTimeoutCheckTimer = threading.Timer(1.0, self._msgTimeoutCheck)
-        self.msgTimeoutCheckTimer.daemon = True
-        self.msgTimeoutCheckTimer.start()
+        # Start timer
+        self._startTimer()
         return openOk
 
     def close(self) -> None:
@@ -105,7 +141,13 @@ class RICInterface:
         Returns:
             None
         '''
+        if self._timerJob is not None:
+            self._timerJob.cancel()
+            self._timerJob = None
         self.commsHandler.close()
+        self.commsHandler.stopCapture()
+        if self._ownScheduler:
+            self._scheduler.stop()
 
     def isOpen(self) -> None:
         return self.commsHandler.isOpen()
@@ -149,13 +191,19 @@ class RICInterface:
         Returns:
             True if message sent
         '''
-        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTURL(msg)
         timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
-        with self._msgsOutstandingLock:
-            self._msgsOutstanding[msgNum] = {"timeSent": time.time(), "timeOutSecs": timeOutSecs}
+        msgRec = self._allocMsg(timeOutSecs, family=self._urlFamily(msg))
+        traceRec = self._traceStart(msg, msgRec) if self.tracer is not None else None
+        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTURL(msg, msgRec.msgNum)
+        if traceRec is not None:
+            traceRec.encodeEndNs = traceRec.writeStartNs = time.perf_counter_ns()
         if self.DEBUG_RIC_SEND_MSG:
-            logger.debug(f"sendRICRESTURL msgNum {msgNum} time {time.time()} msg {msg}")
+            logger.debug(f"sendRICRESTURL msgNum {msgNum} time {self.clock.time()} msg {msg}")
         self.commsHandler.send(ricRestMsg)
+        if msg.startswith(self.FLUSH_NOW_URL_PREFIXES):
+            self.commsHandler.flush()
+        if traceRec is not None:
+            traceRec.writeEndNs = time.perf_counter_ns()
         self.msgTxRate.addSample()
         return True
 
@@ -168,14 +216,19 @@ class RICInterface:
         Returns:
             Response turned into a dictionary (from JSON)
         '''
-        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTURL(msg)
-        msgSendTime = time.time()
         timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
+        msgRec = self._allocMsg(timeOutSecs, awaited=True, family=self._urlFamily(msg))
+        traceRec = self._traceStart(msg, msgRec) if self.tracer is not None else None
+        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTURL(msg, msgRec.msgNum)
+        if traceRec is not None:
+            traceRec.encodeEndNs = traceRec.writeStartNs = time.perf_counter_ns()
+        msgSendTime = msgRec.timeSent
         if self.DEBUG_RIC_SEND_MSG:
             logger.debug(f"cmdRICRESTURLSync msgNum {msgNum} timeout {timeOutSecs} msg {msg}")
-        with self._msgsOutstandingLock:
-            self._msgsOutstanding[msgNum] = {"timeSent": msgSendTime, "timeOutSecs": timeOutSecs, "awaited":True}
         self.commsHandler.send(ricRestMsg)
+        self.commsHandler.flush()
+        if traceRec is not None:
+            traceRec.writeEndNs = time.perf_counter_ns()
         self.msgTxRate.addSample()
         # Wait for result
         return self.waitForSyncResult(msgNum, msgSendTime, timeOutSecs)
@@ -189,9 +242,90 @@ class RICInterface:
         Returns:
             Response turned into a dictionary (from JSON)
         '''
+        cmdBatch = getattr(self._cmdBatch, "futures", None)
+        if cmdBatch is not None:
+            cmdBatch.append(self.submit(msg, timeOutSecs))
+            return True
         response = self.cmdRICRESTURLSync(msg, timeOutSecs)
         return response.get("rslt", "") == "ok"
 
+    def submit(self, msg: str, timeOutSecs: Optional[float] = None) -> Future:
+        '''
+        Send RICREST URL message without waiting for the response
+        Args:
+            msg: string containing command URL
+            timeOutSecs: message time-out override in seconds (or None to use default)
+        Returns:
+            Future which is completed with the response turned into a dictionary (from JSON)
+            or {"rslt":"failTimeout"} if no response is received
+        '''
+        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
+        future = Future()
+        msgRec = self._allocMsg(timeOutSecs, future=future, family=self._urlFamily(msg))
+        traceRec = self._traceStart(msg, msgRec) if self.tracer is not None else None
+        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTURL(msg, msgRec.msgNum)
+        if traceRec is not None:
+            traceRec.encodeEndNs = traceRec.writeStartNs = time.perf_counter_ns()
+        if self.DEBUG_RIC_SEND_MSG:
+            logger.debug(f"submit msgNum {msgNum} timeout {timeOutSecs} msg {msg}")
+        self.commsHandler.send(ricRestMsg)
+        if msg.startswith(self.FLUSH_NOW_URL_PREFIXES):
+            self.commsHandler.flush()
+        if traceRec is not None:
+            traceRec.writeEndNs = time.perf_counter_ns()
+        self.msgTxRate.addSample()
+        return future
+
+    def gatherResults(self, futures: List[Future], timeOutSecs: Optional[float] = None) -> List[Dict]:
+        '''
+        Wait for the responses to messages sent using submit()
+        Args:
+            futures: futures returned by submit()
+            timeOutSecs: maximum time to wait for all responses (or None to use
+                twice the default message time-out)
+        Returns:
+            List of responses in the same order as futures
+        '''
+        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs * 2
+        self.commsHandler.flush()
+        done, _ = self.clock.waitFutures(futures, timeOutSecs)
+        return [future.result() if future in done else {"rslt":"failTimeout"} for future in futures]
+
+    def gatherRslt(self, futures: List[Future], timeOutSecs: Optional[float] = None) -> bool:
+        '''
+        Wait for the responses to messages sent using submit()
+        Args:
+            futures: futures returned by submit()
+            timeOutSecs: maximum time to wait for all responses (or None for default)
+        Returns:
+            True if all responses have rslt ok
+        '''
+        return all(resp.get("rslt", "") == "ok" for resp in self.gatherResults(futures, timeOutSecs))
+
+    def startCmdBatch(self) -> None:
+        '''
+        Start a batch of independent commands on this thread - until endCmdBatch() is
+        called cmdRICRESTRslt() sends without waiting and returns True, so the commands
+        are pipelined and the whole batch takes around one round trip
+        Returns:
+            None
+        '''
+        self._cmdBatch.futures = []
+
+    def endCmdBatch(self, timeOutSecs: Optional[float] = None) -> bool:
+        '''
+        End a batch of commands and wait for all of the responses
+        Args:
+            timeOutSecs: maximum time to wait for all responses (or None for default)
+        Returns:
+            True if all commands in the batch succeeded
+        '''
+        futures = getattr(self._cmdBatch, "futures", None)
+        self._cmdBatch.futures = None
+        if not futures:
+            return True
+        return self.gatherRslt(futures, timeOutSecs)
+
     def sendRICRESTCmdFrame(self, msg: Union[str,bytes], 
                     payload: Union[bytes, str, None] = None, timeOutSecs: Optional[float] = None) -> bool:
         '''
@@ -203,13 +337,17 @@ class RICInterface:
         Returns:
             True if message sent
         '''
-        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTCmdFrame(msg, payload)
+        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
+        msgRec = self._allocMsg(timeOutSecs, family=self._cmdFrameFamily(msg))
+        traceRec = self._traceStart(msg, msgRec) if self.tracer is not None else None
+        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTCmdFrame(msg, payload, msgRec.msgNum)
+        if traceRec is not None:
+            traceRec.encodeEndNs = traceRec.writeStartNs = time.perf_counter_ns()
         if self.DEBUG_RIC_SEND_MSG:
             logger.debug(f"sendRICRESTCmdFrame msgNum {msgNum} len {len(ricRestMsg)} msg {msg}")
-        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
-        with self._msgsOutstandingLock:
-            self._msgsOutstanding[msgNum] = {"timeSent": time.time(), "timeOutSecs": timeOutSecs}
         self.commsHandler.send(ricRestMsg)
+        if traceRec is not None:
+            traceRec.writeEndNs = time.perf_counter_ns()
         self.msgTxRate.addSample()
         return True
 
@@ -226,41 +364,51 @@ class RICInterface:
             Response turned into a dictionary (from JSON)
         '''
         # Encode frame
-        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTCmdFrame(msg, payload)
+        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
+        msgRec = self._allocMsg(timeOutSecs, awaited=True, family=self._cmdFrameFamily(msg))
+        traceRec = self._traceStart(msg, msgRec) if self.tracer is not None else None
+        ricRestMsg, msgNum = self.ricProtocols.encodeRICRESTCmdFrame(msg, payload, msgRec.msgNum)
+        if traceRec is not None:
+            traceRec.encodeEndNs = traceRec.writeStartNs = time.perf_counter_ns()
+        msgSendTime = msgRec.timeSent
         if self.DEBUG_RIC_SEND_MSG:
             logger.debug(f"sendRICRESTCmdFrameSync msgNum {msgNum} len {len(ricRestMsg)} msg {msg}")
-        msgSendTime = time.time()
-        timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
-        with self._msgsOutstandingLock:
-            self._msgsOutstanding[msgNum] = {"timeSent": msgSendTime, "timeOutSecs": timeOutSecs, "awaited":True}
         self.commsHandler.send(ricRestMsg)
+        self.commsHandler.flush()
+        if traceRec is not None:
+            traceRec.writeEndNs = time.perf_counter_ns()
         self.msgTxRate.addSample()
         # Wait for result
         return self.waitForSyncResult(msgNum, msgSendTime, timeOutSecs)
 
     def waitForSyncResult(self, msgNum: int, msgSendTime: float, timeOutSecs: int):
-        while time.time() < msgSendTime + timeOutSecs:
-            with self._msgsOutstandingLock:
-                # Should be an outstanding message - if not there's a problem
-                if msgNum not in self._msgsOutstanding:
-                    logger.warning(f"sendRICRESTURLSync msgNum {msgNum} not in _msgsOutstanding")
-                    return {"rslt":"failResponse"}
-                # Check if response received
-                if self._msgsOutstanding[msgNum].get("respValid", False):
-                    try:
-                        # Get response
-                        respStr = self._msgsOutstanding[msgNum].get("resp", None)
-                        respObj = {}
-                        if respStr:
-                            respObj = json.loads(respStr.payload.rstrip('\0'))
-                        # debugMsgRespTime = self._msgsOutstanding[msgNum].get("respTime", 0)
-                        # logger.debug(f"waitForSyncResult msgNum {msgNum} msg {msg} resp {json.dumps(respObj)} sendTime {msgSendTime} respTime {debugMsgRespTime}")
-                        return respObj
-                    except Exception as excp:
-                        logger.warning(f"sendRICRESTURLSync msgNum {msgNum} response is not JSON", exc_info=True)
-            time.sleep(0.01)
-        # Debug - if we get here we timed out
-        logger.warning(f"waitForSyncResult failTimeout msgNum {msgNum} sendTime {msgSendTime} timeNow {time.time()} timeout {timeOutSecs}")
+        with self._msgsOutstanding.lock:
+            # Should be an outstanding message that is awaited - if not there's a problem
+            msgRec = self._msgsOutstanding.get(msgNum)
+        if msgRec is None or msgRec.respEvent is None:
+            logger.warning(f"sendRICRESTURLSync msgNum {msgNum} not in _msgsOutstanding")
+            return {"rslt":"failResponse"}
+        # Wait for the receive thread to signal that the response has arrived
+        if self.clock.wait(msgRec.respEvent, max(msgSendTime + timeOutSecs - self.clock.time(), 0)):
+            if msgRec.trace is not None:
+                msgRec.trace.wakeNs = time.perf_counter_ns()
+            # The slot is free for reuse once the response has been taken
+            with self._msgsOutstanding.lock:
+                self._msgsOutstanding.release(msgRec)
+            respMsg = msgRec.resp
+            if respMsg is None:
+                return {}
+            # Get response (the JSON is parsed once and cached in the message)
+            respObj = respMsg.getJSONDict()
+            if respMsg.getJSONError() is None:
+                # logger.debug(f"waitForSyncResult msgNum {msgNum} resp {json.dumps(respObj)} sendTime {msgSendTime}")
+                return respObj
+            logger.warning(f"sendRICRESTURLSync msgNum {msgNum} response is not JSON {respMsg.getJSONError()}")
+            return {"rslt":"failResponse"}
+        # Debug - if we get here we timed out (the trace is marked now rather than when the message expires)
+        if msgRec.trace is not None:
+            msgRec.trace.timedOut = True
+        logger.warning(f"waitForSyncResult failTimeout msgNum {msgNum} sendTime {msgSendTime} timeNow {self.clock.time()} timeout {timeOutSecs}")
         return {"rslt":"failTimeout"}
 
     def sendRICRESTFileBlock(self, data: bytes) -> bool:
@@ -272,22 +420,32 @@ class RICInterface:
             True if message sent
         '''
         ricRestMsg, _ = self.ricProtocols.encodeRICRESTFileBlock(data)
+        return self._sendFileBlockFrame(ricRestMsg)
+
+    def _sendFileBlockFrame(self, ricRestMsg: bytes) -> bool:
         if self.DEBUG_RIC_SEND_FILE_BLOCK:
             logger.debug(f"sendRICRESTFileBlock len {len(ricRestMsg)}")
         self.commsHandler.send(ricRestMsg)
         self.msgTxRate.addSample()
         return True
 
-    def newRoundTrip(self, rtTime:int) -> None:
+    def newRoundTrip(self, rtTime:int, family: str = "") -> None:
         '''
         Indicate a new round-trip for a message is complete - this is
         for statistics gathering
         Args:
             rtTime: time taken for round-trip in seconds
+            family: kind of command (e.g. "traj" or "led") the round-trip was for
         Returns:
             None
         '''
         self.roundTripInfo.add(rtTime)
+        self._roundTripHists[""].add(rtTime)
+        if family:
+            familyHist = self._roundTripHists.get(family)
+            if familyHist is None:
+                familyHist = self._getRoundTripHist(family)
+            familyHist.add(rtTime)
         if self.DEBUG_PERFORMANCE:
             logger.debug(f"RTTime {self.roundTripInfo.getAvg()}")
 
@@ -305,20 +463,27 @@ class RICInterface:
             self.commsHandler.send(dataBlock)
             self.msgTxRate.addSample()
 
-    def _sendFileProgressCheckAbort(self, progressCB: Callable[[int, int, 'RICInterface'], bool], 
+    def cancelFileSend(self) -> None:
+        '''
+        Cancel the file upload in progress (if any) - sendFile() returns False
+        '''
+        upload = self._fileUpload
+        if upload is not None:
+            upload.requestCancel()
+
+    def _sendFileProgressCheckAbort(self, upload: RICFileUpload,
+                    progressCB: Callable[[int, int, 'RICInterface'], bool], 
                     currentPos: int, fileSize: int) -> bool:
-        if self._fileOTAStartFailed or self._fileNotStarted or self._fileUserCancel or self._fileFailedInFirmware or self._fileFailedWrite:
+        if upload.isFailed():
             return True
-        if progressCB is None:
+        if not upload.cancelRequested and (progressCB is None or progressCB(currentPos, fileSize, self)):
             return False
-        if not progressCB(currentPos, fileSize, self):
-            self.sendRICRESTCmdFrameSync('{"cmdName":"ufCancel"}')
-            return True
-        return False
+        self.sendRICRESTCmdFrameSync('{"cmdName":"ufCancel"}')
+        return True
 
     def sendFile(self, filename: str, 
                 progressCB: Callable[[int, int, 'RICInterface'], bool] = None,
-                fileDest: str = "fs", reqStr: str = '') -> bool:
+                fileDest: str = "fs", reqStr: str = '', resumeFrom: int = 0) -> bool:
         '''
         Send a file (from the file system)
         Args:
@@ -329,17 +494,19 @@ class RICInterface:
             fileDest: "fs" to upload to file system, "ricfw" for new RIC firmware
             reqStr: API request used for transfer, if left blank this is inferred from fileDest, other
                     values include "fileupload" and "espfwupdate" - see RIC documentation for API
+            resumeFrom: position acknowledged (okto) before an earlier upload of the same file was
+                    interrupted - the upload continues from there if RIC confirms this by returning
+                    resumeFrom in its ufStart response, otherwise the whole file is sent
         Returns:
             True if operation succeeded
         Throws:
             OSError: operating system exceptions
             May throw other exceptions so include a general exception handler
         '''
-        # Send the file using the file upload
-        with open(filename, "rb") as f:
+        # Send the file using the file upload - the file is mapped rather than read so
+        # memory use doesn't depend on the file size
+        with self._openFileView(filename) as binaryImage:
 
-            # Read data
-            binaryImage = f.read()
             binaryImageLen = len(binaryImage)
             if self.DEBUG_RIC_SEND_FILE:
                 logger.debug(f"File {filename} is {binaryImageLen} bytes long")
@@ -349,136 +516,99 @@ class RICInterface:
             if reqStr == '':
                 reqStr = 'espfwupdate' if isFirmware else 'fileupload'
             uploadName = "fw" if isFirmware else os.path.basename(filename)
-            self._fileOTAStartFailed = False
-            self._fileOTAStartedOK = False
-            self._fileNotStarted = False
-            self._fileUserCancel = False
-            self._fileFailedWrite = False
-            self._fileFailedInFirmware = False
-
-            # Block and batch sizes
-            blockMaxSize = self.commsHandler.commsParams.fileTransfer.get("fileBlockMax", 5000)
-            batchAckSize = self.commsHandler.commsParams.fileTransfer.get("fileBatchAck", 1)
-
-            # Debug
-            if self.DEBUG_RIC_SEND_FILE:
-                logger.debug(f"ricIF sendFile ideal blockMaxSize {blockMaxSize} batchAckSize {batchAckSize}")
-
-            # Frames follow the approach used in the web interface start, block..., end
-            sendFileReq = '{' + f'"cmdName":"ufStart","reqStr":"{reqStr}","fileType":"{fileDest}",' + \
-                            f'"batchMsgSize":{blockMaxSize},"batchAckSize":{batchAckSize},' + \
-                            f'"fileName":"{uploadName}","fileLen":{str(binaryImageLen)}' + '}'
-            resp = self.sendRICRESTCmdFrameSync(sendFileReq, 
-                            timeOutSecs = 10)
-            if resp.get("rslt","") != "ok":
-                raise MartyTransferException("File transfer start not acknowledged")
-
-            # Block and batch sizes
-            blockMaxSize = resp.get("batchMsgSize", blockMaxSize)
-            batchAckSize = resp.get("batchAckSize", 50)
-            self._fileSendOkTo = 0
-
-            # Debug
-            if self.DEBUG_RIC_SEND_FILE:
-                logger.debug(f"ricIF sendFile negotiated blockMaxSize {blockMaxSize} batchAckSize {batchAckSize} resp {resp}")
-
-            # Progress and check for abort
-            if self._sendFileProgressCheckAbort(progressCB, self._fileSendOkTo, binaryImageLen):
-                return False
-
-            # Wait for a period depending on whether we're sending firmware - this is because starting
-            # a firmware update involves the ESP32 in a long-running activity and the firmware becomes
-            # unresponsive during this time
-            if isFirmware:
-                for i in range(5):
-                    time.sleep(1)
-                    if self._sendFileProgressCheckAbort(progressCB, 0, binaryImageLen):
-                        return False
-                    if self._fileOTAStartedOK:
-                        break
-
-            # Debug
-            if self.DEBUG_RIC_SEND_FILE:
-                logger.debug(f"ricIF sendFile starting to send file data ...")
-
-            # Send file blocks
-            numBlocks = 0
-            batchRetryCount = 0
-            while self._fileSendOkTo < binaryImageLen:
-
-                # NOTE: first batch MUST be of size 1 (not batchAckSize) because RIC performs a long-running
-                # blocking task immediately after receiving the first message in a firmware
-                # update - although this could be relaxed for non-firmware update file uploads
-                sendFromPos = self._fileSendOkTo
-                batchStartPos = self._fileSendOkTo
-                batchStartTime = time.time()
-                batchSize = 1 if sendFromPos == 0 else batchAckSize
-                batchBlockIdx = 0
-                self._fileSendNewOkTo = False
-                while batchBlockIdx < batchSize and sendFromPos < binaryImageLen:
-
-                    # Send block
-                    blockToSend = binaryImage[sendFromPos:sendFromPos+blockMaxSize]
-                    self.sendRICRESTFileBlock(sendFromPos.to_bytes(4, 'big') + blockToSend)
-                    sendFromPos += blockMaxSize
-                    batchBlockIdx += 1
-
-                    # Check if we have received an error
-                    if self._fileNotStarted or self._fileUserCancel or self._fileFailedInFirmware or self._fileFailedWrite:
-                        break
-
-                # Debug
-                if self.DEBUG_RIC_SEND_FILE:
-                    logger.debug(f"ricIF sendFile sent batch - start at {batchStartPos} end at {sendFromPos} len {sendFromPos-batchStartPos} okto {self._fileSendOkTo}")
-
-                # Wait for response (there is a timeout at the ESP end to ensure a response is always returned
-                # even if blocks are dropped on reception at ESP) - the timeout here is for these responses
-                # being dropped
-                timeNow = time.time()
-                while time.time() - timeNow < self.BLOCK_ACK_TIMEOUT:
-                    # Progress update
-                    if self._sendFileProgressCheckAbort(progressCB, self._fileSendOkTo, binaryImageLen):
-                        return False
-
-                    # Debug
-                    if self.DEBUG_RIC_SEND_FILE:
-                        logger.debug(f"ricIF sendFile checking for OKTO {self._fileSendOkTo} batchStartPos {batchStartPos}")
-
-                    # Check for okto
-                    if self._fileSendNewOkTo:
-                        batchRetryCount = 0
-                        # Update stats
-                        if self._fileSendOkTo > batchStartPos:
-                            elapsedTime = time.time() - batchStartTime
-                            if elapsedTime > 0:
-                                batchBytesPerSec = (self._fileSendOkTo - batchStartPos) / elapsedTime
-                                self.uploadBytesPerSec.add(batchBytesPerSec)
-                        break
-
-                    # Wait
-                    time.sleep(1)
-
-                # Check if no okto has been received with a greater position than batchStartPos
-                if self._fileSendOkTo <= batchStartPos:
-                    batchRetryCount += 1
-                    if batchRetryCount > self.BATCH_RETRY_MAX:
-                        return False
-
-                # Block count
-                numBlocks += 1
-
-            # Debug
-            if self.DEBUG_RIC_SEND_FILE:
-                logger.debug(f"ricIF sendFile sending END")
-
-            # End frame
-            resp = self.sendRICRESTCmdFrameSync('{' + f'"cmdName":"ufEnd","reqStr":"fileupload","fileType":"{fileDest}",' + \
-                            f'"fileName":"{uploadName}","fileLen":{str(binaryImageLen)},' + \
-                            f'"blockCount":{str(numBlocks)}' + '}', 
-                            timeOutSecs = 5)
-            if resp.get("rslt","") != "ok":
-                return False
-            return True
+            upload = RICFileUpload(uploadName, binaryImageLen, self.clock)
+            self._fileUpload = upload
+            try:
+                return self._sendFileData(upload, binaryImage, progressCB, fileDest, reqStr, resumeFrom)
+            finally:
+                self._fileUpload = None
+
+    def _sendFileData(self, upload: RICFileUpload, binaryImage: memoryview,
+                progressCB: Callable[[int, int, 'RICInterface'], bool],
+                fileDest: str, reqStr: str, resumeFrom: int) -> bool:
+        binaryImageLen = upload.fileLen
+        uploadName = upload.fileName
+        isFirmware = fileDest == "ricfw"
+
+        # Block and batch sizes
+        blockMaxSize = self.commsHandler.commsParams.fileTransfer.get("fileBlockMax", 5000)
+        batchAckSize = self.commsHandler.commsParams.fileTransfer.get("fileBatchAck", 1)
+
+        # Debug
+        if self.DEBUG_RIC_SEND_FILE:
+            logger.debug(f"ricIF sendFile ideal blockMaxSize {blockMaxSize} batchAckSize {batchAckSize}")
+
+        # Frames follow the approach used in the web interface start, block..., end
+        sendFileReq = '{' + f'"cmdName":"ufStart","reqStr":"{reqStr}","fileType":"{fileDest}",' + \
+                        f'"batchMsgSize":{blockMaxSize},"batchAckSize":{batchAckSize},' + \
+                        f'"fileName":"{uploadName}","fileLen":{str(binaryImageLen)}' + \
+                        (f',"resumeFrom":{resumeFrom}' if resumeFrom > 0 else '') + '}'
+        resp = self.sendRICRESTCmdFrameSync(sendFileReq, 
+                        timeOutSecs = 10)
+        if resp.get("rslt","") != "ok":
+            raise MartyTransferException("File transfer start not acknowledged")
+
+        # Block and batch sizes
+        blockMaxSize = resp.get("batchMsgSize", blockMaxSize)
+        batchAckSize = resp.get("batchAckSize", 50)
+        startPos = min(resp.get("resumeFrom", 0), resumeFrom, binaryImageLen) if resumeFrom > 0 else 0
+        upload.setStartPos(startPos)
+
+        # Debug
+        if self.DEBUG_RIC_SEND_FILE:
+            logger.debug(f"ricIF sendFile negotiated blockMaxSize {blockMaxSize} batchAckSize {batchAckSize} resp {resp}")
+
+        # Progress and check for abort
+        if self._sendFileProgressCheckAbort(upload, progressCB, startPos, binaryImageLen):
+            return False
+
+        # Wait for a period depending on whether we're sending firmware - this is because starting
+        # a firmware update involves the ESP32 in a long-running activity and the firmware becomes
+        # unresponsive during this time
+        if isFirmware:
+            for i in range(5):
+                upload.waitForOTAStart(1)
+                if self._sendFileProgressCheckAbort(upload, progressCB, 0, binaryImageLen):
+                    return False
+                if upload.otaStartedOK:
+                    break
+
+        # Debug
+        if self.DEBUG_RIC_SEND_FILE:
+            logger.debug(f"ricIF sendFile starting to send file data ...")
+
+        # Send file blocks
+        if not self._fileSender.sendData(upload, binaryImage, blockMaxSize, batchAckSize, progressCB):
+            return False
+        numBlocks = self._fileSender.statsBlocksSent
+
+        # Debug
+        if self.DEBUG_RIC_SEND_FILE:
+            logger.debug(f"ricIF sendFile sending END")
+
+        # End frame
+        resp = self.sendRICRESTCmdFrameSync('{' + f'"cmdName":"ufEnd","reqStr":"fileupload","fileType":"{fileDest}",' + \
+                        f'"fileName":"{uploadName}","fileLen":{str(binaryImageLen)},' + \
+                        f'"blockCount":{str(numBlocks)}' + '}', 
+                        timeOutSecs = 5)
+        if resp.get("rslt","") != "ok":
+            return False
+        return True
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _openFileView(filename: str) -> Iterator[memoryview]:
+        '''
+        Open a file as a read-only memoryview of the memory-mapped file
+        '''
+        with open(filename, "rb") as f:
+            # Empty files can't be mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as fileMap:
+                with memoryview(fileMap) as fileView:
+                    yield fileView
 
     def streamSoundFile(self, fileName: str, targetEndpoint: str,
                 progressCB: Callable[[int, int, 'RICInterface'], bool] = None) -> bool:
@@ -497,8 +627,25 @@ class RICInterface:
         '''
         return self._ricStreamHandler.streamSoundFile(fileName, targetEndpoint, progressCB)
 
+    def getStreamStats(self) -> Dict:
+        '''
+        Get statistics of the last sound stream (see RICStreamHandler.getStats())
+        '''
+        return self._ricStreamHandler.getStats()
+
+    def setTracer(self, tracer: Optional[RICTracer]) -> None:
+        '''
+        Enable (or disable) tracing of the lifecycle of each message
+        Args:
+            tracer: records the messages (None to stop tracing) - see RICTracer
+        Returns:
+            None
+        '''
+        self.tracer = tracer
+        self.commsHandler.setTraceTiming(tracer is not None)
+
     def getStats(self) -> Dict:
-        return {
+        stats = {
             "roundTripAvgMS":self.roundTripInfo.getAvg()*1000,
             "msgRxRatePS":self.msgRxRate.getAvg(),
             "msgTxRatePS":self.msgTxRate.getAvg(),
@@ -507,9 +654,44 @@ class RICInterface:
             "unnumbered":self.statsUnNumbered,
             "timedOut":self.statsTimedOut,
             "uploadBPS":self.uploadBytesPerSec.getAvg(),
+            "uploadRetransmits":self._fileSender.statsRetransmits,
+            "uploadTimeouts":self._fileSender.statsTimeouts,
+            "streamUnderruns":self._ricStreamHandler.getStats().get("underruns", 0),
             "rxCount":self.msgRxRate.getTotal(),
             "txCount":self.msgTxRate.getTotal(),
+            "msgsInFlight":len(self._msgsOutstanding),
+            "msgNumCollisionsAvoided":self._msgsOutstanding.statsCollisionsAvoided,
+            "msgWindowFullWaits":self._msgsOutstanding.statsWindowFullWaits,
         }
+        _, (stats["roundTripP50MS"], stats["roundTripP95MS"], stats["roundTripP99MS"]) = \
+                    self._getRoundTripPercentilesMS("", max(self.STATS_WINDOWS_SECS))
+        stats["windowStats"] = self.getWindowStats()
+        stats.update(self.commsHandler.getLinkStats())
+        return stats
+
+    def getWindowStats(self) -> Dict:
+        '''
+        Get statistics over recent time windows - reading them doesn't affect other readers
+        Returns:
+            dict keyed by window (e.g. "10s") with the message rates and, for each kind of
+            command (e.g. "traj", "led" or "filelist"), the number of round-trips and
+            their 50th, 95th and 99th percentiles in milliseconds
+        '''
+        with self._roundTripHistsLock:
+            families = list(self._roundTripHists.keys())
+        windowStats = {}
+        for windowSecs in self.STATS_WINDOWS_SECS:
+            roundTrips = {}
+            for family in families:
+                count, (p50MS, p95MS, p99MS) = self._getRoundTripPercentilesMS(family, windowSecs)
+                if count > 0 and family:
+                    roundTrips[family] = {"count":count, "p50MS":p50MS, "p95MS":p95MS, "p99MS":p99MS}
+            windowStats[f"{windowSecs}s"] = {
+                "msgRxRatePS":self.msgRxRate.getAvg(windowSecs),
+                "msgTxRatePS":self.msgTxRate.getAvg(windowSecs),
+                "roundTrips":roundTrips,
+            }
+        return windowStats
 
     def addOnQueryRaw(self, addOnName: str, dataToWrite: bytes, numBytesToRead: int,
                         timeOutSecs: Optional[float] = None) -> Dict:
@@ -540,32 +722,34 @@ class RICInterface:
         # Register in raw message matching
         timeOutSecs = timeOutSecs if timeOutSecs is not None else self.msgRespTimeoutSecs
         with self._rawQueryOutstandingLock:
-            self._rawQueryOutstanding[msgKey] = {"timeSent": time.time(), "timeOutSecs": timeOutSecs, "awaited":True}
+            reptEvent = threading.Event()
+            rawQueryRec = {"timeSent": self.clock.time(), "timeOutSecs": timeOutSecs, "awaited":True,
+                                                "reptEvent": reptEvent}
+            self._rawQueryOutstanding[msgKey] = rawQueryRec
+        self._scheduler.callLater(timeOutSecs, self._onRawQueryExpired, msgKey, rawQueryRec)
 
         # Send message
         resp = self.cmdRICRESTURLSync(ricRestCmd)
         resp["dataRead"] = b""
         if resp.get("rslt", "") != "ok":
-            self._rawQueryOutstanding.pop(msgKey)
+            with self._rawQueryOutstandingLock:
+                self._rawQueryOutstanding.pop(msgKey, None)
             return resp
 
-        # Wait for a report message generated by the addOn access process
-        msgSendTime = time.time()
-        while time.time() < msgSendTime + timeOutSecs:
-            with self._rawQueryOutstandingLock:
-                # Should be an outstanding message - if not there's a problem
-                if msgKey not in self._rawQueryOutstanding:
-                    resp["rslt"] = "failReport"
-                    return resp
-                # Check if a report received
-                if self._rawQueryOutstanding[msgKey].get("reptValid", False):
-                    # Get report
-                    reptObj = self._rawQueryOutstanding[msgKey].get("reptObj", {})
-                    # logger.debug(f"msgKey {msgKey} msg {ricRestCmd} rept {json.dumps(reptObj)} sendTime {msgSendTime}")
-                    resp["dataRead"] = reptObj.get("hexRd", b"")
-                    return resp
-            time.sleep(0.01)
-        return {"rslt":"failTimeout"}
+        # Wait for the receive thread to signal a report message generated by the addOn access process
+        if not self.clock.wait(reptEvent, timeOutSecs):
+            return {"rslt":"failTimeout"}
+        with self._rawQueryOutstandingLock:
+            # Should be an outstanding message - if not there's a problem
+            msgRec = self._rawQueryOutstanding.pop(msgKey, None)
+        if msgRec is None:
+            resp["rslt"] = "failReport"
+            return resp
+        # Get report
+        reptObj = msgRec.get("reptObj", {})
+        # logger.debug(f"msgKey {msgKey} msg {ricRestCmd} rept {json.dumps(reptObj)}")
+        resp["dataRead"] = reptObj.get("hexRd", b"")
+        return resp
 
     def _onRxFrameCB(self, frame: bytes) -> None:
         self.msgRxRate.addSample()
@@ -580,23 +764,35 @@ class RICInterface:
             if self.DEBUG_RIC_RECEIVE_MSG:
                 logger.debug(f"_onRxFrameCB msgNum {decodedMsg.msgNum} {decodedMsg.payload}")
             isUnmatched = False
-            with self._msgsOutstandingLock:
-                if decodedMsg.msgNum in self._msgsOutstanding:
-                    msgRec = self._msgsOutstanding[decodedMsg.msgNum]
-                    roundTripTime = time.time() - msgRec["timeSent"]
-                    self.newRoundTrip(roundTripTime)
-                    if not msgRec.get("awaited", False):
-                        self._msgsOutstanding.pop(decodedMsg.msgNum)
+            futureToComplete = None
+            traceRec = None
+            with self._msgsOutstanding.lock:
+                msgRec = self._msgsOutstanding.get(decodedMsg.msgNum)
+                if msgRec is not None:
+                    if msgRec.trace is not None:
+                        traceRec = msgRec.trace
+                        self._traceMatched(traceRec)
+                    roundTripTime = self.clock.time() - msgRec.timeSent
+                    self.newRoundTrip(roundTripTime, msgRec.family)
+                    if not msgRec.awaited:
+                        self._msgsOutstanding.release(msgRec)
+                        futureToComplete = msgRec.future
                     else:
-                        msgRec["resp"] = decodedMsg
-                        msgRec["respValid"] = True
-                        msgRec["respTime"] = time.time()
+                        msgRec.setResp(decodedMsg, self.clock.time())
                     self.statsMatched += 1
                 else:
                     isUnmatched = True
                     self.statsUnMatched += 1
             if isUnmatched:
                 logger.warning(f"_onRxFrameCB Unmatched msgNum {decodedMsg.msgNum}")
+            if futureToComplete is not None:
+                respObj = decodedMsg.getJSONDict()
+                if decodedMsg.getJSONError() is not None:
+                    logger.warning(f"_onRxFrameCB msgNum {decodedMsg.msgNum} response is not JSON {decodedMsg.getJSONError()}")
+                    respObj = {"rslt":"failResponse"}
+                self._completeFuture(futureToComplete, respObj)
+                if traceRec is not None:
+                    traceRec.wakeNs = time.perf_counter_ns()
             doRxCallback = isUnmatched
         else:
             if self.DEBUG_RIC_RECEIVE_MSG:
@@ -604,11 +800,9 @@ class RICInterface:
             if decodedMsg.msgTypeCode == RICProtocols.MSG_TYPE_REPORT:
                 # Report message - this can include results of accessing addOns
                 # logger.debug(f"_onRxFrameCB REPORT {decodedMsg.payload}")
-                reptObj = {}
-                try:
-                    reptObj = json.loads(decodedMsg.payload.rstrip('\0'))
-                except Exception as excp:
-                    logger.warning(f"_onRxFrameCB REPORT is not JSON {excp}")
+                reptObj = decodedMsg.getJSONDict()
+                if decodedMsg.getJSONError() is not None:
+                    logger.warning(f"_onRxFrameCB REPORT is not JSON {decodedMsg.getJSONError()}")
                 msgKey = reptObj.get("msgKey", '')
                 if type(msgKey) is str:
                     try:
@@ -625,6 +819,7 @@ class RICInterface:
                             else:
                                 msgRec["reptObj"] = reptObj
                                 msgRec["reptValid"] = True
+                                msgRec["reptEvent"].set()
                         else:
                             isUnmatched = True
                     if isUnmatched:
@@ -634,46 +829,37 @@ class RICInterface:
                 if self.DEBUG_RIC_RECEIVE_MSG:
                     logger.debug(f"RESPONSE received {decodedMsg.payload}")
                 # Check for okto message
-                reptObj = {}
-                try:
-                    reptObj = json.loads(decodedMsg.payload.rstrip('\0'))
-                except Exception as excp:
-                    logger.warning(f"_onRxFrameCB RESPONSE is not JSON {excp}")
+                reptObj = decodedMsg.getJSONDict()
+                if decodedMsg.getJSONError() is not None:
+                    logger.warning(f"_onRxFrameCB RESPONSE is not JSON {decodedMsg.getJSONError()}")
                 if "okto" in reptObj:
                     okto = reptObj.get("okto", -1)
-                    if self._fileSendOkTo < okto:
-                        self._fileSendOkTo = okto
-                    self._fileSendNewOkTo = True
+                    upload = self._fileUpload
+                    if upload is not None:
+                        upload.onOkTo(okto)
                     if self.DEBUG_RIC_SEND_FILE:
                         logger.warning(f"OKTO MESSAGE {reptObj['okto']}")
-                if "sokto" in reptObj:
+                elif "sokto" in reptObj:
                     sokto = reptObj.get("sokto", -1)
                     if self._streamSendOkTo < sokto:
                         self._streamSendOkTo = sokto
                     self._streamSendNewOkTo = True
+                    self._streamOkToEvent.set()
                     if self.DEBUG_RIC_STREAM:
                         logger.debug(f"SOKTO MESSAGE {reptObj['sokto']}")
                 elif "cmdName" in reptObj:
                     cmdName = reptObj.get("cmdName","")
                     if cmdName == "ufBlock" or cmdName == "ufStatus" or cmdName == "ufCancel":
                         reason = reptObj.get("reason","")
-                        if reason == "OTAStartFailed":
-                            self._fileOTAStartFailed = True
-                        elif reason == "OTAStartedOK":
-                            self._fileOTAStartedOK = True
-                        elif reason == "notStarted":
-                            self._fileNotStarted = True
-                        elif reason == "userCancel":
-                            self._fileUserCancel = True
-                        elif reason == "failRetries" or reason == "failTimeout":
-                            self._fileFailedInFirmware = True
-                        elif reason == 'failFileWrite':
-                            self._fileFailedWrite = True
+                        upload = self._fileUpload
+                        if upload is not None:
+                            upload.onStatus(reason)
                     logger.warning(f"_onRxFrameCB {cmdName} reason {reason}")
                 elif "rslt" in reptObj:
                     if reptObj["rslt"].startswith("fail"):
                         logger.warning(f"_onRxFrameCB {reptObj['rslt']}")
                         self._streamClosed = True
+                        self._streamOkToEvent.set()
                 else:
                     logger.warning(f"_onRxFrameCB response not OkTo or fileUpload ... {decodedMsg.payload}")
 
@@ -686,62 +872,113 @@ class RICInterface:
         if self.logLineCB:
             self.logLineCB(line.rstrip())
 
-    def _msgTimeoutCheck(self) -> None:
-        # Check messages outstanding
-        # logger.debug("Check outstanding messages")
-        msgIdxsToRemove = []
-        msgIdxsTimedOut = []
-        with self._msgsOutstandingLock:
-            for msgItem in self._msgsOutstanding.items():
-                timeSinceSent = time.time() - msgItem[1].get("timeSent", 0)
-                if timeSinceSent > msgItem[1].get("timeOutSecs", self.msgRespTimeoutSecs):
-                    if not msgItem[1].get("respValid", False):
-                        msgIdxsTimedOut.append(msgItem[0])
-                    msgIdxsToRemove.append(msgItem[0])
+    def _allocMsg(self, timeOutSecs: float, awaited: bool = False, future: Optional[Future] = None,
+                family: str = "") -> RICMsgRec:
+        # Allocate a message number and expire the message when its time-out is reached - jobs
+        # on the scheduler don't wait for a free number as the expiry jobs freeing them can't run
+        msgRec = self._msgsOutstanding.allocate(timeOutSecs, awaited, future,
+                    waitForSlot=not self._scheduler.isSchedulerThread())
+        msgRec.family = family
+        msgRec.expiryJob = self._scheduler.callLater(timeOutSecs, self._onMsgExpired, msgRec)
+        return msgRec
+
+    def _traceStart(self, msg: Union[str, bytes], msgRec: RICMsgRec) -> Optional[RICTraceRec]:
+        tracer = self.tracer
+        if tracer is None:
+            return None
+        traceRec = tracer.startMsg(msg if isinstance(msg, str) else msg.decode(errors="replace"),
+                    time.perf_counter_ns())
+        traceRec.msgNum = msgRec.msgNum
+        msgRec.trace = traceRec
+        return traceRec
+
+    def _traceMatched(self, traceRec: RICTraceRec) -> None:
+        # Called during the rx frame callback so the link's frame timing is for this response
+        traceRec.matchNs = time.perf_counter_ns()
+        traceRec.rxStartNs, traceRec.rxFrameNs = self.commsHandler.getRxFrameTiming()
+
+    @staticmethod
+    def _urlFamily(msg: str) -> str:
+        # Kind of command is the first part of the URL (e.g. "traj" for "traj/dance")
+        return msg.partition("/")[0].partition("?")[0]
+
+    @classmethod
+    def _cmdFrameFamily(cls, msg: Union[str, bytes]) -> str:
+        cmdName = cls._CMD_NAME_RE.search(msg.encode() if isinstance(msg, str) else msg)
+        return cmdName.group(1).decode(errors="replace") if cmdName is not None else "cmdFrame"
+
+    def _getRoundTripHist(self, family: str) -> WindowedHistogram:
+        with self._roundTripHistsLock:
+            familyHist = self._roundTripHists.get(family)
+            if familyHist is None:
+                if len(self._roundTripHists) > self.ROUND_TRIP_FAMILIES_MAX:
+                    family = "other"
+                    familyHist = self._roundTripHists.get(family)
+                if familyHist is None:
+                    familyHist = WindowedHistogram(self.ROUND_TRIP_BUCKET_EDGES, timeFn=self.clock.monotonic)
+                    self._roundTripHists[family] = familyHist
+            return familyHist
+
+    def _getRoundTripPercentilesMS(self, family: str, windowSecs: int):
+        count, percentiles = self._roundTripHists[family].getPercentiles(windowSecs)
+        return count, [round(val * 1000, 2) for val in percentiles]
+
+    def _onMsgExpired(self, msgRec: RICMsgRec) -> None:
+        # Remove the expired message (freeing its message number)
+        with self._msgsOutstanding.lock:
+            if self._msgsOutstanding.get(msgRec.msgNum) is not msgRec:
+                return
+            self._msgsOutstanding.release(msgRec)
+        if msgRec.respValid:
+            return
+        self.statsTimedOut += 1
+        if msgRec.trace is not None:
+            msgRec.trace.timedOut = True
 
         # Hint to comms layer if messages are failing
-        if len(msgIdxsTimedOut) > 0:
-            self.commsHandler.hintMsgTimeout(len(msgIdxsTimedOut))
+        self.commsHandler.hintMsgTimeout(1)
 
         # Debug
-        for msgIdx in msgIdxsTimedOut:
-            logger.warning(f"Message {msgIdx} timed out timeSent {self._msgsOutstanding[msgIdx].get('timeSent',0)} timeNow {time.time()}")
-
-        # Remove timed-out messages
-        for msgIdx in msgIdxsToRemove:
-            with self._msgsOutstandingLock:
-                self._msgsOutstanding.pop(msgIdx)
-
-        # Check rawQuery reports outstanding
-        # logger.debug("Check rawQuery reports outstanding")
-        msgKeysToRemove = []
-        msgKeysTimedOut = []
-        with self._rawQueryOutstandingLock:
-            for msgItem in self._rawQueryOutstanding.items():
-                timeSinceSent = time.time() - msgItem[1].get("timeSent", 0)
-                if timeSinceSent > msgItem[1].get("timeOutSecs", self.msgRespTimeoutSecs):
-                    if not msgItem[1].get("reptValid", False):
-                        msgKeysTimedOut.append(msgItem[0])
-                    msgKeysToRemove.append(msgItem[0])
+        logger.warning(f"Message {msgRec.msgNum} timed out timeSent {msgRec.timeSent} timeNow {self.clock.time()}")
+        if msgRec.future is not None:
+            self._completeFuture(msgRec.future, {"rslt":"failTimeout"})
 
-        # Debug
-        for msgKey in msgKeysTimedOut:
-            logger.warning(f"rawQuery {msgKey} timed out at time {time.time()}")
+    def _onRawQueryExpired(self, msgKey: int, rawQueryRec: Dict) -> None:
+        # Remove expired rawQuery
+        with self._rawQueryOutstandingLock:
+            if self._rawQueryOutstanding.get(msgKey) is not rawQueryRec:
+                return
+            self._rawQueryOutstanding.pop(msgKey)
+        if not rawQueryRec.get("reptValid", False):
+            logger.warning(f"rawQuery {msgKey} timed out at time {self.clock.time()}")
             self.statsTimedOut += 1
 
-        # Remove timed-out rawQueries
-        for msgKey in msgKeysToRemove:
-            with self._rawQueryOutstandingLock:
-                self._rawQueryOutstanding.pop(msgKey)
+    def _startTimer(self) -> None:
+        if self._timerJob is None:
+            self._timerJob = self._scheduler.callEvery(1.0, self._onTimer)
 
-        # Restart timer
-        if self.commsHandler is not None and self.commsHandler.isOpen():
-            self.msgTimeoutCheckTimer = threading.Timer(1.0, self._msgTimeoutCheck)
-            self.msgTimeoutCheckTimer.start()
+    def _onTimer(self) -> None:
+        # Stop when the connection closes
+        if self.commsHandler is None or not self.commsHandler.isOpen():
+            if self._timerJob is not None:
+                self._timerJob.cancel()
+                self._timerJob = None
+            return
 
-        # Callback on timer if required
+        # Callback on timer if required (skipped if every message number is in use)
         if self.msgTimerCB:
-            self.msgTimerCB()
+            try:
+                self.msgTimerCB()
+            except MartyCommandException as excp:
+                logger.warning(f"RICInterface timer callback skipped {excp}")
+
+    @staticmethod
+    def _completeFuture(future: Future, result: Dict) -> None:
+        # The future may have been cancelled by the caller
+        try:
+            future.set_result(result)
+        except concurrent.futures.InvalidStateError:
+            pass
 
     def getTestOutput(self) -> dict:
         return self.commsHandler.getTestOutput()
@@ -750,8 +987,11 @@ class RICInterface:
         self._streamSendOkTo = 0
         self._streamSendNewOkTo = False
         self._streamClosed = False
+        self._streamOkToEvent.clear()
 
     def _streamGetLatest(self):
+        # The event is cleared first so a sokto arriving during the read isn't missed
+        self._streamOkToEvent.clear()
         isNew = self._streamSendNewOkTo
         self._streamSendNewOkTo = False
         return isNew, self._streamSendOkTo, self._streamClosed
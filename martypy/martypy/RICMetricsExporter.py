@@ -0,0 +1,221 @@
+'''
+RICMetricsExporter
+'''
+from typing import Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+class _MetricFamilies:
+    '''
+    Metrics gathered for one scrape - samples are grouped by metric family as
+    OpenMetrics requires
+    '''
+    def __init__(self) -> None:
+        self._families: Dict[str, Tuple[str, str, List[Tuple[Dict[str, str], float]]]] = {}
+
+    def add(self, name: str, metricType: str, helpText: str, labels: Dict[str, str], value) -> None:
+        if value is None or isinstance(value, (dict, list, str)):
+            return
+        family = self._families.setdefault(name, (metricType, helpText, []))
+        family[2].append((labels, value))
+
+    def toText(self) -> str:
+        lines = []
+        for name, (metricType, helpText, samples) in self._families.items():
+            lines.append(f"# TYPE {name} {metricType}")
+            lines.append(f"# HELP {name} {helpText}")
+            sampleName = name + "_total" if metricType == "counter" else name
+            for labels, value in samples:
+                labelStr = ",".join(f'{key}="{self._escape(val)}"' for key, val in labels.items())
+                lines.append(f"{sampleName}{{{labelStr}}} {float(value)!r}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _escape(val: str) -> str:
+        return str(val).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class RICMetricsExporter:
+    '''
+    RICMetricsExporter
+    Optional HTTP endpoint serving OpenMetrics text (e.g. for Prometheus) with the
+    interface, link, publish and status statistics of one or more robots. Metrics
+    are read from values martypy has already received so a scrape never sends
+    anything to a robot or waits for the receive thread
+    '''
+    CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+    METRIC_PREFIX = "martypy_"
+
+    # Interface statistics (from get_interface_stats()) - key: (name, type, help)
+    INTERFACE_METRICS = {
+        "matched": ("messages_matched", "counter", "Responses matched to a command"),
+        "unmatched": ("messages_unmatched", "counter", "Responses not matching a command"),
+        "unnumbered": ("messages_unnumbered", "counter", "Messages received without a message number"),
+        "timedOut": ("messages_timed_out", "counter", "Commands and add-on queries with no response before the time-out"),
+        "rxCount": ("messages_rx", "counter", "Messages received"),
+        "txCount": ("messages_tx", "counter", "Messages sent"),
+        "msgsInFlight": ("messages_in_flight", "gauge", "Commands awaiting a response"),
+        "uploadBPS": ("upload_bytes_per_second", "gauge", "File upload throughput"),
+        # Reset when each upload starts so these are gauges
+        "uploadRetransmits": ("upload_retransmits", "gauge", "File upload blocks sent again (last upload)"),
+        "uploadTimeouts": ("upload_timeouts", "gauge", "File upload ack time-outs (last upload)"),
+    }
+    # Robot status (from get_power_status() and get_robot_status())
+    POWER_METRICS = {
+        "battRemainCapacityPercent": ("battery_remaining_percent", "gauge", "Battery remaining capacity"),
+        "battCurrentMA": ("battery_current_milliamps", "gauge", "Battery current"),
+        "battTempDegC": ("battery_temperature_celsius", "gauge", "Battery temperature"),
+    }
+    ROBOT_STATUS_METRICS = {
+        "heapFree": ("heap_free_bytes", "gauge", "Free heap on the robot"),
+        "heapMin": ("heap_min_free_bytes", "gauge", "Lowest free heap on the robot"),
+        "loopMsAvg": ("loop_avg_ms", "gauge", "Average robot main loop time"),
+        "workQCount": ("work_queue_count", "gauge", "Movements queued on the robot"),
+    }
+    # Link statistics which are gauges (the rest are counters)
+    LINK_GAUGES = ("hdlcEscapeRatio", "txCoalesceFramesPerWrite")
+
+    def __init__(self, port: int = 9464, host: str = "127.0.0.1") -> None:
+        '''
+        Initialise RICMetricsExporter
+        Args:
+            port: HTTP port to serve metrics on (0 to pick a free port - see port once started)
+            host: address to listen on (localhost by default)
+        '''
+        self.port = port
+        self.host = host
+        self._robots: List[Tuple['Marty', Dict[str, str]]] = []
+        self._robotsLock = threading.Lock()
+        self._httpServer: Optional[ThreadingHTTPServer] = None
+        self._serverThread: Optional[threading.Thread] = None
+
+    def addRobot(self, marty: 'Marty', labels: Optional[Dict[str, str]] = None) -> None:
+        '''
+        Add a robot whose metrics are served
+        Args:
+            marty: the robot (a Marty object)
+            labels: labels identifying the robot in its metrics (by default the robot
+                    label is its serial number)
+        '''
+        robotLabels = {"robot": self._getRobotId(marty, len(self._robots))}
+        if labels is not None:
+            robotLabels.update(labels)
+        with self._robotsLock:
+            self._robots.append((marty, robotLabels))
+
+    def removeRobot(self, marty: 'Marty') -> None:
+        with self._robotsLock:
+            self._robots = [robot for robot in self._robots if robot[0] is not marty]
+
+    def start(self) -> None:
+        '''
+        Start serving metrics at http://host:port/metrics on a background thread
+        '''
+        if self._httpServer is not None:
+            return
+        exporter = self
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.getMetricsText().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(f"RICMetricsExporter {format % args}")
+
+        self._httpServer = ThreadingHTTPServer((self.host, self.port), MetricsRequestHandler)
+        self._httpServer.daemon_threads = True
+        self.port = self._httpServer.server_address[1]
+        self._serverThread = threading.Thread(target=self._httpServer.serve_forever,
+                    name="RICMetricsExporter", daemon=True)
+        self._serverThread.start()
+
+    def stop(self) -> None:
+        if self._httpServer is None:
+            return
+        self._httpServer.shutdown()
+        self._httpServer.server_close()
+        self._serverThread.join()
+        self._httpServer = None
+        self._serverThread = None
+
+    def getMetricsText(self) -> str:
+        '''
+        Get the metrics of all robots as OpenMetrics text
+        '''
+        families = _MetricFamilies()
+        with self._robotsLock:
+            robots = list(self._robots)
+        for marty, labels in robots:
+            try:
+                self._addRobotMetrics(families, marty, labels)
+            except Exception as excp:
+                logger.warning(f"RICMetricsExporter robot {labels} {excp}")
+        return families.toText()
+
+    def _addRobotMetrics(self, families: _MetricFamilies, marty: 'Marty', labels: Dict[str, str]) -> None:
+        prefix = self.METRIC_PREFIX
+        families.add(prefix + "up", "gauge", "1 if the connection to the robot is ready", labels,
+                    1 if marty.is_conn_ready() else 0)
+
+        # Interface
+        stats = marty.get_interface_stats()
+        for key, (name, metricType, helpText) in self.INTERFACE_METRICS.items():
+            families.add(prefix + name, metricType, helpText, labels, stats.get(key))
+        for windowName, windowStats in stats.get("windowStats", {}).items():
+            windowLabels = dict(labels, window=windowName)
+            families.add(prefix + "messages_rx_per_second", "gauge", "Messages received per second",
+                        windowLabels, windowStats.get("msgRxRatePS"))
+            families.add(prefix + "messages_tx_per_second", "gauge", "Messages sent per second",
+                        windowLabels, windowStats.get("msgTxRatePS"))
+            for family, roundTrip in windowStats.get("roundTrips", {}).items():
+                familyLabels = dict(windowLabels, family=family)
+                families.add(prefix + "round_trips", "gauge", "Command round-trips in the window",
+                            familyLabels, roundTrip.get("count"))
+                for quantile in ("50", "95", "99"):
+                    roundTripMS = roundTrip.get(f"p{quantile}MS")
+                    families.add(prefix + "round_trip_seconds", "gauge", "Command round-trip time percentiles",
+                                dict(familyLabels, quantile=f"0.{quantile}"),
+                                roundTripMS / 1000 if roundTripMS is not None else None)
+            for topic, pubRate in windowStats.get("publishRatesPS", {}).items():
+                families.add(prefix + "publish_per_second", "gauge", "Messages published by the robot per second",
+                            dict(windowLabels, topic=topic), pubRate)
+
+        # Link (HDLC and transmit coalescing)
+        for key, val in stats.items():
+            if not key.startswith(("hdlc", "txCoalesce")):
+                continue
+            isGauge = key in self.LINK_GAUGES
+            families.add(prefix + "link_" + self._snakeCase(key), "gauge" if isGauge else "counter",
+                        f"Link statistic {key}", labels, val)
+
+        # Robot status
+        powerStatus = marty.get_power_status()
+        if powerStatus.get("battInfoValid", False):
+            for key, (name, metricType, helpText) in self.POWER_METRICS.items():
+                families.add(prefix + name, metricType, helpText, labels, powerStatus.get(key))
+        robotStatus = marty.get_robot_status()
+        for key, (name, metricType, helpText) in self.ROBOT_STATUS_METRICS.items():
+            families.add(prefix + name, metricType, helpText, labels, robotStatus.get(key))
+
+    @staticmethod
+    def _snakeCase(name: str) -> str:
+        return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+    @staticmethod
+    def _getRobotId(marty: 'Marty', robotIdx: int) -> str:
+        try:
+            systemInfo = marty.get_system_info()
+        except Exception:
+            systemInfo = {}
+        return str(systemInfo.get("SerialNo", "") or systemInfo.get("MAC", "") or f"robot{robotIdx}")
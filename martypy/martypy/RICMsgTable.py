@@ -0,0 +1,142 @@
+'''
+RICMsgTable
+Table of messages sent to RIC which are awaiting a response
+'''
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
+from .Exceptions import MartyCommandException
+from .RICClock import RICClock
+
+class RICMsgRec:
+    '''
+    RICMsgRec
+    Record of a message awaiting a response - if the response is awaited then
+    respEvent is set by the receive thread when the response arrives, if a future
+    is supplied then it is completed with the response instead. family is the kind
+    of command (e.g. "traj") used for round-trip statistics and trace holds the
+    timestamps of its lifecycle when tracing is enabled
+    '''
+    __slots__ = ("msgNum", "timeSent", "timeOutSecs", "awaited", "resp", "respValid", "respTime", "respEvent",
+                 "future", "expiryJob", "family", "trace")
+
+    def __init__(self, msgNum: int, timeSent: float, timeOutSecs: float, awaited: bool,
+                 future: Optional[Future] = None) -> None:
+        self.msgNum = msgNum
+        self.timeSent = timeSent
+        self.timeOutSecs = timeOutSecs
+        self.awaited = awaited
+        self.resp = None
+        self.respValid = False
+        self.respTime = 0
+        self.respEvent = threading.Event() if awaited else None
+        self.future = future
+        self.expiryJob = None
+        self.family = ""
+        self.trace = None
+
+    def setResp(self, resp, respTime: float) -> None:
+        self.resp = resp
+        self.respValid = True
+        self.respTime = respTime
+        if self.respEvent is not None:
+            self.respEvent.set()
+
+class RICMsgTable:
+    '''
+    RICMsgTable
+    Fixed-size table with a slot for each message number (1..255) - a message
+    number is only allocated when its slot is free so a response can't be matched
+    to the wrong request when numbers wrap around. If every slot is in use then
+    allocate() waits for one to be freed (back-pressure on the sender)
+    '''
+    MSG_NUM_MIN = 1
+    MSG_NUM_MAX = 255
+
+    def __init__(self, windowFullWaitSecs: float = 10, clock: Optional[RICClock] = None) -> None:
+        '''
+        Initialise RICMsgTable
+        Args:
+            windowFullWaitSecs: maximum time allocate() waits for a free slot
+            clock: clock used for send times and waits (None for real time)
+        '''
+        self._clock = clock if clock is not None else RICClock()
+        self._slots: List[Optional[RICMsgRec]] = [None] * (self.MSG_NUM_MAX + 1)
+        self._nextMsgNum = self.MSG_NUM_MIN
+        self._numInFlight = 0
+        self.lock = threading.Lock()
+        self._slotFreed = threading.Condition(self.lock)
+        self.windowFullWaitSecs = windowFullWaitSecs
+        # Stats
+        self.statsCollisionsAvoided = 0
+        self.statsWindowFullWaits = 0
+
+    def __len__(self) -> int:
+        return self._numInFlight
+
+    def __contains__(self, msgNum: int) -> bool:
+        return self.get(msgNum) is not None
+
+    def allocate(self, timeOutSecs: float, awaited: bool = False, future: Optional[Future] = None,
+                waitForSlot: bool = True) -> RICMsgRec:
+        '''
+        Allocate a free message number and record the message as in flight
+        Args:
+            timeOutSecs: time to wait for a response before the message times out
+            awaited: True if a caller will wait for the response
+            future: future to complete with the response (or None)
+            waitForSlot: False to fail at once if every slot is in use (e.g. on the
+                    thread whose jobs free slots)
+        Returns:
+            the message record (msgNum is the allocated message number)
+        Throws:
+            MartyCommandException: if no slot becomes free within windowFullWaitSecs
+        '''
+        numSlots = self.MSG_NUM_MAX - self.MSG_NUM_MIN + 1
+        with self.lock:
+            if self._numInFlight >= numSlots:
+                self.statsWindowFullWaits += 1
+                waitUntil = self._clock.time() + (self.windowFullWaitSecs if waitForSlot else 0)
+                while self._numInFlight >= numSlots:
+                    waitSecs = waitUntil - self._clock.time()
+                    if waitSecs <= 0:
+                        raise MartyCommandException("Too many messages awaiting a response from Marty")
+                    self._clock.wait(self._slotFreed, waitSecs)
+            # Find the next free message number
+            msgNum = self._nextMsgNum
+            while self._slots[msgNum] is not None:
+                self.statsCollisionsAvoided += 1
+                msgNum = msgNum + 1 if msgNum < self.MSG_NUM_MAX else self.MSG_NUM_MIN
+            self._nextMsgNum = msgNum + 1 if msgNum < self.MSG_NUM_MAX else self.MSG_NUM_MIN
+            msgRec = RICMsgRec(msgNum, self._clock.time(), timeOutSecs, awaited, future)
+            self._slots[msgNum] = msgRec
+            self._numInFlight += 1
+        return msgRec
+
+    def get(self, msgNum: int) -> Optional[RICMsgRec]:
+        '''
+        Get the record for an in-flight message (the lock should be held if the
+        record is then updated or released)
+        Args:
+            msgNum: message number
+        Returns:
+            message record or None if the message isn't in flight
+        '''
+        if msgNum < self.MSG_NUM_MIN or msgNum > self.MSG_NUM_MAX:
+            return None
+        return self._slots[msgNum]
+
+    def release(self, msgRec: RICMsgRec) -> None:
+        '''
+        Free the slot used by a message - the lock must be held
+        Args:
+            msgRec: message record
+        Returns:
+            None
+        '''
+        if self._slots[msgRec.msgNum] is msgRec:
+            self._slots[msgRec.msgNum] = None
+            self._numInFlight -= 1
+            self._slotFreed.notify()
+            if msgRec.expiryJob is not None:
+                msgRec.expiryJob.cancel()
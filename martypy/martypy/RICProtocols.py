@@ -3,60 +3,169 @@ RICProtocols
 '''
 import json
 import logging
-from typing import Dict, Tuple, Union
+from typing import Dict, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+def jsonLoads(jsonStr: Union[str, bytes]):
+    '''
+    Parse JSON - orjson is used if installed, otherwise (or if orjson rejects
+    something the json module accepts, such as NaN) the json module is used
+    '''
+    if orjson is not None:
+        try:
+            return orjson.loads(jsonStr)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(jsonStr)
+
+# Marker for message fields which are extracted from the frame when accessed
+_FROM_FRAME = object()
+
 class DecodedMsg:
     '''
     DecodedMsg
     A message decoded from RIC
+    The message holds a reference to the received frame and header fields,
+    payload and JSON content are only extracted when they are accessed
     '''
-    def __init__(self) -> None:
+    __slots__ = ("errMsg", "_frame", "_msgNum", "_protocolID", "_msgTypeCode",
+                 "_restType", "_isText", "_payload", "_jsonDict", "_jsonError")
+
+    def __init__(self, frame: Optional[bytes] = None) -> None:
         self.errMsg = ""
-        self.msgNum = None
-        self.protocolID = None
-        self.isText = None
-        self.payload = None
-        self.restType = None
-        self.msgTypeCode = None
+        self._jsonDict = None
+        self._jsonError = None
+        if frame is None:
+            self._frame = None
+            self._msgNum = None
+            self._protocolID = None
+            self._msgTypeCode = None
+            self._restType = None
+            self._isText = None
+            self._payload = None
+        else:
+            self._frame = frame
+            self._msgNum = _FROM_FRAME
+            self._protocolID = _FROM_FRAME
+            self._msgTypeCode = _FROM_FRAME
+            self._restType = _FROM_FRAME
+            self._isText = _FROM_FRAME
+            self._payload = _FROM_FRAME
+
+    @property
+    def msgNum(self) -> Optional[int]:
+        if self._msgNum is _FROM_FRAME:
+            return self._frame[0]
+        return self._msgNum
+
+    @property
+    def protocolID(self) -> Optional[int]:
+        if self._protocolID is _FROM_FRAME:
+            return self._frame[1] & 0x3f
+        return self._protocolID
+
+    @property
+    def msgTypeCode(self) -> Optional[int]:
+        if self._msgTypeCode is _FROM_FRAME:
+            return self._frame[1] >> 6
+        return self._msgTypeCode
+
+    @property
+    def restType(self) -> Optional[int]:
+        if self._restType is _FROM_FRAME:
+            if self.protocolID != RICProtocols.PROTOCOL_RICREST or len(self._frame) < 3:
+                return None
+            return self._frame[2]
+        return self._restType
+
+    @property
+    def isText(self) -> Optional[bool]:
+        if self._isText is _FROM_FRAME:
+            self._decodePayload()
+        return self._isText
+
+    @property
+    def payload(self) -> Union[str, bytes, None]:
+        if self._payload is _FROM_FRAME:
+            self._decodePayload()
+        return self._payload
+
+    def _decodePayload(self) -> None:
+        protocol = self.protocolID
+        if protocol == RICProtocols.PROTOCOL_RICREST:
+            restElemCode = self.restType
+            if restElemCode == RICProtocols.RICREST_ELEM_CODE_URL or restElemCode == RICProtocols.RICREST_ELEM_CODE_JSON:
+                self._isText = True
+                self._payload = str(memoryview(self._frame)[3:], 'ascii').rstrip('\x00')
+            else:
+                self._isText = False
+                self._payload = bytes(memoryview(self._frame)[3:])
+        elif protocol == RICProtocols.PROTOCOL_ROSSERIAL:
+            self._isText = False
+            self._payload = bytes(memoryview(self._frame)[2:])
+        else:
+            self._isText = None
+            self._payload = None
 
     def setError(self, errMsg: str) -> None:
         self.errMsg = errMsg
 
     def setMsgNum(self, msgNum: int) -> None:
-        self.msgNum = msgNum
+        self._msgNum = msgNum
 
     def setProtocol(self, protocolID: int) -> None:
-        self.protocolID = protocolID
+        self._protocolID = protocolID
 
     def setMsgTypeCode(self, msgTypeCode: int) -> None:
-        self.msgTypeCode = msgTypeCode
+        self._msgTypeCode = msgTypeCode
 
     def setRESTElemCode(self, restType: int) -> None:
-        self.restType = restType
+        self._restType = restType
 
     def setPayload(self, isText: bool, payload: bytes) -> None:
-        self.isText = isText
-        self.payload = payload
+        self._isText = isText
+        self._payload = payload
+        self._jsonDict = None
+        self._jsonError = None
 
     def getJSONDict(self) -> Dict:
+        '''
+        Get the JSON content of a text payload (up to any null terminator)
+        The payload is parsed on first call and the result shared by all callers
+        Returns:
+            JSON content or empty dict if the payload isn't text or isn't JSON
+        '''
+        if self._jsonDict is None:
+            self._parseJSON()
+        return self._jsonDict
+
+    def getJSONError(self) -> Optional[Exception]:
+        '''
+        Get the error (if any) from parsing the payload as JSON
+        '''
+        if self._jsonDict is None:
+            self._parseJSON()
+        return self._jsonError
+
+    def _parseJSON(self) -> None:
         msgContent = {}
         if self.isText:
+            frameJson = self.payload
+            termPos = frameJson.find("\0")
+            if termPos >= 0:
+                frameJson = frameJson[0:termPos]
             try:
-                termPos = self.payload.find("\0")
-                frameJson = self.payload
-                if termPos >= 0:
-                    frameJson = self.payload[0:termPos]
-                    binData = self.payload[termPos+1:len(self.payload)-1]
-                else:
-                    return msgContent
-                msgContent = json.loads(frameJson)
+                msgContent = jsonLoads(frameJson)
             except Exception as excp:
-                logging.debug("RICProtocols getJSONDict failed to extract JSON from", 
-                            self.payload, "error", excp)
-        # logging.debug("msgContent ", msgContent)
-        return msgContent
+                self._jsonError = excp
+                logger.debug(f"RICProtocols getJSONDict failed to extract JSON from {self.payload} error {excp}")
+        self._jsonDict = msgContent
 
     def toString(self) -> str:
         msgStr = ""
@@ -115,24 +224,25 @@ class RICProtocols:
     MSG_TYPE_PUBLISH = 0x02
     MSG_TYPE_REPORT = 0x03
     MSG_TYPE_STRS = ["cmd", "resp", "publish", "report"]
+    FILE_BLOCK_HEADER_LEN = 7
 
     def __init__(self) -> None:
         self.ricSerialMsgNum = 1
-        pass
+        self._fileBlockFrameHeader = bytes([0, self.MSG_TYPE_COMMAND + self.PROTOCOL_RICREST, self.RICREST_ELEM_CODE_FILE_BLOCK])
 
-    def encodeRICRESTURL(self, cmdStr: str) -> Tuple[bytes, int]:
-        # RICSerial URL
-        msgNum = self.ricSerialMsgNum
+    def encodeRICRESTURL(self, cmdStr: str, msgNum: Optional[int] = None) -> Tuple[bytes, int]:
+        # RICSerial URL (msgNum is allocated here if not supplied)
+        if msgNum is None:
+            msgNum = self._nextMsgNum()
         cmdFrame = bytearray([msgNum, self.MSG_TYPE_COMMAND + self.PROTOCOL_RICREST, self.RICREST_ELEM_CODE_URL])
         cmdFrame += cmdStr.encode() + b"\0"
-        self.ricSerialMsgNum += 1
-        if self.ricSerialMsgNum > 255:
-            self.ricSerialMsgNum = 1
         return cmdFrame, msgNum
 
-    def encodeRICRESTCmdFrame(self, cmdStr: Union[str,bytes], payload: Union[bytes, str] = None) -> Tuple[bytes, int]:
-        # RICSerial command frame
-        msgNum = self.ricSerialMsgNum
+    def encodeRICRESTCmdFrame(self, cmdStr: Union[str,bytes], payload: Union[bytes, str] = None,
+                    msgNum: Optional[int] = None) -> Tuple[bytes, int]:
+        # RICSerial command frame (msgNum is allocated here if not supplied)
+        if msgNum is None:
+            msgNum = self._nextMsgNum()
         cmdFrame = bytearray([msgNum, self.MSG_TYPE_COMMAND + self.PROTOCOL_RICREST, self.RICREST_ELEM_CODE_CMD_FRAME])
         if type(cmdStr) is str:
             cmdFrame += cmdStr.encode()
@@ -144,10 +254,14 @@ class RICProtocols:
             if type(payload) is str:
                 payload = payload.encode()
             cmdFrame += payload
+        return cmdFrame, msgNum
+
+    def _nextMsgNum(self) -> int:
+        msgNum = self.ricSerialMsgNum
         self.ricSerialMsgNum += 1
         if self.ricSerialMsgNum > 255:
             self.ricSerialMsgNum = 1
-        return cmdFrame, msgNum
+        return msgNum
 
     def encodeRICRESTFileBlock(self, cmdBuf: bytes) -> Tuple[bytes, int]:
         # RICSerial file block - not numbered
@@ -155,29 +269,23 @@ class RICProtocols:
         cmdFrame += cmdBuf
         return cmdFrame, 0
 
+    def encodeRICRESTFileBlockInto(self, frameBuf: bytearray, blockPos: int, blockData: bytes) -> bytearray:
+        # RICSerial file block written over the contents of frameBuf so one buffer can be used
+        # for every block - blockPos is the 4 byte value ahead of the data (the file position
+        # for file uploads) and blockData can be a memoryview so the data is only copied here
+        frameBuf[:3] = self._fileBlockFrameHeader
+        frameBuf[3:self.FILE_BLOCK_HEADER_LEN] = blockPos.to_bytes(4, 'big')
+        frameBuf[self.FILE_BLOCK_HEADER_LEN:] = blockData
+        return frameBuf
+
     def decodeRICFrame(self, fr: bytes) -> DecodedMsg:
-        msg = DecodedMsg()
         if len(fr) < 2:
+            msg = DecodedMsg()
             msg.setError(f"Frame too short {len(fr)} bytes")
-        else:
-            # Decode header
-            msgNum = fr[0]
-            msg.setMsgNum(msgNum)
-            protocol = fr[1] & 0x3f
-            msg.setProtocol(protocol)
-            msgTypeCode = fr[1] >> 6
-            msg.setMsgTypeCode(msgTypeCode)
-            if protocol == self.PROTOCOL_RICREST:
-                restElemCode = fr[2]
-                msg.setRESTElemCode(restElemCode)
-                if restElemCode == self.RICREST_ELEM_CODE_URL or restElemCode == self.RICREST_ELEM_CODE_JSON:
-                    msg.setPayload(True, fr[3:].decode('ascii'))
-                    msg.payload = msg.payload.rstrip('\x00')
-                else:
-                    msg.setPayload(False, fr[3:])
-                # logging.debug(f"RICREST {RICProtocols.MSG_TYPE_STRS[msgTypeCode]} msgNum {msgNum} {fr.hex()}")
-            elif protocol == self.PROTOCOL_ROSSERIAL:
-                msg.setPayload(False, fr[2:])
-            else:
-                logging.debug(f"RICProtocols Unknown frame received {fr}")
+            return msg
+        # Header fields and payload are extracted from the frame on access
+        msg = DecodedMsg(fr)
+        protocol = fr[1] & 0x3f
+        if protocol != self.PROTOCOL_RICREST and protocol != self.PROTOCOL_ROSSERIAL:
+            logging.debug(f"RICProtocols Unknown frame received {fr}")
         return msg
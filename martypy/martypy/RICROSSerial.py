@@ -130,6 +130,39 @@ class RICROSSerial:
 
             # logger.debug(f'ROSSerial decode msgPos {msgPos}')
 
+    @classmethod
+    def encode(cls, topicID: int, payload: bytes) -> bytes:
+        '''
+        Encode a ROSSerial message (as published by RIC) - see decode()
+        '''
+        payloadLength = len(payload)
+        lenLow, lenHigh = payloadLength & 0xff, payloadLength >> 8
+        topicLow, topicHigh = topicID & 0xff, topicID >> 8
+        return b"".join((bytes((0xff, 0xfe, lenLow, lenHigh, 255 - (lenLow + lenHigh) % 256, topicLow, topicHigh)),
+                    payload, bytes((255 - (topicLow + topicHigh + sum(payload)) % 256,))))
+
+    @classmethod
+    def encodeSmartServos(cls, servos: List[Tuple[int, int, int, int]]) -> bytes:
+        '''
+        Encode smart servo status - servos is a list of (IDNo, pos, current, flags)
+        '''
+        return b"".join(struct.pack(">BhhB", *servo) for servo in servos)
+
+    @classmethod
+    def encodeAccel(cls, x: float, y: float, z: float, IDNo: int, flags: int = 0) -> bytes:
+        return struct.pack(">fffBB", x * 1024, y * 1024, z * 1024, IDNo, flags)
+
+    @classmethod
+    def encodePowerStatus(cls, remCapPC: int, battTempC: int, remCapMAH: int, fullCapMAH: int,
+                currentMA: int, power5VOnSecs: int, powerFlags: int, IDNo: int) -> bytes:
+        return struct.pack(">BBHHhHHB", remCapPC, battTempC, remCapMAH, fullCapMAH, currentMA,
+                    power5VOnSecs, powerFlags, IDNo)
+
+    @classmethod
+    def encodeRobotStatus(cls, flags: int, workQCount: int, heapFree: int, heapMin: int,
+                pixRGBT: Tuple[int, int, int], loopMsAvg: int, loopMsMax: int) -> bytes:
+        return struct.pack(">BBIIIIIBB", flags, workQCount, heapFree, heapMin, *pixRGBT, loopMsAvg, loopMsMax)
+
     @classmethod
     def extractSmartServos(cls, buf: bytes) -> Dict:
         #  Each group of attributes for a servo is a fixed size
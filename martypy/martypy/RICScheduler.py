@@ -0,0 +1,218 @@
+'''
+RICScheduler
+Runs time-outs and periodic jobs for RIC connections
+'''
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+from .RICClock import RICClock
+
+logger = logging.getLogger(__name__)
+
+class RICSchedulerJob:
+    '''
+    RICSchedulerJob
+    A scheduled call - cancel() stops it (and any repeats) from running
+    '''
+    __slots__ = ("fn", "args", "periodSecs", "cancelled")
+
+    def __init__(self, fn: Callable, args: tuple, periodSecs: float = 0) -> None:
+        self.fn = fn
+        self.args = args
+        self.periodSecs = periodSecs
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def run(self) -> None:
+        if self.cancelled:
+            return
+        try:
+            self.fn(*self.args)
+        except Exception as excp:
+            logger.warning(f"RICScheduler job {getattr(self.fn, '__name__', self.fn)} failed {excp}", exc_info=True)
+
+class RICScheduler:
+    '''
+    RICScheduler
+    Single thread which runs jobs at their deadlines - deadlines are kept in a heap
+    so the thread sleeps until the earliest is due. One scheduler (getDefault()) is
+    shared by all of the RIC connections in a process (connections using a virtual
+    clock have their own scheduler)
+    '''
+    _default: Optional['RICScheduler'] = None
+    _defaultLock = threading.Lock()
+
+    def __init__(self, clock: Optional[RICClock] = None) -> None:
+        '''
+        Initialise RICScheduler
+        Args:
+            clock: clock deadlines are on (None for real time)
+        '''
+        self._clock = clock if clock is not None else RICClock()
+        self._heap: List[Tuple[float, int, RICSchedulerJob]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._jobsChanged = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def getDefault(cls) -> 'RICScheduler':
+        '''
+        Get the scheduler shared by all RIC connections in this process
+        '''
+        with cls._defaultLock:
+            if cls._default is None:
+                cls._default = RICScheduler()
+            return cls._default
+
+    def callLater(self, delaySecs: float, fn: Callable, *args) -> RICSchedulerJob:
+        '''
+        Call fn(*args) on the scheduler thread after delaySecs
+        Returns:
+            job which can be cancelled
+        '''
+        job = RICSchedulerJob(fn, args)
+        self._push(self._clock.monotonic() + delaySecs, job)
+        return job
+
+    def callAt(self, deadline: float, fn: Callable, *args) -> RICSchedulerJob:
+        '''
+        Call fn(*args) on the scheduler thread at deadline (the clock's monotonic()
+        time) - jobs with the same deadline run in the order they were added
+        Returns:
+            job which can be cancelled
+        '''
+        job = RICSchedulerJob(fn, args)
+        self._push(deadline, job)
+        return job
+
+    def callEvery(self, periodSecs: float, fn: Callable, *args) -> RICSchedulerJob:
+        '''
+        Call fn(*args) on the scheduler thread every periodSecs (the first call is
+        after periodSecs)
+        Returns:
+            job which can be cancelled
+        '''
+        job = RICSchedulerJob(fn, args, periodSecs)
+        self._push(self._clock.monotonic() + periodSecs, job)
+        return job
+
+    def stop(self) -> None:
+        '''
+        Stop the scheduler thread (waiting for a job which is running to finish) - jobs
+        not yet run are dropped and a job added later starts the thread again
+        '''
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            self._heap.clear()
+            self._jobsChanged.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def isSchedulerThread(self) -> bool:
+        '''
+        Check if the caller is running on the scheduler thread (i.e. is a job)
+        '''
+        return threading.current_thread() is self._thread
+
+    def getNumPending(self) -> int:
+        '''
+        Get the number of jobs waiting to run (including cancelled ones which
+        haven't reached their deadline)
+        '''
+        with self._lock:
+            return len(self._heap)
+
+    def _push(self, deadline: float, job: RICSchedulerJob) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, next(self._seq), job))
+            # Wake the thread if this is now the earliest deadline
+            if self._heap[0][2] is job:
+                self._jobsChanged.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._threadFn, name="RICScheduler", daemon=True)
+                self._thread.start()
+
+    def _threadFn(self) -> None:
+        thisThread = threading.current_thread()
+        while True:
+            with self._lock:
+                while True:
+                    # Stopped (this thread is no longer the scheduler's)
+                    if self._thread is not thisThread:
+                        return
+                    if not self._heap:
+                        self._jobsChanged.wait()
+                        continue
+                    deadline, _, job = self._heap[0]
+                    timeNow = self._clock.monotonic()
+                    if deadline > timeNow:
+                        self._clock.wait(self._jobsChanged, deadline - timeNow)
+                        continue
+                    heapq.heappop(self._heap)
+                    break
+            job.run()
+            if job.periodSecs > 0 and not job.cancelled:
+                # Keep to the period unless running behind
+                with self._lock:
+                    if self._thread is not thisThread:
+                        return
+                    heapq.heappush(self._heap, (max(deadline + job.periodSecs, self._clock.monotonic()),
+                                next(self._seq), job))
+
+class RICLoopScheduler:
+    '''
+    RICLoopScheduler
+    Scheduler with the same interface as RICScheduler which runs jobs on an
+    asyncio event loop (jobs may be scheduled from any thread)
+    '''
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def setLoop(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def callLater(self, delaySecs: float, fn: Callable, *args) -> RICSchedulerJob:
+        job = RICSchedulerJob(fn, args)
+        self._callOnLoop(self._loop.call_later, delaySecs, job.run)
+        return job
+
+    def callAt(self, deadline: float, fn: Callable, *args) -> RICSchedulerJob:
+        # The loop's time() is monotonic like RICClock.monotonic()
+        job = RICSchedulerJob(fn, args)
+        self._callOnLoop(self._loop.call_at, deadline, job.run)
+        return job
+
+    def callEvery(self, periodSecs: float, fn: Callable, *args) -> RICSchedulerJob:
+        job = RICSchedulerJob(fn, args, periodSecs)
+        self._callOnLoop(self._loop.call_later, periodSecs, self._runPeriodic, job)
+        return job
+
+    def isSchedulerThread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _runPeriodic(self, job: RICSchedulerJob) -> None:
+        job.run()
+        if not job.cancelled:
+            self._loop.call_later(job.periodSecs, self._runPeriodic, job)
+
+    def _callOnLoop(self, fn: Callable, *args) -> None:
+        if self._loop.is_closed():
+            return
+        try:
+            onLoop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            onLoop = False
+        if onLoop:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
@@ -1,20 +1,59 @@
 '''
 RICStreamHandler
 '''
-from typing import Callable
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
 from .Exceptions import MartyTransferException
 import logging
 import os
-import time
 
 logger = logging.getLogger(__name__)
 
 class RICStreamHandler:
+    '''
+    RICStreamHandler
+    Streams audio to RIC paced by a token bucket - tokens (bytes) accrue at the
+    estimated playback rate on the clock's monotonic time and each block is sent
+    when there are enough tokens for it, so blocks go out at the time they are
+    needed rather than after a fixed sleep. The bucket starts full so the first
+    leadSecs of audio is sent at once (prebuffering) and holds at most leadSecs,
+    which keeps the data sent ahead of RIC's sokto to that lead. The rate starts
+    at the MP3 bitrate (or DEFAULT_BYTES_PER_SEC) and is probed upwards while
+    RIC accepts everything (quickly if the bitrate isn't known) - if RIC rejects a block (sokto doesn't move as its
+    buffer is full) the rate is cut to the rate sokto has been moving at and
+    sending resumes from sokto
+    '''
+    # Rate used when it can't be found from the file (32kbits/s)
+    DEFAULT_BYTES_PER_SEC = 4000
+    # Limits on the rate - the maximum is a multiple of the MP3 bitrate or of the default rate
+    MIN_BYTES_PER_SEC = 500
+    MAX_RATE_MULTIPLE_MP3 = 1.25
+    MAX_RATE_MULTIPLE = 8
+    # Rate increase per second when limited by the rate - faster until RIC first rejects a block
+    RATE_PROBE_START = 0.25
+    RATE_PROBE = 0.02
+    # Rate reduction when RIC rejects a block
+    RATE_BACKOFF = 0.85
+    # Window over which the rate sokto moves at is measured
+    SOKTO_RATE_WINDOW_SECS = 2.0
+    # Send again from sokto if it doesn't move for this long (and give up after STREAM_RETRY_MAX times)
+    ACK_TIMEOUT_MIN_SECS = 0.5
+    STREAM_RETRY_MAX = 4
+    # Longest wait before the progress callback is called again
+    PROGRESS_CHECK_SECS = 0.25
+
+    # MP3 bitrates in kbits/s by bitrate index for MPEG-1 and MPEG-2/2.5 layer III
+    _MP3_BITRATES_V1 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+    _MP3_BITRATES_V2 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
 
     def __init__(self, ricInterface: 'RICInterface'):
         # Stream vars
         self._ricInterface = ricInterface
         self._streamId: int = None
+        # Audio sent ahead of playback
+        self.leadSecs = 1.0
+        # Stats for the last stream
+        self._stats: Dict = {}
 
     def streamSoundFile(self, fileName: str, targetEndpoint: str,
                 progressCB: Callable[[int, int, 'RICInterface'], bool] = None) -> bool:
@@ -33,23 +72,18 @@ class RICStreamHandler:
         '''
         # Check validity
         try:
-            fileStat = os.stat(fileName)
+            os.stat(fileName)
         except OSError as e:
             raise MartyTransferException("File not found")
 
-        # Open the file
-        with open(fileName, 'rb') as soundFile:
+        # The file is mapped so blocks are sliced from it rather than read
+        with self._ricInterface._openFileView(fileName) as soundData:
 
-            # Setup file info 
-            streamLength = fileStat.st_size
+            # Setup file info
+            streamLength = len(soundData)
             streamType = "rtstream"
             streamName = os.path.basename(fileName)
 
-            # Establish a maximum duration for streaming based on the assumption
-            # that the file is encoded at at 10Kbits/s so a 1K file has 1s duration
-            # with a 50% margin of error
-            maxStreamDuration = streamLength / 1024 * 1.5
-
             # Send stream start message
             streamStartMsg = f'"cmdName":"ufStart","reqStr":"ufStart","fileType":"{streamType}","fileName":"{streamName}","endpoint":"{targetEndpoint}"'
             streamStartMsg += f',"fileLen":{streamLength}'
@@ -67,89 +101,260 @@ class RICStreamHandler:
             if self._streamId < 0:
                 raise MartyTransferException("Stream ID invalid")
 
-            # File pos
-            filePos = 0
+            # Send stream data
+            streamResult = self._sendStreamData(soundData, maxBlockSize, progressCB)
 
-            # Rate estimation
-            msgRateWindow = []
-            streamLastSoktoPos = 0
-            intraMessageTime = 0.05
-            lastMsgSentTime = 0
-            lastMsgSent = False
+            # End frame (RIC has already ended a stream it closed or which was cancelled)
+            if streamResult not in ("closed", "aborted"):
+                resp = self._ricInterface.sendRICRESTCmdFrameSync('{' + f'"cmdName":"ufEnd","reqStr":"ufEnd","streamId":"{self._streamId}"' + '}')
+                if resp.get("rslt","") != "ok":
+                    return False
+        return streamResult == "ok"
 
-            # Send stream data
-            streamStartTime = time.time()
-            while time.time() - streamStartTime < maxStreamDuration:
+    def getStats(self) -> Dict:
+        '''
+        Get statistics of the last stream (the current one while streaming)
+        Returns:
+            dict with the bytes sent and acknowledged (sokto), bytes resent, blocks
+            rejected by RIC, resends after sokto stopped moving, estimated underruns
+            (playback running out of data) and their total duration, time to the
+            first sokto (prebuffering), block latency (send to sokto) in milliseconds,
+            the final rate in bytes per second and the duration
+        '''
+        return dict(self._stats)
 
-                # Wait for intra message time
-                time.sleep(0.05 if intraMessageTime < 0.25 else intraMessageTime - 0.15)
+    def _sendStreamData(self, soundData: memoryview, maxBlockSize: int,
+                progressCB: Callable[[int, int, 'RICInterface'], bool]) -> str:
+        ricIF = self._ricInterface
+        clock = ricIF.clock
+        streamLength = len(soundData)
+        frameBuf = bytearray()
+        blockPosBase = self._streamId << 24
 
-                # # Reduce intra message time on each block to ensure we don't starve the connection
-                # intraMessageTime -= 0.05
+        # Rate and lead (the size of the bucket)
+        mp3BytesPerSec = self._mp3BytesPerSec(soundData)
+        if mp3BytesPerSec is not None:
+            bytesPerSec = float(mp3BytesPerSec)
+            maxBytesPerSec = bytesPerSec * self.MAX_RATE_MULTIPLE_MP3
+            rateProbe = self.RATE_PROBE
+        else:
+            bytesPerSec = float(self.DEFAULT_BYTES_PER_SEC)
+            maxBytesPerSec = bytesPerSec * self.MAX_RATE_MULTIPLE
+            rateProbe = self.RATE_PROBE_START
+        leadBytes = max(int(self.leadSecs * bytesPerSec), maxBlockSize)
 
-                # Check for sokto message
-                isNewSokto, streamOkTo, streamClosed = self._ricInterface._streamGetLatest()
-                if streamClosed:
-                    # logger.debug("streamSoundFile stream closed")
-                    break
-                elif isNewSokto:
-                    if streamOkTo >= streamLength:
-                        # logger.debug(f"streamSoundFile sokto stream end reached")
-                        break
-                    else:
-                        # logger.debug(f"streamSoundFile sokto not last message")
-                        lastMsgSent = False
-                    filePos = streamOkTo
-                    if streamLastSoktoPos != filePos:
-                        msgRateWindow.append((filePos, time.time()))
-                        streamLastSoktoPos = filePos
-                        if len(msgRateWindow) > 5:
-                            msgRateWindow.pop(0)
-                        msgRateWindowLen = len(msgRateWindow)
-                        if msgRateWindowLen > 1:
-                            timeBetweenOkTo = msgRateWindow[-1][1] - msgRateWindow[0][1]
-                            bytesBetweenOkTo = msgRateWindow[-1][0] - msgRateWindow[0][0]
-                            dataRate = bytesBetweenOkTo / timeBetweenOkTo
-                            intraMessageTime = maxBlockSize / dataRate
-                            if intraMessageTime > 1.0:
-                                intraMessageTime = 1.0
-                            # Debug
-                            # logger.debug(f"streamSoundFile recalc {bytesBetweenOkTo} between {round(timeBetweenOkTo,2)}s rate {round(dataRate,0)}bytesps intraMsg {round(intraMessageTime,2)}s")
-
-                # Progress and check for abort
-                if self._sendStreamProgressCheckAbort(progressCB, filePos, streamLength):
-                    # logger.debug("streamSoundFile progressCB aborted")
-                    break
+        # Maximum duration assumes the file is encoded at at least 10Kbits/s (so a 1K file
+        # has 1s duration) with a 50% margin of error
+        maxStreamSecs = streamLength / 1024 * 1.5 + self.leadSecs
+
+        # Positions - inFlight has the end position and send time of each block sent but
+        # not acknowledged (latency isn't measured for blocks sent again)
+        sendPos = 0
+        ackPos = 0
+        inFlight: Deque[Tuple[int, float]] = deque()
+        latencyValidFrom = 0
+        soktoWindow: Deque[Tuple[int, float]] = deque()
+        latencies: List[float] = []
+        retryCount = 0
+        ignoreDupUntil = 0.0
+        rejectedPos = -1
+        paidPos = 0
 
-                # Read block
-                soundFile.seek(filePos)
-                fileBlock = soundFile.read(maxBlockSize)
+        # Estimated playback - RIC starts playing when the first data arrives and
+        # stalls if it runs out
+        playPos = 0.0
+        playTime: Optional[float] = None
+        underrunning = False
 
-                # Stream data
-                if len(fileBlock) > 0:
-                    if not self._ricInterface.sendRICRESTFileBlock(self._streamId.to_bytes(1, 'big') +
-                            filePos.to_bytes(3, 'big') + fileBlock):
-                        break
+        stats = {"bytesSent": 0, "bytesAcked": 0, "bytesResent": 0, "rejects": 0, "ackTimeouts": 0,
+                 "underruns": 0, "underrunSecs": 0.0, "prebufferSecs": 0.0, "latencyAvgMS": 0.0,
+                 "latencyP95MS": 0.0, "latencyMaxMS": 0.0, "bytesPerSec": 0.0, "durationSecs": 0.0,
+                 "result": "ok"}
+        self._stats = stats
 
-                    # Bump file pos
-                    filePos += len(fileBlock)
+        startTime = clock.monotonic()
+        tokens = float(leadBytes)
+        lastRefillTime = startTime
+        lastRateChangeTime = startTime
+        rateLimited = False
+        while True:
+            timeNow = clock.monotonic()
+            if timeNow - startTime > maxStreamSecs:
+                stats["result"] = "failTimeout"
+                break
+
+            # Check for sokto message
+            isNewSokto, streamOkTo, streamClosed = ricIF._streamGetLatest()
+            if streamClosed:
+                stats["result"] = "closed"
+                break
+            if isNewSokto and streamOkTo > ackPos:
+                blockSendTime = None
+                while inFlight and inFlight[0][0] <= streamOkTo:
+                    _, blockSendTime = inFlight.popleft()
+                if blockSendTime is not None and streamOkTo > latencyValidFrom:
+                    latencies.append(timeNow - blockSendTime)
+                if playTime is None:
+                    playTime = timeNow
+                    stats["prebufferSecs"] = round(timeNow - startTime, 4)
+                ackPos = min(streamOkTo, streamLength)
+                sendPos = max(sendPos, ackPos)
+                paidPos = max(paidPos, ackPos)
+                retryCount = 0
+                soktoWindow.append((ackPos, timeNow))
+                while soktoWindow[0][1] < timeNow - self.SOKTO_RATE_WINDOW_SECS:
+                    soktoWindow.popleft()
+            elif isNewSokto and sendPos > ackPos and timeNow >= ignoreDupUntil:
+                # RIC rejected a block - either a block before it was lost or RIC's buffer is
+                # full. It is taken to be full if the estimated buffered audio is over half
+                # the lead or the same block is rejected again, in which case the rate is cut
+                # to the rate RIC is taking data and the block is sent again once a block has
+                # had time to play (after a loss the block is sent again straight away)
+                stats["rejects"] += 1
+                if ackPos == rejectedPos or ackPos - playPos > leadBytes / 2:
+                    bytesPerSec = self._reducedRate(bytesPerSec, soktoWindow)
+                    leadBytes = max(int(self.leadSecs * bytesPerSec), maxBlockSize)
+                    tokens = 0.0
+                    paidPos = ackPos
+                    rateProbe = self.RATE_PROBE
+                    lastRateChangeTime = timeNow
+                rejectedPos = ackPos
+                stats["bytesResent"] += sendPos - ackPos
+                latencyValidFrom = sendPos
+                sendPos = ackPos
+                inFlight.clear()
+                # Blocks sent before now are rejected too - their soktos are ignored
+                ignoreDupUntil = timeNow + 2 * self._latencyEstimate(latencies)
+            stats["bytesAcked"] = ackPos
+            if ackPos >= streamLength:
+                break
+
+            # Estimated playback
+            if playTime is not None:
+                playPos += (timeNow - playTime) * bytesPerSec
+                playTime = timeNow
+                if playPos > ackPos:
+                    if not underrunning:
+                        stats["underruns"] += 1
+                        underrunning = True
+                    stats["underrunSecs"] += (playPos - ackPos) / bytesPerSec
+                    playPos = ackPos
                 else:
-                    # logger.debug(f"streamSoundFile end of file")
-                    lastMsgSent = True
-                    lastMsgSentTime = time.time()
+                    underrunning = False
+
+            # Progress and check for abort
+            if self._sendStreamProgressCheckAbort(progressCB, ackPos, streamLength):
+                stats["result"] = "aborted"
+                break
 
-                # Check for timeout on last frame sent
-                if lastMsgSent and time.time() - lastMsgSentTime > 2:
-                    # logger.debug(f"streamSoundFile timeout")
+            # Send again from sokto if the oldest block not acknowledged was sent too long ago
+            ackTimeoutSecs = max(4 * self._latencyEstimate(latencies), self.ACK_TIMEOUT_MIN_SECS)
+            if inFlight and timeNow > inFlight[0][1] + ackTimeoutSecs:
+                retryCount += 1
+                stats["ackTimeouts"] += 1
+                if retryCount > self.STREAM_RETRY_MAX:
+                    logger.warning(f"streamSoundFile no progress from {ackPos} after {retryCount} retries")
+                    stats["result"] = "failRetries"
                     break
+                stats["bytesResent"] += sendPos - ackPos
+                latencyValidFrom = sendPos
+                sendPos = ackPos
+                inFlight.clear()
 
-            # End frame
-            resp = self._ricInterface.sendRICRESTCmdFrameSync('{' + f'"cmdName":"ufEnd","reqStr":"ufEnd","streamId":"{self._streamId}"' + '}')
-            if resp.get("rslt","") != "ok":
-                return False
-        return True
+            # Probe for a higher rate while the rate is what limits sending
+            if timeNow - lastRateChangeTime >= 1.0:
+                if rateLimited and bytesPerSec < maxBytesPerSec:
+                    bytesPerSec = min(bytesPerSec * (1 + rateProbe), maxBytesPerSec)
+                    leadBytes = max(int(self.leadSecs * bytesPerSec), maxBlockSize)
+                lastRateChangeTime = timeNow
+                rateLimited = False
+
+            # Refill the bucket and send the blocks there are tokens for - data sent again
+            # after a loss has already been paid for (so the lead is rebuilt) and the data
+            # sent ahead of sokto is limited to the lead
+            tokens = min(tokens + (timeNow - lastRefillTime) * bytesPerSec, leadBytes)
+            lastRefillTime = timeNow
+            blockLen = min(maxBlockSize, streamLength - sendPos)
+            blockTokens = max(sendPos + blockLen - paidPos, 0)
+            blocksSent = 0
+            while blockLen > 0 and tokens >= blockTokens and sendPos + blockLen - ackPos <= leadBytes:
+                ricIF.ricProtocols.encodeRICRESTFileBlockInto(frameBuf, blockPosBase | sendPos,
+                            soundData[sendPos:sendPos+blockLen])
+                if not ricIF._sendFileBlockFrame(frameBuf):
+                    break
+                sendPos += blockLen
+                tokens -= blockTokens
+                paidPos = max(paidPos, sendPos)
+                stats["bytesSent"] += blockLen
+                inFlight.append((sendPos, timeNow))
+                blocksSent += 1
+                blockLen = min(maxBlockSize, streamLength - sendPos)
+                blockTokens = max(sendPos + blockLen - paidPos, 0)
+            if blocksSent > 0:
+                ricIF.commsHandler.flush()
+
+            # Wait until there will be tokens for the next block (the deadline for sending
+            # it) or a sokto arrives
+            waitSecs = self.PROGRESS_CHECK_SECS
+            if inFlight:
+                waitSecs = min(waitSecs, max(inFlight[0][1] + ackTimeoutSecs - timeNow, 0.001))
+            if blockLen > 0 and sendPos + blockLen - ackPos <= leadBytes:
+                rateLimited = True
+                waitSecs = min(waitSecs, max((blockTokens - tokens) / bytesPerSec, 0.001))
+            clock.wait(ricIF._streamOkToEvent, waitSecs)
+
+        # Stats
+        stats["bytesPerSec"] = round(bytesPerSec, 1)
+        stats["durationSecs"] = round(clock.monotonic() - startTime, 4)
+        stats["underrunSecs"] = round(stats["underrunSecs"], 4)
+        if latencies:
+            latencies.sort()
+            stats["latencyAvgMS"] = round(sum(latencies) / len(latencies) * 1000, 2)
+            stats["latencyP95MS"] = round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 2)
+            stats["latencyMaxMS"] = round(latencies[-1] * 1000, 2)
+        if stats["result"] != "ok":
+            logger.warning(f"streamSoundFile ended {stats['result']} at {ackPos} of {streamLength}")
+        return stats["result"]
+
+    def _reducedRate(self, bytesPerSec: float, soktoWindow: Deque[Tuple[int, float]]) -> float:
+        # While RIC's buffer is full sokto moves at the playback rate - the rate is cut to
+        # that (if it has been measured) but by no more than half
+        newBytesPerSec = bytesPerSec * self.RATE_BACKOFF
+        if len(soktoWindow) > 1 and soktoWindow[-1][1] - soktoWindow[0][1] >= self.SOKTO_RATE_WINDOW_SECS / 4:
+            soktoBytesPerSec = (soktoWindow[-1][0] - soktoWindow[0][0]) / (soktoWindow[-1][1] - soktoWindow[0][1])
+            newBytesPerSec = max(min(newBytesPerSec, soktoBytesPerSec), bytesPerSec / 2)
+        return max(newBytesPerSec, self.MIN_BYTES_PER_SEC)
 
-    def _sendStreamProgressCheckAbort(self, progressCB: Callable[[int, int, 'RICInterface'], bool], 
+    @staticmethod
+    def _latencyEstimate(latencies: List[float]) -> float:
+        # Recent block latency (send to sokto) or a default before any are measured
+        recent = latencies[-8:]
+        return max(recent) if recent else 0.1
+
+    @classmethod
+    def _mp3BytesPerSec(cls, data: memoryview) -> Optional[int]:
+        '''
+        Get the bitrate of an MP3 (layer III) in bytes per second from the header of
+        its first frame (after any ID3v2 tag)
+        Returns:
+            bytes per second or None if the data doesn't start with an MP3 frame
+        '''
+        pos = 0
+        if len(data) >= 10 and bytes(data[:3]) == b"ID3":
+            # Tag size is 4 bytes of 7 bits each (plus a 10 byte footer if flagged)
+            tagSize = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+            pos = 10 + tagSize + (10 if data[5] & 0x10 else 0)
+        if len(data) < pos + 4 or data[pos] != 0xff or (data[pos+1] & 0xe0) != 0xe0:
+            return None
+        versionBits = (data[pos+1] >> 3) & 0x03
+        layerBits = (data[pos+1] >> 1) & 0x03
+        bitrateIdx = data[pos+2] >> 4
+        if versionBits == 1 or layerBits != 1 or bitrateIdx == 0 or bitrateIdx == 15:
+            return None
+        bitrates = cls._MP3_BITRATES_V1 if versionBits == 3 else cls._MP3_BITRATES_V2
+        return bitrates[bitrateIdx] * 1000 // 8
+
+    def _sendStreamProgressCheckAbort(self, progressCB: Callable[[int, int, 'RICInterface'], bool],
                     currentPos: int, fileSize: int) -> bool:
         if not progressCB:
             return False
@@ -159,4 +364,3 @@ class RICStreamHandler:
             self._ricInterface.sendRICRESTCmdFrameSync('{' + f'"cmdName":"ufCancel", "streamId":"{self._streamId}"' + '}')
             return True
         return False
-
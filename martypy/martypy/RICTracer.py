@@ -0,0 +1,122 @@
+'''
+RICTracer
+'''
+from typing import Dict, List, Tuple
+from collections import deque
+import itertools
+import json
+import os
+import threading
+
+class RICTraceRec:
+    '''
+    RICTraceRec
+    Timestamps (perf_counter_ns, 0 if the stage didn't happen) of a message sent
+    to RIC from encoding to the waiter waking with the response
+    '''
+    __slots__ = ("seq", "name", "msgNum", "threadId", "encodeStartNs", "encodeEndNs", "writeStartNs",
+                 "writeEndNs", "rxStartNs", "rxFrameNs", "matchNs", "wakeNs", "timedOut")
+
+    def __init__(self, seq: int, name: str, encodeStartNs: int) -> None:
+        self.seq = seq
+        self.name = name
+        self.msgNum = 0
+        self.threadId = threading.get_ident()
+        self.encodeStartNs = encodeStartNs
+        self.encodeEndNs = 0
+        self.writeStartNs = 0
+        self.writeEndNs = 0
+        self.rxStartNs = 0
+        self.rxFrameNs = 0
+        self.matchNs = 0
+        self.wakeNs = 0
+        self.timedOut = False
+
+class RICTracer:
+    '''
+    RICTracer
+    Records the lifecycle of each numbered message (enable with RICInterface.setTracer())
+    - the stages are encode, write to the transport, in flight (until the first bytes
+    of the response arrive), rx frame (until the HDLC frame is complete), dispatch
+    (until the response is matched to the message) and wake (until the waiting caller
+    runs). The trace can be exported as Chrome trace JSON which can be viewed with
+    chrome://tracing or https://ui.perfetto.dev
+    '''
+    def __init__(self, maxMsgs: int = 100000) -> None:
+        '''
+        Initialise RICTracer
+        Args:
+            maxMsgs: number of messages kept (the oldest are dropped)
+        '''
+        self._recs = deque(maxlen=maxMsgs)
+        self._seq = itertools.count(1)
+
+    def startMsg(self, name: str, encodeStartNs: int) -> RICTraceRec:
+        traceRec = RICTraceRec(next(self._seq), name, encodeStartNs)
+        self._recs.append(traceRec)
+        return traceRec
+
+    def clear(self) -> None:
+        self._recs.clear()
+
+    def getRecs(self) -> List[RICTraceRec]:
+        return list(self._recs)
+
+    def toChromeTrace(self) -> Dict:
+        '''
+        Get the trace in Chrome trace event format
+        Returns:
+            dict which can be saved as JSON
+        '''
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "martypy"}}]
+        for traceRec in self.getRecs():
+            endNs = max(traceRec.encodeStartNs, traceRec.encodeEndNs, traceRec.writeEndNs, traceRec.rxFrameNs,
+                        traceRec.matchNs, traceRec.wakeNs)
+            # Each message is an async slice (so overlapping messages each get a track) with
+            # a nested slice for each stage
+            msgArgs = {"msgNum": traceRec.msgNum, "threadId": traceRec.threadId, "timedOut": traceRec.timedOut}
+            msgEvent = {"cat": "msg", "id": traceRec.seq, "pid": pid, "tid": traceRec.threadId}
+            events.append(dict(msgEvent, name=traceRec.name, ph="b", ts=traceRec.encodeStartNs / 1000, args=msgArgs))
+            for stageName, startNs, stageEndNs in self._getStages(traceRec):
+                events.append(dict(msgEvent, name=stageName, ph="b", ts=startNs / 1000))
+                events.append(dict(msgEvent, name=stageName, ph="e", ts=stageEndNs / 1000))
+            events.append(dict(msgEvent, name=traceRec.name, ph="e", ts=endNs / 1000))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def exportChromeTrace(self, filename: str) -> None:
+        '''
+        Save the trace as Chrome trace JSON
+        Args:
+            filename: file to write
+        Throws:
+            OSError: operating system exceptions
+        '''
+        with open(filename, "w") as f:
+            json.dump(self.toChromeTrace(), f)
+
+    def getStageSummary(self) -> Dict[str, Dict[str, float]]:
+        '''
+        Get the average and maximum time in each stage in milliseconds
+        '''
+        stageTotals: Dict[str, List[float]] = {}
+        for traceRec in self.getRecs():
+            for stageName, startNs, endNs in self._getStages(traceRec):
+                stageTotals.setdefault(stageName, []).append((endNs - startNs) / 1e6)
+        return {stageName: {"count": len(times), "avgMS": round(sum(times) / len(times), 3),
+                    "maxMS": round(max(times), 3)} for stageName, times in stageTotals.items()}
+
+    @staticmethod
+    def _getStages(traceRec: RICTraceRec) -> List[Tuple[str, int, int]]:
+        # Stages which happened - if the link doesn't record when frames arrive then the
+        # time from the write to the match is all in flight
+        if traceRec.rxFrameNs:
+            stages = [("inFlight", traceRec.writeEndNs, traceRec.rxStartNs),
+                      ("rxFrame", traceRec.rxStartNs, traceRec.rxFrameNs),
+                      ("dispatch", traceRec.rxFrameNs, traceRec.matchNs)]
+        else:
+            stages = [("inFlight", traceRec.writeEndNs, traceRec.matchNs)]
+        stages = [("encode", traceRec.encodeStartNs, traceRec.encodeEndNs),
+                  ("write", traceRec.writeStartNs, traceRec.writeEndNs)] + stages + \
+                 [("wake", traceRec.matchNs, traceRec.wakeNs)]
+        return [stage for stage in stages if stage[1] and stage[2] >= stage[1]]
@@ -0,0 +1,262 @@
+'''
+RICTransferManager
+'''
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import Future
+import heapq
+import itertools
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+class RICTransferJob:
+    '''
+    RICTransferJob
+    A file queued for upload by RICTransferManager - future is completed with True
+    if the file is sent, False if the upload fails or is cancelled (or with the
+    exception raised by the upload)
+    '''
+    STATE_QUEUED = "queued"
+    STATE_SENDING = "sending"
+    STATE_DONE = "done"
+    STATE_FAILED = "failed"
+    STATE_CANCELLED = "cancelled"
+
+    def __init__(self, manager: 'RICTransferManager', filename: str, fileLen: int,
+                fileDest: str, reqStr: str, priority: int) -> None:
+        self.filename = filename
+        self.fileLen = fileLen
+        self.fileDest = fileDest
+        self.reqStr = reqStr
+        self.priority = priority
+        self.state = self.STATE_QUEUED
+        self.bytesSent = 0
+        self.cancelRequested = False
+        self.future: Future = Future()
+        self._manager = manager
+
+    def cancel(self) -> bool:
+        '''
+        Cancel the upload (whether it is queued or being sent)
+        Returns:
+            True if the job hadn't already finished
+        '''
+        return self._manager.cancel(self)
+
+    def isFinished(self) -> bool:
+        return self.state in (self.STATE_DONE, self.STATE_FAILED, self.STATE_CANCELLED)
+
+class RICTransferManager:
+    '''
+    RICTransferManager
+    Queue of files to upload with RICInterface.sendFile() - files are sent one
+    after another (RIC handles one upload at a time) by a worker thread, highest
+    priority first and in the order added for the same priority, with the next
+    ufStart sent as soon as the previous upload ends. All the state of a transfer
+    is held by its job so the manager can run alongside sound streaming
+    '''
+    def __init__(self, ricInterface: 'RICInterface',
+                progressCB: Optional[Callable[[Dict, 'RICTransferManager'], None]] = None) -> None:
+        '''
+        Initialise RICTransferManager
+        Args:
+            ricInterface: interface to RIC
+            progressCB: callback with the aggregate progress (see getProgress()) called
+                    each time an upload reports progress and when a job finishes
+        '''
+        self._ricInterface = ricInterface
+        self.progressCB = progressCB
+        self._lock = threading.Condition()
+        self._queue: List = []
+        self._queueSeq = itertools.count()
+        self._jobs: List[RICTransferJob] = []
+        self._activeJob: Optional[RICTransferJob] = None
+        self._worker: Optional[threading.Thread] = None
+        self._isClosed = False
+        # Throughput is measured over the time the manager is busy (including handshakes)
+        self._busySecs = 0.0
+        self._busyStartTime: Optional[float] = None
+        self._bytesMoved = 0
+
+    def add(self, filename: str, fileDest: str = "fs", priority: int = 0, reqStr: str = '') -> RICTransferJob:
+        '''
+        Queue a file for upload
+        Args:
+            filename: name of file to send
+            fileDest: "fs" to upload to file system, "ricfw" for new RIC firmware
+            priority: jobs with a higher priority are sent first (a job being sent
+                    isn't interrupted)
+            reqStr: API request used for transfer (see RICInterface.sendFile())
+        Returns:
+            the job - use job.future to wait for the result
+        Throws:
+            OSError: operating system exceptions (e.g. if the file doesn't exist)
+        '''
+        fileLen = os.stat(filename).st_size
+        with self._lock:
+            if self._isClosed:
+                raise RuntimeError("RICTransferManager is closed")
+            job = RICTransferJob(self, filename, fileLen, fileDest, reqStr, priority)
+            self._jobs.append(job)
+            heapq.heappush(self._queue, (-priority, next(self._queueSeq), job))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._runJobs, name="RICTransferManager", daemon=True)
+                self._worker.start()
+            self._lock.notify_all()
+        return job
+
+    def cancel(self, job: RICTransferJob) -> bool:
+        '''
+        Cancel a job (whether it is queued or being sent)
+        Args:
+            job: job returned by add()
+        Returns:
+            True if the job hadn't already finished
+        '''
+        with self._lock:
+            if job.isFinished() or job.cancelRequested:
+                return False
+            job.cancelRequested = True
+            if job.state == RICTransferJob.STATE_QUEUED:
+                self._queue = [entry for entry in self._queue if entry[2] is not job]
+                heapq.heapify(self._queue)
+                self._finishJob(job, RICTransferJob.STATE_CANCELLED)
+                job.future.set_result(False)
+            isActive = job is self._activeJob
+        # Wake the upload rather than waiting for its next progress check
+        if isActive:
+            self._ricInterface.cancelFileSend()
+        self._reportProgress()
+        return True
+
+    def cancelAll(self) -> None:
+        '''
+        Cancel all jobs which haven't finished
+        '''
+        with self._lock:
+            jobs = [job for job in self._jobs if not job.isFinished()]
+        for job in jobs:
+            self.cancel(job)
+
+    def waitAll(self, timeOutSecs: Optional[float] = None) -> bool:
+        '''
+        Wait until all jobs have finished
+        Args:
+            timeOutSecs: maximum time to wait (None to wait indefinitely)
+        Returns:
+            True if all jobs have finished (successfully or not)
+        '''
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._queue and self._activeJob is None, timeOutSecs)
+
+    def close(self) -> None:
+        '''
+        Cancel all jobs and stop the worker thread
+        '''
+        with self._lock:
+            self._isClosed = True
+        self.cancelAll()
+        with self._lock:
+            worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join()
+
+    def getJobs(self) -> List[RICTransferJob]:
+        '''
+        Get all the jobs added (in the order they were added)
+        '''
+        with self._lock:
+            return list(self._jobs)
+
+    def getProgress(self) -> Dict:
+        '''
+        Get the aggregate progress of the jobs added
+        Returns:
+            dict with the number of files queued, done, failed and cancelled, the
+            bytes to send and bytes sent (for jobs which haven't failed or been cancelled),
+            the throughput in bytes per second and the estimated time to finish (None
+            until the throughput is known)
+        '''
+        with self._lock:
+            counts = {state: 0 for state in (RICTransferJob.STATE_QUEUED, RICTransferJob.STATE_SENDING,
+                        RICTransferJob.STATE_DONE, RICTransferJob.STATE_FAILED, RICTransferJob.STATE_CANCELLED)}
+            bytesTotal = 0
+            bytesDone = 0
+            for job in self._jobs:
+                counts[job.state] += 1
+                if job.state in (RICTransferJob.STATE_FAILED, RICTransferJob.STATE_CANCELLED):
+                    continue
+                bytesTotal += job.fileLen
+                bytesDone += job.fileLen if job.state == RICTransferJob.STATE_DONE else job.bytesSent
+            busySecs = self._busySecs
+            if self._busyStartTime is not None:
+                busySecs += self._ricInterface.clock.monotonic() - self._busyStartTime
+            bytesPerSec = self._bytesMoved / busySecs if busySecs > 0 else 0
+        return {
+            "filesQueued": counts[RICTransferJob.STATE_QUEUED],
+            "filesSending": counts[RICTransferJob.STATE_SENDING],
+            "filesDone": counts[RICTransferJob.STATE_DONE],
+            "filesFailed": counts[RICTransferJob.STATE_FAILED],
+            "filesCancelled": counts[RICTransferJob.STATE_CANCELLED],
+            "bytesTotal": bytesTotal,
+            "bytesDone": bytesDone,
+            "bytesPerSec": bytesPerSec,
+            "etaSecs": (bytesTotal - bytesDone) / bytesPerSec if bytesPerSec > 0 else None,
+        }
+
+    def _runJobs(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queue:
+                    # Nothing left so the worker ends (add() starts another)
+                    self._worker = None
+                    self._lock.notify_all()
+                    return
+                _, _, job = heapq.heappop(self._queue)
+                job.state = RICTransferJob.STATE_SENDING
+                self._activeJob = job
+                if self._busyStartTime is None:
+                    self._busyStartTime = self._ricInterface.clock.monotonic()
+            self._runJob(job)
+            with self._lock:
+                self._activeJob = None
+                if not self._queue:
+                    self._busySecs += self._ricInterface.clock.monotonic() - self._busyStartTime
+                    self._busyStartTime = None
+                self._lock.notify_all()
+            self._reportProgress()
+
+    def _runJob(self, job: RICTransferJob) -> None:
+        def onProgress(bytesSent: int, totalBytes: int, ricIF: 'RICInterface') -> bool:
+            with self._lock:
+                if bytesSent > job.bytesSent:
+                    self._bytesMoved += bytesSent - job.bytesSent
+                job.bytesSent = bytesSent
+                cancelRequested = job.cancelRequested
+            self._reportProgress()
+            return not cancelRequested
+        try:
+            isOk = self._ricInterface.sendFile(job.filename, onProgress, job.fileDest, job.reqStr)
+        except Exception as excp:
+            logger.warning(f"RICTransferManager upload of {job.filename} failed {excp}")
+            with self._lock:
+                self._finishJob(job, RICTransferJob.STATE_FAILED)
+            job.future.set_exception(excp)
+            return
+        with self._lock:
+            if isOk:
+                self._bytesMoved += job.fileLen - job.bytesSent
+                job.bytesSent = job.fileLen
+            self._finishJob(job, RICTransferJob.STATE_DONE if isOk else
+                        RICTransferJob.STATE_CANCELLED if job.cancelRequested else RICTransferJob.STATE_FAILED)
+        job.future.set_result(isOk)
+
+    def _finishJob(self, job: RICTransferJob, state: str) -> None:
+        job.state = state
+        self._lock.notify_all()
+
+    def _reportProgress(self) -> None:
+        if self.progressCB is not None:
+            self.progressCB(self.getProgress(), self)
@@ -0,0 +1,143 @@
+'''
+RICTxCoalescer
+Combines small frames sent close together into a single write
+'''
+import logging
+import threading
+from typing import Callable, Dict, Optional
+from .RICScheduler import RICScheduler, RICSchedulerJob
+
+logger = logging.getLogger(__name__)
+
+class RICTxCoalescer:
+    '''
+    RICTxCoalescer
+    Frames added within windowSecs of the first frame in a batch are written
+    together - a batch is written early if it reaches maxBytes or flush() is called.
+    If writing a batch at the end of its window fails (on the scheduler thread) the
+    exception is raised by the next add() or flush()
+    '''
+    def __init__(self, writeFn: Callable[[bytes], None], windowSecs: float, maxBytes: int,
+                scheduler: Optional[RICScheduler] = None) -> None:
+        '''
+        Initialise RICTxCoalescer
+        Args:
+            writeFn: function which writes bytes to the interface
+            windowSecs: maximum time a frame is held back
+            maxBytes: byte budget for a single write
+            scheduler: runs the end-of-window flush (None for the default scheduler)
+        '''
+        self.writeFn = writeFn
+        self.windowSecs = windowSecs
+        self.maxBytes = maxBytes
+        self._scheduler = scheduler if scheduler is not None else RICScheduler.getDefault()
+        self._buf = bytearray()
+        self._bufFrames = 0
+        self._writeExcp: Optional[Exception] = None
+        self._flushJob: Optional[RICSchedulerJob] = None
+        self._lock = threading.Lock()
+        # Stats
+        self.statsFramesIn = 0
+        self.statsWrites = 0
+        self.statsBytesOut = 0
+        self.statsWindowFlushes = 0
+        self.statsBudgetFlushes = 0
+        self.statsExplicitFlushes = 0
+        self.statsWriteFailures = 0
+        self.statsFramesLost = 0
+
+    def add(self, data: bytes) -> None:
+        '''
+        Add an encoded frame to be written
+        Args:
+            data: bytes to write
+        Returns:
+            None
+        Throws:
+            exception raised by writeFn (for this write or a batch written at the end of its window)
+        '''
+        with self._lock:
+            self._raiseWriteExcp()
+            self.statsFramesIn += 1
+            if self._buf and len(self._buf) + len(data) > self.maxBytes:
+                self.statsBudgetFlushes += 1
+                self._flushLocked()
+            if len(data) >= self.maxBytes:
+                # Too big to combine so write it straight away
+                self._write(data, 1)
+                return
+            self._buf += data
+            self._bufFrames += 1
+            if self._flushJob is None:
+                self._flushJob = self._scheduler.callLater(self.windowSecs, self._onWindowEnd)
+
+    def flush(self) -> None:
+        '''
+        Write any frames held back now
+        Throws:
+            exception raised by writeFn (for this write or a batch written at the end of its window)
+        '''
+        with self._lock:
+            self._raiseWriteExcp()
+            if self._buf:
+                self.statsExplicitFlushes += 1
+                self._flushLocked()
+
+    def getStats(self) -> Dict:
+        '''
+        Get statistics on the batching achieved
+        Returns:
+            dict of statistics
+        '''
+        return {
+            "framesIn": self.statsFramesIn,
+            "writes": self.statsWrites,
+            "bytesOut": self.statsBytesOut,
+            "framesPerWrite": self.statsFramesIn / self.statsWrites if self.statsWrites > 0 else 0,
+            "windowFlushes": self.statsWindowFlushes,
+            "budgetFlushes": self.statsBudgetFlushes,
+            "explicitFlushes": self.statsExplicitFlushes,
+            "writeFailures": self.statsWriteFailures,
+            "framesLost": self.statsFramesLost,
+        }
+
+    def _onWindowEnd(self) -> None:
+        with self._lock:
+            self._flushJob = None
+            if self._buf:
+                self.statsWindowFlushes += 1
+                try:
+                    self._flushLocked()
+                except Exception as excp:
+                    # Kept for the sender to see
+                    logger.warning(f"RICTxCoalescer write failed {excp}")
+                    self._writeExcp = excp
+
+    def _raiseWriteExcp(self) -> None:
+        if self._writeExcp is not None:
+            excp = self._writeExcp
+            self._writeExcp = None
+            raise excp
+
+    def _flushLocked(self) -> None:
+        if self._flushJob is not None:
+            self._flushJob.cancel()
+            self._flushJob = None
+        if not self._buf:
+            return
+        data = bytes(self._buf)
+        numFrames = self._bufFrames
+        self._buf.clear()
+        self._bufFrames = 0
+        self._write(data, numFrames)
+
+    def _write(self, data: bytes, numFrames: int) -> None:
+        # Written while holding the lock so frames stay in order
+        self.statsWrites += 1
+        self.statsBytesOut += len(data)
+        try:
+            self.writeFn(data)
+        except Exception:
+            self.statsWriteFailures += 1
+            self.statsFramesLost += numFrames
+            raise
@@ -0,0 +1,162 @@
+'''
+RICUploadManifest
+'''
+from typing import Dict, Iterator, Optional, Tuple
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+logger = logging.getLogger(__name__)
+
+class RICUploadManifest:
+    '''
+    RICUploadManifest
+    Record (kept in a JSON file) of the files uploaded to each robot - entries have
+    the size and SHA-256 hash of the file and how much of it the robot acknowledged
+    so unchanged files can be skipped and interrupted uploads resumed. The file is
+    re-read for each operation and changes are made holding a lock on a lock file
+    (manifest path + ".lock") so several programs can share it
+    '''
+    DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".martypy", "upload_manifest.json")
+    FILE_READ_BLOCK_SIZE = 65536
+
+    def __init__(self, manifestPath: Optional[str] = None) -> None:
+        '''
+        Initialise RICUploadManifest
+        Args:
+            manifestPath: JSON file used to hold the manifest (None for DEFAULT_PATH)
+        '''
+        self.manifestPath = manifestPath if manifestPath is not None else self.DEFAULT_PATH
+        self._lock = threading.Lock()
+
+    def get(self, robotId: str, fileName: str) -> Optional[Dict]:
+        '''
+        Get the record of a file uploaded to a robot
+        Args:
+            robotId: serial number (or other unique ID) of the robot
+            fileName: name of the file on the robot
+        Returns:
+            dict with "size", "sha256" and "okTo" (bytes acknowledged) or None if
+            there is no record
+        '''
+        with self._lock:
+            return self._load().get(robotId, {}).get(fileName)
+
+    def record(self, robotId: str, fileName: str, fileLen: int, fileHash: str, okTo: int) -> None:
+        '''
+        Record a file uploaded (completely if okTo is fileLen) to a robot
+        Args:
+            robotId: serial number (or other unique ID) of the robot
+            fileName: name of the file on the robot
+            fileLen: size of the file
+            fileHash: SHA-256 hash of the file (as hex)
+            okTo: number of bytes acknowledged by the robot
+        Returns:
+            None
+        '''
+        with self._lockFile():
+            robots = self._load()
+            robots.setdefault(robotId, {})[fileName] = {"size": fileLen, "sha256": fileHash, "okTo": okTo}
+            self._save(robots)
+
+    def remove(self, robotId: str, fileName: str) -> None:
+        '''
+        Remove the record of a file (e.g. when it is deleted from the robot)
+        Args:
+            robotId: serial number (or other unique ID) of the robot
+            fileName: name of the file on the robot
+        Returns:
+            None
+        '''
+        with self._lockFile():
+            robots = self._load()
+            if robots.get(robotId, {}).pop(fileName, None) is not None:
+                self._save(robots)
+
+    @classmethod
+    def getFileDigest(cls, filename: str) -> Tuple[int, str]:
+        '''
+        Get the size and SHA-256 hash of a local file
+        Args:
+            filename: name of the file
+        Returns:
+            size of the file, hash as hex
+        Throws:
+            OSError: operating system exceptions
+        '''
+        fileHash = hashlib.sha256()
+        fileLen = 0
+        readBuf = bytearray(cls.FILE_READ_BLOCK_SIZE)
+        with open(filename, "rb") as f:
+            with memoryview(readBuf) as readView:
+                while True:
+                    readLen = f.readinto(readBuf)
+                    if not readLen:
+                        break
+                    fileHash.update(readView[:readLen])
+                    fileLen += readLen
+        return fileLen, fileHash.hexdigest()
+
+    @contextlib.contextmanager
+    def _lockFile(self) -> Iterator[None]:
+        # Held around each read-modify-write so programs sharing the manifest don't lose
+        # each other's changes - if the lock file can't be used the change is made anyway
+        with self._lock:
+            lockFile = None
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.manifestPath)), exist_ok=True)
+                lockFile = open(self.manifestPath + ".lock", "a+b")
+                if fcntl is not None:
+                    fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+                elif msvcrt is not None:
+                    lockFile.seek(0)
+                    msvcrt.locking(lockFile.fileno(), msvcrt.LK_LOCK, 1)
+            except OSError as excp:
+                logger.warning(f"RICUploadManifest cannot lock {self.manifestPath} {excp}")
+            try:
+                yield
+            finally:
+                if lockFile is not None:
+                    # Closing the file releases the lock
+                    lockFile.close()
+
+    def _load(self) -> Dict:
+        # The manifest only saves time so problems reading it aren't errors
+        try:
+            with open(self.manifestPath, "r") as f:
+                manifest = json.load(f)
+            return manifest.get("robots", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as excp:
+            logger.warning(f"RICUploadManifest cannot read {self.manifestPath} {excp}")
+            return {}
+
+    def _save(self, robots: Dict) -> None:
+        # Written to a temporary file (with a unique name) then renamed so the manifest
+        # is never left part-written
+        manifestDir, manifestName = os.path.split(os.path.abspath(self.manifestPath))
+        tmpPath = None
+        try:
+            os.makedirs(manifestDir, exist_ok=True)
+            tmpFd, tmpPath = tempfile.mkstemp(suffix=".tmp", prefix=manifestName + ".", dir=manifestDir)
+            with os.fdopen(tmpFd, "w") as f:
+                json.dump({"version": 1, "robots": robots}, f, indent=1)
+            os.replace(tmpPath, self.manifestPath)
+        except OSError as excp:
+            logger.warning(f"RICUploadManifest cannot write {self.manifestPath} {excp}")
+            if tmpPath is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(tmpPath)
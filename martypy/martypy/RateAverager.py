@@ -1,26 +1,20 @@
+import math
 import time
+from .WindowedStats import WindowedCounter
 
 class RateAverager:
     
-    def __init__(self, windowSizeMinSecs = 1):
-        self.sampleCount = 0
-        self.windowSizeMinSecs = windowSizeMinSecs
-        self.lastCalcSecs = time.time()
-        self.prevVal = 0
-        self.totalCount = 0
+    def __init__(self, windowSizeMinSecs = 1, timeFn = time.monotonic):
+        # Samples are counted per second in a ring buffer so reading the rate
+        # doesn't reset it (several readers see the same value)
+        self.windowSizeMinSecs = max(int(math.ceil(windowSizeMinSecs)), 1)
+        self._counter = WindowedCounter(max(self.windowSizeMinSecs, 60), timeFn)
 
     def addSample(self):
-        self.sampleCount += 1
-        self.totalCount += 1
+        self._counter.add()
 
-    def getAvg(self):
-        if self.lastCalcSecs + self.windowSizeMinSecs < time.time():
-            rsltVal = self.sampleCount / (time.time() - self.lastCalcSecs)
-            self.lastCalcSecs = time.time()
-            self.sampleCount = 0
-            self.prevVal = rsltVal
-            return round(rsltVal,2)
-        return round(self.prevVal,2)
+    def getAvg(self, windowSecs = None):
+        return round(self._counter.getRate(windowSecs if windowSecs is not None else self.windowSizeMinSecs), 2)
 
     def getTotal(self):
-        return self.totalCount
+        return self._counter.total
@@ -1,15 +1,25 @@
+import threading
+
 class ValueAverager:
     
     def __init__(self, windowSize = 10):
-        self.valList = []
+        # Ring buffer of the last windowSize values
         self.windowSize = windowSize
+        self._vals = [0] * windowSize
+        self._pos = 0
+        self._count = 0
+        self._lock = threading.Lock()
 
     def add(self, newVal):
-        self.valList = self.valList[-self.windowSize:]
-        self.valList.append(newVal)
+        with self._lock:
+            self._vals[self._pos] = newVal
+            self._pos = (self._pos + 1) % self.windowSize
+            if self._count < self.windowSize:
+                self._count += 1
 
     def getAvg(self):
-        if len(self.valList) > 0:
-            return round(sum(self.valList)/len(self.valList),2)
+        with self._lock:
+            if self._count > 0:
+                # Unused entries are zero
+                return round(sum(self._vals)/self._count,2)
         return 0
-
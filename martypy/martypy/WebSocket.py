@@ -80,11 +80,15 @@ class WebSocket():
     def _sendUpgradeReq(self) -> None:
         if not self.sock:
             return
-        headerStr = f"GET {self.wsPath} HTTP/1.1\r\n" + \
+        self.sock.send(self.getUpgradeReq(self.wsPath))
+
+    @classmethod
+    def getUpgradeReq(cls, wsPath: str) -> bytes:
+        headerStr = f"GET {wsPath} HTTP/1.1\r\n" + \
             "Connection: upgrade\r\n" + \
             "Upgrade: websocket\r\n" + \
             "\r\n"
-        self.sock.send(headerStr.encode())
+        return headerStr.encode()
 
     def service(self) -> None:
         # Get any data
@@ -0,0 +1,150 @@
+'''
+WindowedStats
+Counters and histograms over recent time windows
+'''
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, List, Sequence, Tuple
+
+class WindowedCounter:
+    '''
+    WindowedCounter
+    Counts events in one-second slots of a ring buffer so the rate can be read over
+    any window up to maxWindowSecs - slots are allocated once and reused as time
+    moves on and reading doesn't change anything, so several readers can share it
+    '''
+    def __init__(self, maxWindowSecs: int = 60, timeFn: Callable[[], float] = time.monotonic) -> None:
+        '''
+        Initialise WindowedCounter
+        Args:
+            maxWindowSecs: longest window the rate can be read over
+            timeFn: clock used to place events in slots
+        '''
+        # The extra slot is for the current (partial) second
+        self._numSlots = maxWindowSecs + 1
+        self._slotSecs = [-1] * self._numSlots
+        self._counts = [0] * self._numSlots
+        self._timeFn = timeFn
+        self._startSec = int(timeFn())
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def add(self, count: int = 1) -> None:
+        sec = int(self._timeFn())
+        slotIdx = sec % self._numSlots
+        with self._lock:
+            if self._slotSecs[slotIdx] != sec:
+                self._slotSecs[slotIdx] = sec
+                self._counts[slotIdx] = 0
+            self._counts[slotIdx] += count
+            self.total += count
+
+    def getCount(self, windowSecs: int) -> int:
+        '''
+        Get the number of events in the last windowSecs complete seconds
+        '''
+        sec = int(self._timeFn())
+        windowSecs = min(windowSecs, self._numSlots - 1)
+        count = 0
+        with self._lock:
+            for slotSec in range(sec - windowSecs, sec):
+                slotIdx = slotSec % self._numSlots
+                if self._slotSecs[slotIdx] == slotSec:
+                    count += self._counts[slotIdx]
+        return count
+
+    def getRate(self, windowSecs: int) -> float:
+        '''
+        Get the average number of events per second over the last windowSecs complete
+        seconds (or since the counter was created if that is shorter)
+        '''
+        windowSecs = min(windowSecs, self._numSlots - 1, int(self._timeFn()) - self._startSec)
+        if windowSecs <= 0:
+            return 0
+        return self.getCount(windowSecs) / windowSecs
+
+class WindowedHistogram:
+    '''
+    WindowedHistogram
+    Histogram of values (such as round-trip times) in one-second slots of a ring
+    buffer so percentiles can be read over any window up to maxWindowSecs - bucket
+    edges are fixed so a percentile is accurate to the width of its bucket
+    '''
+    def __init__(self, bucketEdges: Sequence[float], maxWindowSecs: int = 60,
+                timeFn: Callable[[], float] = time.monotonic) -> None:
+        '''
+        Initialise WindowedHistogram
+        Args:
+            bucketEdges: upper edges of the buckets in increasing order (values above the
+                    last edge are counted in an extra bucket)
+            maxWindowSecs: longest window percentiles can be read over
+            timeFn: clock used to place values in slots
+        '''
+        self._bucketEdges = list(bucketEdges)
+        self._numBuckets = len(self._bucketEdges) + 1
+        self._numSlots = maxWindowSecs + 1
+        self._slotSecs = [-1] * self._numSlots
+        self._counts = [[0] * self._numBuckets for _ in range(self._numSlots)]
+        self._zeroCounts = [0] * self._numBuckets
+        self._timeFn = timeFn
+        self._lock = threading.Lock()
+        self.total = 0
+
+    @staticmethod
+    def logBucketEdges(minVal: float, maxVal: float, ratio: float) -> List[float]:
+        '''
+        Get bucket edges from minVal to maxVal with each edge ratio times the last
+        '''
+        numEdges = int(math.ceil(math.log(maxVal / minVal) / math.log(ratio))) + 1
+        return [minVal * ratio ** i for i in range(numEdges)]
+
+    def add(self, value: float) -> None:
+        sec = int(self._timeFn())
+        slotIdx = sec % self._numSlots
+        bucketIdx = bisect_left(self._bucketEdges, value)
+        with self._lock:
+            slotCounts = self._counts[slotIdx]
+            if self._slotSecs[slotIdx] != sec:
+                self._slotSecs[slotIdx] = sec
+                slotCounts[:] = self._zeroCounts
+            slotCounts[bucketIdx] += 1
+            self.total += 1
+
+    def getPercentiles(self, windowSecs: int, percentiles: Sequence[float] = (50, 95, 99)) -> Tuple[int, List[float]]:
+        '''
+        Get percentiles of the values added in the last windowSecs seconds (including
+        the current second so values show up straight away)
+        Args:
+            windowSecs: window in seconds
+            percentiles: percentiles to get (0..100)
+        Returns:
+            number of values in the window, list of percentiles (the upper edge of the
+            bucket each falls in - 0 if there are no values)
+        '''
+        sec = int(self._timeFn())
+        windowSecs = min(windowSecs, self._numSlots - 1)
+        bucketCounts = [0] * self._numBuckets
+        for slotSec in range(sec - windowSecs + 1, sec + 1):
+            slotIdx = slotSec % self._numSlots
+            # The lock is taken for each slot so add() is never held up for long
+            with self._lock:
+                if self._slotSecs[slotIdx] == slotSec:
+                    slotCounts = self._counts[slotIdx]
+                    for bucketIdx in range(self._numBuckets):
+                        bucketCounts[bucketIdx] += slotCounts[bucketIdx]
+        count = sum(bucketCounts)
+        results = []
+        for percentile in percentiles:
+            if count == 0:
+                results.append(0)
+                continue
+            rank = max(math.ceil(count * percentile / 100), 1)
+            cumCount = 0
+            for bucketIdx, bucketCount in enumerate(bucketCounts):
+                cumCount += bucketCount
+                if cumCount >= rank:
+                    break
+            results.append(self._bucketEdges[min(bucketIdx, len(self._bucketEdges) - 1)])
+        return count, results
@@ -4,6 +4,15 @@ from .ClientMV1 import ClientMV1
 from .ClientMV2 import ClientMV2
 from .RICCommsSerial import RICCommsSerial
 from .RICCommsWiFi import RICCommsWiFi
+from .AsyncMarty import AsyncMarty
+from .RICCommsAsyncSerial import RICCommsAsyncSerial
+from .RICCommsAsyncWiFi import RICCommsAsyncWiFi
+from .RICMetricsExporter import RICMetricsExporter
+from .RICTracer import RICTracer
+from .RICCapture import RICCaptureFile
+from .RICCommsReplay import RICCommsReplay
+from .RICCommsSim import RICCommsSim
+from .RICClock import RICClock, RICVirtualClock
 from .Exceptions import *
 
 __version__ = '3.7.1'
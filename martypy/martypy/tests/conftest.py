@@ -0,0 +1,115 @@
+'''
+pytest configuration for the martypy tests
+
+Benchmarks (tests using the bench fixture) run once as a check unless --bench
+is given, in which case they are timed, e.g.
+    python -m pytest martypy/tests/test_benchmarks.py --bench --bench-json base.json
+and, after a change,
+    python -m pytest martypy/tests/test_benchmarks.py --bench --bench-compare base.json
+fails any benchmark more than --bench-threshold percent slower than before
+'''
+import json
+import platform
+import time
+from typing import Callable, Dict
+import pytest
+
+_benchResultsKey = pytest.StashKey[Dict[str, Dict]]()
+
+def pytest_addoption(parser) -> None:
+    group = parser.getgroup("martypy benchmarks")
+    group.addoption("--bench", action="store_true",
+                help="time benchmarks (otherwise each is run once)")
+    group.addoption("--bench-json", default=None,
+                help="file to save benchmark results to (JSON)")
+    group.addoption("--bench-compare", default=None,
+                help="benchmark results (from --bench-json) to compare with")
+    group.addoption("--bench-threshold", type=float, default=20.0,
+                help="percent slower than --bench-compare results which fails a benchmark (default 20)")
+    group.addoption("--bench-min-secs", type=float, default=0.2,
+                help="minimum time spent timing each benchmark (default 0.2)")
+
+def pytest_configure(config) -> None:
+    config.stash[_benchResultsKey] = {}
+
+class _BenchRunner:
+    '''
+    Times a function - loops are calibrated so each of the repeats takes a fifth
+    of the minimum time and the fastest repeat is used (the others are slowed by
+    whatever else the machine is doing)
+    '''
+    NUM_REPEATS = 5
+
+    def __init__(self, config, nodeId: str) -> None:
+        self.nodeId = nodeId
+        self._config = config
+        self._isTiming = config.getoption("--bench")
+        self._minSecs = config.getoption("--bench-min-secs")
+        self._baseline = {}
+        compareFileName = config.getoption("--bench-compare")
+        if self._isTiming and compareFileName:
+            with open(compareFileName) as f:
+                self._baseline = json.load(f).get("benchmarks", {})
+
+    def __call__(self, fn: Callable, *args, name: str = ""):
+        benchName = self.nodeId + ("/" + name if name else "")
+        result = fn(*args)
+        if not self._isTiming:
+            return result
+        loops = 1
+        while True:
+            loopSecs = self._timeLoops(fn, args, loops)
+            if loopSecs >= self._minSecs / self.NUM_REPEATS:
+                break
+            loops *= 10 if loopSecs < self._minSecs / 100 else 2
+        bestSecs = min([loopSecs] + [self._timeLoops(fn, args, loops) for _ in range(self.NUM_REPEATS - 1)])
+        benchResult = {"nsPerOp": round(bestSecs / loops * 1e9, 1), "opsPerSec": round(loops / bestSecs, 1),
+                       "loops": loops, "repeats": self.NUM_REPEATS}
+        results = self._config.stash[_benchResultsKey]
+        if benchName in results:
+            pytest.fail(f"{benchName} timed more than once - give each benchmark in a test its own name=")
+        baseline = self._baseline.get(benchName)
+        if baseline is not None:
+            benchResult["changePercent"] = round((benchResult["nsPerOp"] / baseline["nsPerOp"] - 1) * 100, 1)
+        results[benchName] = benchResult
+        threshold = self._config.getoption("--bench-threshold")
+        if baseline is not None and benchResult["changePercent"] > threshold:
+            pytest.fail(f"{benchName} {benchResult['nsPerOp']}ns per op is {benchResult['changePercent']}% "
+                        f"slower than {baseline['nsPerOp']}ns (threshold {threshold}%)")
+        return result
+
+    @staticmethod
+    def _timeLoops(fn: Callable, args: tuple, loops: int) -> float:
+        loopRange = range(loops)
+        startTime = time.perf_counter()
+        for _ in loopRange:
+            fn(*args)
+        return time.perf_counter() - startTime
+
+@pytest.fixture
+def bench(request) -> _BenchRunner:
+    '''
+    Benchmark a function - bench(fn, *args) calls fn(*args) and returns its result
+    (timing it if --bench is given). Results are keyed by the test's node ID (so tests
+    with the same name in different modules don't clash) - use name= to time more
+    than one function in a test
+    '''
+    return _BenchRunner(request.config, request.node.nodeid)
+
+def pytest_sessionfinish(session) -> None:
+    results = session.config.stash.get(_benchResultsKey, {})
+    jsonFileName = session.config.getoption("--bench-json")
+    if not results or not jsonFileName:
+        return
+    with open(jsonFileName, "w") as f:
+        json.dump({"python": platform.python_version(), "implementation": platform.python_implementation(),
+                   "machine": platform.machine(), "time": time.time(), "benchmarks": results}, f, indent=2)
+
+def pytest_terminal_summary(terminalreporter, config) -> None:
+    results = config.stash.get(_benchResultsKey, {})
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    for benchName, benchResult in sorted(results.items()):
+        change = f" ({benchResult['changePercent']:+.1f}%)" if "changePercent" in benchResult else ""
+        terminalreporter.write_line(f"{benchName:80s} {benchResult['nsPerOp']:12.1f} ns/op{change}")
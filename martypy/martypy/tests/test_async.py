@@ -0,0 +1,131 @@
+import asyncio
+import os
+import threading
+import time
+import pytest
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy import AsyncMarty, RICCommsAsyncSerial, RICCommsAsyncWiFi
+from martypy.AsyncRICInterface import AsyncRICInterface
+from martypy.LikeHDLC import LikeHDLC
+from martypy.RICCommsSim import RICCommsSim
+from martypy.RICProtocols import RICProtocols
+from martypy.WebSocketFrame import WebSocketFrame
+
+class _SimRICEnd:
+    '''
+    Simulated RIC (RICCommsSim) at the far end of a socket or pseudo-terminal - HDLC
+    frames received are passed to it and its frames are HDLC encoded and written
+    back on the event loop. URLs received are kept in urlsRx
+    '''
+    def __init__(self, writeFn) -> None:
+        self.sim = RICCommsSim(latencySecs=0)
+        self.urlsRx = []
+        self._writeFn = writeFn
+        self._loop = asyncio.get_running_loop()
+        self._hdlc = LikeHDLC(self._onFrame, lambda: None)
+        self.sim.setRxFrameCB(self._onSimFrame)
+        self.sim.open({})
+
+    def onRxData(self, data: bytes) -> None:
+        self._hdlc.decodeBuffer(data)
+
+    def close(self) -> None:
+        self.sim.close()
+
+    def _onFrame(self, frame: bytes) -> None:
+        if frame[2] == RICProtocols.RICREST_ELEM_CODE_URL:
+            self.urlsRx.append(bytes(frame[3:]).rstrip(b"\0").decode())
+        self.sim.send(frame)
+
+    def _onSimFrame(self, frame: bytes) -> None:
+        self._loop.call_soon_threadsafe(self._writeFn, LikeHDLC.encode(frame))
+
+async def _startWSServer():
+    simRICs = []
+    async def onConnect(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                     b"Connection: Upgrade\r\nSec-WebSocket-Accept: test\r\n\r\n")
+        simRIC = _SimRICEnd(lambda data: writer.write(
+                    WebSocketFrame.encode(data, False, WebSocketFrame.OPCODE_BINARY, True)))
+        simRICs.append(simRIC)
+        wsFrameCodec = WebSocketFrame()
+        while True:
+            rxData = await reader.read(2000)
+            if not rxData:
+                break
+            wsFrameCodec.addDataToDecode(rxData)
+            binaryFrame = wsFrameCodec.getBinaryMsg()
+            while binaryFrame is not None:
+                simRIC.onRxData(binaryFrame)
+                binaryFrame = wsFrameCodec.getBinaryMsg()
+        simRIC.close()
+        writer.close()
+    server = await asyncio.start_server(onConnect, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], simRICs
+
+def test_async_wifi_commands() -> None:
+    async def run():
+        server, port, simRICs = await _startWSServer()
+        ricIF = AsyncRICInterface(RICCommsAsyncWiFi())
+        assert await ricIF.openAsync({"ipAddrOrHostname": "127.0.0.1", "ipPort": port})
+        assert (await ricIF.cmdRICRESTURLAsync("v"))["SystemVersion"] == "1.2.0"
+        # (the simulated RIC's thread is running once it has answered)
+        numThreads = threading.active_count()
+        # Many commands in flight at once on one loop with no extra threads
+        results = await asyncio.gather(*[ricIF.cmdRICRESTRsltAsync(f"traj/joint?jointID={i}") for i in range(20)])
+        assert all(results)
+        assert threading.active_count() == numThreads
+        futures = [ricIF.submit("led/LEDfoot/off") for _ in range(3)]
+        assert await ricIF.gatherResultsAsync(futures) == [{"rslt": "ok"}] * 3
+        # Time-out doesn't block the loop
+        simRICs[0].sim.lossRate = 1
+        startTime = time.time()
+        assert await ricIF.cmdRICRESTURLAsync("led/LEDeye/off", 0.1) == {"rslt": "failTimeout"}
+        assert time.time() - startTime < 1
+        simRICs[0].sim.lossRate = 0
+        # Blocking calls still work from other threads
+        resp = await asyncio.get_running_loop().run_in_executor(None, ricIF.cmdRICRESTURLSync, "v")
+        assert resp["rslt"] == "ok"
+        assert len(simRICs[0].urlsRx) == 26
+        await ricIF.closeAsync()
+        assert not ricIF.isOpen()
+        server.close()
+    asyncio.run(run())
+
+def test_async_marty() -> None:
+    async def run():
+        server, port, simRICs = await _startWSServer()
+        marty = await AsyncMarty.create("wifi", "127.0.0.1", port=port, blocking=False)
+        assert await marty.dance()
+        assert await marty.arms(10, 20, 500)
+        assert (await marty.send_ric_rest_cmd_sync("v"))["rslt"] == "ok"
+        assert marty.JOINT_IDS["eyes"] == 8
+        assert "Boogie" in marty.dance.__doc__
+        urlsRx = simRICs[0].urlsRx
+        assert "traj/dance?side=1&moveTime=3000" in urlsRx
+        assert "traj/joint?jointID=7&angle=20&moveTime=500" in urlsRx
+        await marty.close()
+        server.close()
+    asyncio.run(run())
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="needs a pseudo-terminal")
+def test_async_serial_commands() -> None:
+    async def run():
+        masterFd, slaveFd = os.openpty()
+        loop = asyncio.get_running_loop()
+        simRIC = _SimRICEnd(lambda data: os.write(masterFd, data))
+        loop.add_reader(masterFd, lambda: simRIC.onRxData(os.read(masterFd, 4096)))
+        ricIF = AsyncRICInterface(RICCommsAsyncSerial())
+        assert await ricIF.openAsync({"serialPort": os.ttyname(slaveFd), "ifType": "plain"})
+        results = await asyncio.gather(*[ricIF.cmdRICRESTURLAsync("v") for _ in range(5)])
+        assert all(result["rslt"] == "ok" for result in results)
+        await ricIF.closeAsync()
+        loop.remove_reader(masterFd)
+        simRIC.close()
+        os.close(masterFd)
+        os.close(slaveFd)
+    asyncio.run(run())
@@ -0,0 +1,131 @@
+'''
+Microbenchmarks of the codec and decode hot paths - see conftest.py for the
+options which time them and compare results
+'''
+import json
+import random
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.LikeHDLC import LikeHDLC
+from martypy.ProtocolOverAscii import ProtocolOverAscii
+from martypy.WebSocketFrame import WebSocketFrame
+from martypy.RICProtocols import RICProtocols
+from martypy.RICROSSerial import RICROSSerial
+from martypy.RICHWElems import RICHWElems
+
+_rng = random.Random(1)
+SMALL_FRAME = bytes([5, 0x42, RICProtocols.RICREST_ELEM_CODE_JSON]) + \
+            json.dumps({"rslt": "ok", "SystemVersion": "1.2.0", "SerialNo": "5151515151515151"}).encode() + b"\0"
+FILE_BLOCK = bytes(_rng.randrange(256) for _ in range(5000))
+
+# Publish message payloads as sent by RIC
+SERVOS_PAYLOAD = RICROSSerial.encodeSmartServos([(IDNo, IDNo * 10 - 40, 15, 0x81) for IDNo in range(9)])
+ACCEL_PAYLOAD = RICROSSerial.encodeAccel(0.01, -0.02, 1.0, 19)
+POWER_PAYLOAD = RICROSSerial.encodePowerStatus(80, 25, 1600, 2000, -250, 600, 0x0002, 20)
+ROBOT_STATUS_PAYLOAD = RICROSSerial.encodeRobotStatus(1, 2, 120000, 90000, (0xff000001, 0, 0x00ff0002), 2, 10)
+ADDONS_PAYLOAD = b"".join(bytes([IDNo, 0x80]) + bytes(10) for IDNo in range(30, 33))
+MULTI_STATUS_ROSSERIAL = b"".join((RICROSSerial.encode(RICROSSerial.ROSTOPIC_V2_SMART_SERVOS, SERVOS_PAYLOAD),
+                                   RICROSSerial.encode(RICROSSerial.ROSTOPIC_V2_ACCEL, ACCEL_PAYLOAD),
+                                   RICROSSerial.encode(RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS, ROBOT_STATUS_PAYLOAD)))
+PUBLISH_FRAME = bytes([0, (RICProtocols.MSG_TYPE_PUBLISH << 6) + RICProtocols.PROTOCOL_ROSSERIAL]) + \
+            MULTI_STATUS_ROSSERIAL
+
+def test_hdlc_encode(bench) -> None:
+    assert bench(LikeHDLC.encode, SMALL_FRAME, name="small")[0] == 0xe7
+    assert bench(LikeHDLC.encode, FILE_BLOCK, name="fileBlock")[-1] == 0xe7
+    outBuf = bytearray()
+    assert bench(LikeHDLC.encodeInto, FILE_BLOCK, outBuf, name="fileBlockInto") == len(outBuf)
+
+def test_hdlc_decode(bench) -> None:
+    # A block of 20 publish frames as received from the link
+    rxBlock = b"".join(LikeHDLC.encode(PUBLISH_FRAME) for _ in range(20))
+    frames = []
+    hdlc = LikeHDLC(frames.append, None)
+    def decode() -> None:
+        frames.clear()
+        hdlc.decodeBuffer(rxBlock)
+    bench(decode)
+    assert frames == [PUBLISH_FRAME] * 20
+
+def test_hdlc_crc(bench) -> None:
+    assert bench(LikeHDLC.calcCRCValue, FILE_BLOCK) == int.from_bytes(LikeHDLC.calcCRC(FILE_BLOCK), "big")
+
+def test_overascii_encode(bench) -> None:
+    hdlcEncoded = LikeHDLC.encode(FILE_BLOCK)
+    encoded = bench(ProtocolOverAscii.encode, hdlcEncoded)
+    assert ProtocolOverAscii().decodeBuffer(encoded) == (b"", hdlcEncoded)
+
+def test_overascii_decode(bench) -> None:
+    # HDLC frames with logging text mixed in as received on the USB port
+    rxBlock = b"".join(ProtocolOverAscii.encode(LikeHDLC.encode(PUBLISH_FRAME)) + b"I (123) RICUtils: log line\n"
+                       for _ in range(10))
+    protocolOverAscii = ProtocolOverAscii()
+    textBytes, hdlcBytes = bench(protocolOverAscii.decodeBuffer, rxBlock)
+    assert textBytes.count(b"\n") == 10
+    assert hdlcBytes == LikeHDLC.encode(PUBLISH_FRAME) * 10
+
+def test_websocket_encode(bench) -> None:
+    hdlcEncoded = LikeHDLC.encode(FILE_BLOCK)
+    encoded = bench(WebSocketFrame.encode, hdlcEncoded, True, WebSocketFrame.OPCODE_BINARY, True)
+    assert len(encoded) == len(hdlcEncoded) + 8
+
+def test_websocket_decode(bench) -> None:
+    # Frames from RIC aren't masked
+    rxBlock = b"".join(WebSocketFrame.encode(LikeHDLC.encode(PUBLISH_FRAME), False, WebSocketFrame.OPCODE_BINARY, True)
+                       for _ in range(10))
+    wsFrame = WebSocketFrame()
+    def decode() -> list:
+        wsFrame.addDataToDecode(rxBlock)
+        return [wsFrame.getBinaryMsg() for _ in range(10)]
+    assert bench(decode) == [LikeHDLC.encode(PUBLISH_FRAME)] * 10
+
+def test_websocket_apply_mask(bench) -> None:
+    mask = b"\x12\x34\x56\x78"
+    masked = bench(WebSocketFrame.applyMask, FILE_BLOCK, mask)
+    assert WebSocketFrame.applyMask(masked, mask) == FILE_BLOCK
+
+def test_decode_ric_frame(bench) -> None:
+    ricProtocols = RICProtocols()
+    def decodeResponse() -> dict:
+        return ricProtocols.decodeRICFrame(SMALL_FRAME).getJSONDict()
+    assert bench(decodeResponse, name="response")["rslt"] == "ok"
+    def decodePublish() -> bytes:
+        return ricProtocols.decodeRICFrame(PUBLISH_FRAME).payload
+    assert bench(decodePublish, name="publish") == MULTI_STATUS_ROSSERIAL
+
+def test_rosserial_decode(bench) -> None:
+    topics = []
+    def decode() -> None:
+        topics.clear()
+        RICROSSerial.decode(MULTI_STATUS_ROSSERIAL, 0, lambda topicID, payload: topics.append(topicID))
+    bench(decode)
+    assert topics == [RICROSSerial.ROSTOPIC_V2_SMART_SERVOS, RICROSSerial.ROSTOPIC_V2_ACCEL,
+                      RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS]
+
+def test_rosserial_extract(bench) -> None:
+    assert len(bench(RICROSSerial.extractSmartServos, SERVOS_PAYLOAD, name="smartServos")) == 9
+    assert bench(RICROSSerial.extractAccel, ACCEL_PAYLOAD, name="accel")[2] == 1.0
+    assert bench(RICROSSerial.extractPowerStatus, POWER_PAYLOAD, name="powerStatus")["battRemainCapacityPercent"] == 80
+    assert bench(RICROSSerial.extractRobotStatus, ROBOT_STATUS_PAYLOAD, name="robotStatus")["isMoving"]
+    assert len(bench(RICROSSerial.extractAddOnStatus, ADDONS_PAYLOAD, name="addOnStatus")) == 3
+
+def test_hwelems_getters(bench) -> None:
+    hwElems = RICHWElems()
+    for topicID, payload in ((RICROSSerial.ROSTOPIC_V2_SMART_SERVOS, SERVOS_PAYLOAD),
+                             (RICROSSerial.ROSTOPIC_V2_ACCEL, ACCEL_PAYLOAD),
+                             (RICROSSerial.ROSTOPIC_V2_POWER_STATUS, POWER_PAYLOAD),
+                             (RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS, ROBOT_STATUS_PAYLOAD),
+                             (RICROSSerial.ROSTOPIC_V2_ADDONS, ADDONS_PAYLOAD)):
+        hwElems.updateWithROSSerialMsg(topicID, payload)
+    hwElemsByIDNo = {IDNo: {"name": f"servo{IDNo}", "IDNo": IDNo} for IDNo in range(9)}
+    hwElemsByIDNo.update({IDNo: {"name": f"addOn{IDNo}", "IDNo": IDNo, "whoAmI": "LEDeye", "type": "RSAddOn"}
+                          for IDNo in range(30, 33)})
+    assert len(bench(hwElems.getServos, hwElemsByIDNo, name="servos")) == 9
+    assert bench(hwElems.getServoPos, 2, hwElemsByIDNo, name="servoPos") == -20
+    assert bench(hwElems.getIMUAll, name="imu")[2] == 1.0
+    assert bench(hwElems.getPowerStatus, name="powerStatus")["battCurrentMA"] == -250
+    assert bench(hwElems.getRobotStatus, name="robotStatus")["workQCount"] == 2
+    assert bench(hwElems.getIsMoving, name="isMoving")
+    assert len(bench(hwElems.getAddOns, hwElemsByIDNo, name="addOns")) >= 3
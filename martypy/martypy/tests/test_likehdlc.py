@@ -0,0 +1,132 @@
+import random
+import struct
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.LikeHDLC import LikeHDLC, Frame
+
+def _makeStream(numFrames: int, asciiEscapes: bool = False, seed: int = 1) -> bytes:
+    '''
+    Build a stream of encoded frames with some corrupted frames, line noise
+    and escape/delimiter-heavy payloads mixed in
+    '''
+    rng = random.Random(seed)
+    delim = Frame.DELIMITER_CODE_ASCII if asciiEscapes else Frame.DELIMITER_CODE_NON_ASCII
+    esc = Frame.ESCAPE_CODE_ASCII if asciiEscapes else Frame.ESCAPE_CODE_NON_ASCII
+    stream = bytearray()
+    for i in range(numFrames):
+        payload = bytes(rng.choice([delim, esc, rng.randrange(256)]) for _ in range(rng.randrange(0, 300)))
+        frame = bytearray(LikeHDLC.encode(payload, asciiEscapes))
+        if i % 7 == 3 and len(frame) > 4:
+            frame[len(frame) // 2] ^= 0x01
+        if i % 11 == 5:
+            stream += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 20)))
+        if i % 13 == 2:
+            stream += bytes([delim, esc, delim])
+        stream += frame
+    return bytes(stream)
+
+def _decodePerByte(stream: bytes, asciiEscapes: bool = False, maxFrameLen: int = 0):
+    frames = []
+    hdlc = LikeHDLC(lambda fr: frames.append(bytes(fr)), lambda: None, asciiEscapes, maxFrameLen=maxFrameLen)
+    for b in stream:
+        hdlc.decodeData(b)
+    return frames, hdlc.getStats()
+
+def _decodeChunked(stream: bytes, chunkSizes, asciiEscapes: bool = False, maxFrameLen: int = 0):
+    frames = []
+    hdlc = LikeHDLC(lambda fr: frames.append(bytes(fr)), lambda: None, asciiEscapes, maxFrameLen=maxFrameLen)
+    pos = 0
+    rng = random.Random(2)
+    while pos < len(stream):
+        chunkLen = rng.choice(chunkSizes)
+        hdlc.decodeBuffer(memoryview(stream)[pos:pos+chunkLen])
+        pos += chunkLen
+    return frames, hdlc.getStats()
+
+def test_decode_buffer_matches_per_byte() -> None:
+    for asciiEscapes in (False, True):
+        stream = _makeStream(200, asciiEscapes)
+        expFrames, expStats = _decodePerByte(stream, asciiEscapes)
+        for chunkSizes in ([1], [1, 2, 3], [64, 500], [len(stream)]):
+            frames, stats = _decodeChunked(stream, chunkSizes, asciiEscapes)
+            assert frames == expFrames
+            assert stats.toDict() == expStats.toDict()
+        assert expStats.crcErrors > 0
+        assert expStats.resyncs > 0
+
+def test_oversize_frames_dropped() -> None:
+    stream = _makeStream(200)
+    expFrames, expStats = _decodePerByte(stream, maxFrameLen=200)
+    for chunkSizes in ([1], [1, 2, 3], [64, 500], [len(stream)]):
+        frames, stats = _decodeChunked(stream, chunkSizes, maxFrameLen=200)
+        assert frames == expFrames
+        assert stats.toDict() == expStats.toDict()
+    assert expStats.oversizeDrops > 0
+    assert all(len(fr) <= 200 for fr in expFrames)
+    # Frames after a lost delimiter are recovered once the next delimiter arrives
+    frames = []
+    hdlc = LikeHDLC(frames.append, lambda: None, maxFrameLen=100)
+    hdlc.decodeBuffer(bytes([Frame.DELIMITER_CODE_NON_ASCII]) + bytes(1000))
+    assert len(hdlc._bufRawFrame) == 0
+    hdlc.decodeBuffer(LikeHDLC.encode(b"ok"))
+    assert frames == [b"ok"]
+    assert hdlc.getStats().oversizeDrops == 1
+
+def test_stats_per_instance() -> None:
+    hdlc1 = LikeHDLC(lambda fr: None, lambda: None)
+    hdlc2 = LikeHDLC(lambda fr: None, lambda: None)
+    hdlc1.decodeBuffer(LikeHDLC.encode(b"\xd7\xe7"))
+    assert hdlc1.getStats().framesRxOk == 1
+    assert hdlc1.getStats().getEscapeRatio() > 0
+    assert hdlc2.getStats().toDict() == LikeHDLC(lambda fr: None, lambda: None).getStats().toDict()
+
+def test_decode_buffer_payloads_are_strings() -> None:
+    frames = []
+    hdlc = LikeHDLC(frames.append, lambda: None, payloadsAreStrings=True)
+    hdlc.decodeBuffer(LikeHDLC.encode(b'{"rslt":"ok"}\0'))
+    assert frames == ['{"rslt":"ok"}']
+
+def _refCalcCRC(data: bytes) -> bytes:
+    crc = 0xffff
+    for c in data:
+        crc = ((crc<<8)&0xff00) ^ Frame.CRC16_LUT[((crc>>8)&0xff)^c]
+    return bytearray(struct.pack(">H", crc))
+
+def _refEncode(data: bytes, asciiEscapes: bool = False) -> bytes:
+    # Byte-at-a-time encoder used before the bulk implementation
+    delimiterCode = Frame.DELIMITER_CODE_ASCII if asciiEscapes else Frame.DELIMITER_CODE_NON_ASCII
+    escapeCode = Frame.ESCAPE_CODE_ASCII if asciiEscapes else Frame.ESCAPE_CODE_NON_ASCII
+    frame = bytearray()
+    frame.append(delimiterCode)
+    for byte in data + _refCalcCRC(data):
+        if byte == delimiterCode or byte == escapeCode:
+            frame.append(escapeCode)
+            frame.append(byte ^ 0x20)
+        else:
+            frame.append(byte)
+    frame.append(delimiterCode)
+    return bytes(frame)
+
+def test_encode_matches_reference() -> None:
+    rng = random.Random(3)
+    outBuf = bytearray()
+    for asciiEscapes in (False, True):
+        for dataLen in list(range(0, 40)) + [1000, 5004]:
+            data = bytes(rng.randrange(256) for _ in range(dataLen))
+            expected = _refEncode(data, asciiEscapes)
+            assert LikeHDLC.encode(data, asciiEscapes) == expected
+            assert LikeHDLC.encode(bytearray(data), asciiEscapes) == expected
+            assert LikeHDLC.encodeInto(memoryview(data), outBuf, asciiEscapes) == len(expected)
+            assert outBuf == expected
+            assert LikeHDLC.calcCRC(data) == _refCalcCRC(data)
+
+def test_encode_benchmark(bench) -> None:
+    # Timed against the reference encoder with --bench
+    block = bytes(random.Random(4).randrange(256) for _ in range(5004))
+    outBuf = bytearray()
+    expected = bench(_refEncode, block, name="reference")
+    assert bench(LikeHDLC.encode, block, name="encode") == expected
+    assert bench(LikeHDLC.encodeInto, block, outBuf, name="encodeInto") == len(expected)
+    assert outBuf == expected
@@ -0,0 +1,110 @@
+import threading
+import urllib.error
+import urllib.request
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.RICMetricsExporter import RICMetricsExporter
+from martypy.RICInterface import RICInterface
+from martypy.RICCommsTest import RICCommsTest
+
+class _FakeMarty:
+    # Has the Marty methods the exporter reads with statistics from a real RICInterface
+    def __init__(self, serialNo: str) -> None:
+        self.ricIF = RICInterface(RICCommsTest())
+        self.serialNo = serialNo
+
+    def is_conn_ready(self) -> bool:
+        return True
+
+    def get_system_info(self) -> dict:
+        return {"SerialNo": self.serialNo}
+
+    def get_interface_stats(self) -> dict:
+        stats = self.ricIF.getStats()
+        stats["hdlcCrcErrors"] = 3
+        stats["hdlcEscapeRatio"] = 0.01
+        stats["windowStats"]["10s"]["publishRatesPS"] = {"imu": 10.0}
+        stats["imuPS"] = 10.0
+        return stats
+
+    def get_power_status(self) -> dict:
+        return {"battInfoValid": True, "battRemainCapacityPercent": 81, "battCurrentMA": -250, "battTempDegC": 25}
+
+    def get_robot_status(self) -> dict:
+        return {"workQCount": 0, "isMoving": False, "heapFree": 70000, "heapMin": 50000, "loopMsAvg": 2}
+
+def _parseSamples(metricsText: str) -> dict:
+    samples = {}
+    for line in metricsText.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+def test_metrics_text() -> None:
+    martys = [_FakeMarty("sn001"), _FakeMarty("sn002")]
+    martys[0].ricIF.newRoundTrip(0.05, "traj")
+    martys[0].ricIF.statsMatched = 7
+    exporter = RICMetricsExporter()
+    exporter.addRobot(martys[0])
+    exporter.addRobot(martys[1], {"site": "lab \"2\""})
+    metricsText = exporter.getMetricsText()
+    assert metricsText.endswith("# EOF\n")
+    samples = _parseSamples(metricsText)
+    assert samples['martypy_up{robot="sn001"}'] == 1
+    assert samples['martypy_messages_matched_total{robot="sn001"}'] == 7
+    assert samples['martypy_messages_matched_total{robot="sn002",site="lab \\"2\\""}'] == 0
+    assert 0.05 <= samples['martypy_round_trip_seconds{robot="sn001",window="60s",family="traj",quantile="0.99"}'] < 0.056
+    assert samples['martypy_publish_per_second{robot="sn001",window="10s",topic="imu"}'] == 10
+    assert samples['martypy_link_hdlc_crc_errors_total{robot="sn001"}'] == 3
+    assert samples['martypy_link_hdlc_escape_ratio{robot="sn001"}'] == 0.01
+    # Upload stats are for the last upload so can go down
+    assert samples['martypy_upload_retransmits{robot="sn001"}'] == 0
+    assert samples['martypy_battery_remaining_percent{robot="sn001"}'] == 81
+    assert samples['martypy_heap_free_bytes{robot="sn002",site="lab \\"2\\""}'] == 70000
+    # Each family is declared once with its samples together
+    typeLines = [line for line in metricsText.splitlines() if line.startswith("# TYPE")]
+    assert len(typeLines) == len(set(typeLines))
+    sampleNames = [line.split("{")[0] for line in metricsText.splitlines() if not line.startswith("#")]
+    runNames = [name for idx, name in enumerate(sampleNames) if idx == 0 or sampleNames[idx - 1] != name]
+    assert len(runNames) == len(set(runNames))
+    exporter.removeRobot(martys[1])
+    assert "sn002" not in exporter.getMetricsText()
+
+def test_metrics_http() -> None:
+    exporter = RICMetricsExporter(port=0)
+    exporter.addRobot(_FakeMarty("sn003"))
+    exporter.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics", timeout=5) as resp:
+            assert resp.headers["Content-Type"] == RICMetricsExporter.CONTENT_TYPE
+            assert 'martypy_up{robot="sn003"} 1' in resp.read().decode()
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/other", timeout=5)
+            assert False
+        except urllib.error.HTTPError as excp:
+            assert excp.code == 404
+    finally:
+        exporter.stop()
+
+def test_scrape_does_not_block_rx() -> None:
+    # Round-trips keep being recorded (as the rx thread does) while metrics are scraped
+    marty = _FakeMarty("sn004")
+    exporter = RICMetricsExporter()
+    exporter.addRobot(marty)
+    stopScraping = threading.Event()
+    def scrape() -> None:
+        while not stopScraping.is_set():
+            exporter.getMetricsText()
+    scrapeThread = threading.Thread(target=scrape)
+    scrapeThread.start()
+    try:
+        for _ in range(2000):
+            marty.ricIF.newRoundTrip(0.01, "led")
+    finally:
+        stopScraping.set()
+        scrapeThread.join()
+    samples = _parseSamples(exporter.getMetricsText())
+    assert samples['martypy_round_trips{robot="sn004",window="60s",family="led"}'] == 2000
@@ -0,0 +1,157 @@
+import json
+import random
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.LikeHDLC import LikeHDLC
+from martypy.ProtocolOverAscii import ProtocolOverAscii
+from martypy.RICCommsSerial import RICCommsSerial
+
+def _makeUSBCapture(numFrames: int, seed: int = 1) -> bytes:
+    '''
+    Build a capture like that received on the USB port - overascii-encoded
+    HDLC frames (JSON responses and binary publish messages) interleaved
+    with plain-text logging
+    '''
+    rng = random.Random(seed)
+    capture = bytearray()
+    for i in range(numFrames):
+        if i % 3 == 0:
+            payload = bytes([i % 255 + 1, 0x42, 0x01]) + \
+                json.dumps({"rslt": "ok", "i": i, "files": ["a.mp3"] * (i % 5)}).encode() + b"\0"
+        else:
+            payload = bytes(rng.randrange(256) for _ in range(rng.randrange(20, 120)))
+        capture += ProtocolOverAscii.encode(LikeHDLC.encode(payload))
+        if i % 4 == 0:
+            capture += f"I (12{i}) RICUtils: log line number {i} with some detail\n".encode()
+    return bytes(capture)
+
+def _refRxBytes(comms: RICCommsSerial, byt: bytes, logLine: list) -> None:
+    # Byte-at-a-time receive loop used before the block decoder
+    for b in byt:
+        if b >= 128:
+            decodedVal = comms.protocolOverAscii.decodeByte(b)
+            if decodedVal >= 0:
+                comms._hdlc.decodeData(decodedVal)
+        else:
+            if b == 0x0a:
+                if comms.logLineCB:
+                    comms.logLineCB(logLine[0])
+                logLine[0] = ""
+            else:
+                logLine[0] += chr(b)
+
+def _makeComms(frames: list, lines: list) -> RICCommsSerial:
+    comms = RICCommsSerial()
+    comms.overAscii = True
+    comms.protocolOverAscii = ProtocolOverAscii()
+    comms.setRxFrameCB(lambda fr: frames.append(bytes(fr)))
+    comms.setRxLogLineCB(lines.append)
+    return comms
+
+def test_decode_buffer_matches_decode_byte() -> None:
+    rng = random.Random(5)
+    escCodes = [ProtocolOverAscii.OVERASCII_ESCAPE_1, ProtocolOverAscii.OVERASCII_ESCAPE_2,
+                ProtocolOverAscii.OVERASCII_ESCAPE_3]
+    datasets = [
+        bytes(rng.randrange(128, 256) for _ in range(5000)),
+        bytes(rng.choice(escCodes + [rng.randrange(128, 256)]) for _ in range(5000)),
+    ]
+    for data in datasets:
+        expected = bytearray()
+        ref = ProtocolOverAscii()
+        for b in data:
+            decodedVal = ref.decodeByte(b)
+            if decodedVal >= 0:
+                expected.append(decodedVal)
+        for chunkLen in (1, 2, 3, 4, 17, 5000):
+            poa = ProtocolOverAscii()
+            decoded = bytearray()
+            for pos in range(0, len(data), chunkLen):
+                textBytes, hdlcBytes = poa.decodeBuffer(data[pos:pos+chunkLen])
+                assert textBytes == b""
+                decoded += hdlcBytes
+            assert decoded == expected
+
+def test_usb_rx_matches_per_byte() -> None:
+    capture = _makeUSBCapture(300)
+    expFrames, expLines = [], []
+    comms = _makeComms(expFrames, expLines)
+    _refRxBytes(comms, capture, [""])
+    for chunkLen in (1, 7, 64, 4096):
+        frames, lines = [], []
+        comms = _makeComms(frames, lines)
+        for pos in range(0, len(capture), chunkLen):
+            comms._onRxBytes(capture[pos:pos+chunkLen])
+        assert frames == expFrames
+        assert lines == expLines
+    assert len(expFrames) == 300
+
+def _countLineEvents(fn) -> int:
+    count = [0]
+    def tracer(frame, event, arg):
+        if event == "line":
+            count[0] += 1
+        return tracer
+    sys.settrace(tracer)
+    try:
+        fn()
+    finally:
+        sys.settrace(None)
+    return count[0]
+
+def test_usb_rx_benchmark(bench) -> None:
+    capture = _makeUSBCapture(300)
+    chunks = [capture[pos:pos+4096] for pos in range(0, len(capture), 4096)]
+    def runRef():
+        comms = _makeComms([], [])
+        logLine = [""]
+        for chunk in chunks:
+            _refRxBytes(comms, chunk, logLine)
+    def runNew():
+        comms = _makeComms([], [])
+        for chunk in chunks:
+            comms._onRxBytes(chunk)
+    # Python lines run per byte are counted (timed with --bench)
+    refOps = _countLineEvents(runRef)
+    newOps = _countLineEvents(runNew)
+    assert newOps * 4 < refOps
+    bench(runRef, name="reference")
+    bench(runNew, name="block")
+
+def _refEncode(inData: bytes) -> bytes:
+    # Byte-at-a-time encoder used before the table-driven implementation
+    encodedFrame = bytearray()
+    for toEnc in inData:
+        if toEnc <= 0x0f:
+            encodedFrame.append(ProtocolOverAscii.OVERASCII_ESCAPE_1)
+            encodedFrame.append((toEnc ^ ProtocolOverAscii.OVERASCII_MOD_CODE) | 0x80)
+        elif (toEnc >= 0x10) and (toEnc <= 0x7f):
+            encodedFrame.append(toEnc | 0x80)
+        elif (toEnc >= 0x80) and (toEnc <= 0x8f):
+            encodedFrame.append(ProtocolOverAscii.OVERASCII_ESCAPE_2)
+            encodedFrame.append(toEnc ^ ProtocolOverAscii.OVERASCII_MOD_CODE)
+        else:
+            encodedFrame.append(ProtocolOverAscii.OVERASCII_ESCAPE_3)
+            encodedFrame.append(toEnc)
+    return encodedFrame
+
+def test_encode_matches_reference() -> None:
+    rng = random.Random(6)
+    outBuf = bytearray(b"stale contents")
+    for dataLen in (0, 1, 2, 255, 256, 5011, 20000):
+        data = bytes(range(256)) if dataLen == 256 else bytes(rng.randrange(256) for _ in range(dataLen))
+        expected = _refEncode(data)
+        assert ProtocolOverAscii.encode(data) == expected
+        assert ProtocolOverAscii.encodeInto(memoryview(data), outBuf) == len(expected)
+        assert outBuf == expected
+        assert b"".join(ProtocolOverAscii.encodeStream(data, 1000)) == expected
+        decoded = ProtocolOverAscii().decodeBuffer(expected)
+        assert decoded == (b"", data)
+
+def test_encode_benchmark(bench) -> None:
+    # Timed against the reference encoder with --bench
+    block = LikeHDLC.encode(bytes(random.Random(7).randrange(256) for _ in range(5004)))
+    expected = bench(_refEncode, block, name="reference")
+    assert bench(ProtocolOverAscii.encode, block, name="table") == expected
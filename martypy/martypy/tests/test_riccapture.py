@@ -0,0 +1,100 @@
+import time
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.RICInterface import RICInterface
+from martypy.RICCapture import RICCaptureFile, RICCaptureWriter
+from martypy.RICCommsReplay import RICCommsReplay
+from martypy.RICCommsWiFi import RICCommsWiFi
+from martypy.RICProtocols import RICProtocols
+
+def _reportFrame(idx: int) -> bytes:
+    return bytes([0, (RICProtocols.MSG_TYPE_REPORT << 6) + 2, 0x00]) + f'{{"msgKey":"k{idx}"}}\0'.encode()
+
+def _writeCapture(fileName: str, numReports: int, gapSecs: float = 0) -> None:
+    # Capture from a WiFi link (not connected so nothing is written to a socket)
+    comms = RICCommsWiFi(None)
+    comms.startCapture(fileName)
+    comms.send(b"\x01\x00\x00v\0")
+    comms._onHDLCFrame(bytes([1, 0x42, 0x00]) + b'{"rslt":"ok"}\0')
+    for idx in range(numReports):
+        comms._onHDLCFrame(_reportFrame(idx))
+        if gapSecs:
+            time.sleep(gapSecs)
+    comms.stopCapture()
+    # Frames after the capture stops aren't recorded
+    comms._onHDLCFrame(_reportFrame(numReports))
+
+def test_capture_read(tmp_path) -> None:
+    fileName = str(tmp_path / "link.riccap")
+    _writeCapture(fileName, 3)
+    recs = list(RICCaptureFile.read(fileName))
+    assert [rec.direction for rec in recs] == [RICCaptureFile.DIR_TX] + [RICCaptureFile.DIR_RX] * 4
+    assert recs[0].frame == b"\x01\x00\x00v\0"
+    assert recs[-1].frame == _reportFrame(2)
+    assert all(recs[idx].timeNs <= recs[idx + 1].timeNs for idx in range(len(recs) - 1))
+    # A partly written record at the end is ignored
+    with open(fileName, "ab") as f:
+        f.write(RICCaptureFile.REC_HEADER.pack(RICCaptureFile.DIR_RX, 0, 100) + b"abc")
+    assert len(list(RICCaptureFile.read(fileName))) == 5
+
+def test_pcap_export(tmp_path) -> None:
+    fileName = str(tmp_path / "link.riccap")
+    pcapFileName = str(tmp_path / "link.pcap")
+    writer = RICCaptureWriter(fileName)
+    writer.add(RICCaptureFile.DIR_TX, b"abc")
+    writer.add(RICCaptureFile.DIR_RX, b"defg")
+    writer.close()
+    assert RICCaptureFile.exportPcap(fileName, pcapFileName) == 2
+    pcap = pathlib.Path(pcapFileName).read_bytes()
+    magic, _, _, _, _, _, linkType = RICCaptureFile.PCAP_HEADER.unpack_from(pcap)
+    assert magic == RICCaptureFile.PCAP_MAGIC_NS and linkType == RICCaptureFile.PCAP_LINKTYPE_USER0
+    pos = RICCaptureFile.PCAP_HEADER.size
+    packets = []
+    while pos < len(pcap):
+        timeSecs, _, capLen, _ = RICCaptureFile.PCAP_REC_HEADER.unpack_from(pcap, pos)
+        pos += RICCaptureFile.PCAP_REC_HEADER.size
+        packets.append(pcap[pos:pos + capLen])
+        pos += capLen
+        assert abs(timeSecs - time.time()) < 60
+    assert packets == [b"\x00abc", b"\x01defg"]
+
+def test_replay_through_interface(tmp_path) -> None:
+    fileName = str(tmp_path / "link.riccap")
+    _writeCapture(fileName, 200)
+    comms = RICCommsReplay(fileName, realTime=False)
+    ricIF = RICInterface(comms)
+    reports = []
+    ricIF.setDecodedMsgCB(lambda decodedMsg, _: reports.append(decodedMsg.payload))
+    ricIF.open({})
+    try:
+        # Nothing is replayed until the command captured first is sent
+        assert not comms.waitReplayDone(0.2)
+        assert comms.getReplayStats()["rxFramesReplayed"] == 0
+        # The command gets message number 1 like when capturing so it gets the response
+        assert ricIF.cmdRICRESTURLSync("v") == {"rslt": "ok"}
+        assert comms.waitReplayDone(10)
+    finally:
+        ricIF.close()
+    assert len(reports) == 200 and ricIF.statsMatched == 1
+    replayStats = comms.getReplayStats()
+    assert replayStats["rxFramesReplayed"] == 201
+    assert comms.getLinkStats()["hdlcFramesRxOk"] == 201
+
+def test_replay_real_time(tmp_path) -> None:
+    fileName = str(tmp_path / "link.riccap")
+    _writeCapture(fileName, 5, gapSecs=0.05)
+    capturedSecs = list(RICCaptureFile.read(fileName))[-1].timeNs / 1e9
+    comms = RICCommsReplay(fileName)
+    ricIF = RICInterface(comms)
+    ricIF.open({})
+    try:
+        time.sleep(0.1)
+        assert ricIF.cmdRICRESTURLSync("v") == {"rslt": "ok"}
+        assert comms.waitReplayDone(10)
+    finally:
+        ricIF.close()
+    assert ricIF.statsMatched == 1
+    # Frames keep their captured timing from when the command was sent
+    assert comms.getReplayStats()["replaySecs"] >= 0.1 + capturedSecs * 0.8
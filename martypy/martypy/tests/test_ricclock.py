@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy import Marty
+from martypy.RICClock import RICVirtualClock
+from martypy.RICCommsSim import RICCommsSim
+from martypy.RICInterface import RICInterface
+from martypy.RICScheduler import RICScheduler
+
+def test_virtual_clock() -> None:
+    clock = RICVirtualClock(speed=100, startTime=1000)
+    realStart = time.monotonic()
+    monoStart = clock.monotonic()
+    clock.sleep(5)
+    assert time.monotonic() - realStart < 1
+    assert clock.monotonic() - monoStart >= 5
+    assert clock.time() >= 1005
+    # Wait time-outs are scaled
+    realStart = time.monotonic()
+    assert not clock.wait(threading.Event(), 10)
+    assert 0.09 <= time.monotonic() - realStart < 1
+    # Advancing wakes sleepers
+    clock = RICVirtualClock(speed=1)
+    threading.Timer(0.05, clock.advance, (60,)).start()
+    realStart = time.monotonic()
+    clock.sleep(30)
+    assert time.monotonic() - realStart < 1
+    assert clock.elapsed() >= 60
+
+def test_scheduler_on_virtual_clock() -> None:
+    clock = RICVirtualClock(speed=50)
+    scheduler = RICScheduler(clock)
+    calls = []
+    done = threading.Event()
+    scheduler.callLater(5, lambda: (calls.append(clock.elapsed()), done.set()))
+    realStart = time.monotonic()
+    assert done.wait(2)
+    assert time.monotonic() - realStart < 1
+    assert calls[0] >= 5
+    # Advancing wakes the scheduler thread for a job due in 100s of virtual time
+    clock = RICVirtualClock(speed=1)
+    scheduler = RICScheduler(clock)
+    done = threading.Event()
+    scheduler.callLater(100, done.set)
+    time.sleep(0.05)
+    clock.advance(100)
+    assert done.wait(1)
+    # And waits on Conditions with a predicate
+    cond = threading.Condition()
+    threading.Timer(0.05, clock.advance, (60,)).start()
+    realStart = time.monotonic()
+    with cond:
+        assert not clock.waitFor(cond, lambda: False, 30)
+    assert time.monotonic() - realStart < 1
+    scheduler.stop()
+
+def test_marty_sim_virtual_time() -> None:
+    clock = RICVirtualClock(speed=10)
+    realStart = time.monotonic()
+    marty = Marty("sim", clock=clock)
+    try:
+        # A walk taking 8s of virtual time
+        virtualStart = clock.monotonic()
+        assert marty.walk(4, move_time=2000)
+        assert clock.monotonic() - virtualStart >= 8
+        assert not marty.is_moving()
+        assert marty.get_power_status()["battRemainCapacityPercent"] == 80
+    finally:
+        marty.close()
+    assert time.monotonic() - realStart < 5
+
+def test_upload_virtual_time(tmp_path) -> None:
+    clock = RICVirtualClock(speed=10)
+    # 100KB over a 20KB/s link takes 5s of virtual time
+    comms = RICCommsSim(latencySecs=0.02, bandwidthBPS=20000, fileBlockMax=1000, fileBatchAck=5, clock=clock)
+    ricIF = RICInterface(comms, clock=clock)
+    ricIF.open({})
+    try:
+        fileName = os.path.join(tmp_path, "test.bin")
+        with open(fileName, "wb") as f:
+            f.write(os.urandom(100000))
+        realStart = time.monotonic()
+        virtualStart = clock.monotonic()
+        assert ricIF.sendFile(fileName)
+        assert comms.files["test.bin"] == 100000
+        assert clock.monotonic() - virtualStart >= 5
+        assert time.monotonic() - realStart < 3
+        assert 10000 < ricIF.uploadBytesPerSec.getAvg() < 25000
+    finally:
+        ricIF.close()
@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy import Marty, RICVirtualClock
+from martypy.RICInterface import RICInterface
+from martypy.RICCommsSim import RICCommsSim
+from martypy.RICROSSerial import RICROSSerial
+
+def _openRICIF(comms: RICCommsSim) -> RICInterface:
+    ricIF = RICInterface(comms)
+    ricIF.open({})
+    return ricIF
+
+def test_rosserial_encode() -> None:
+    payloads = {
+        RICROSSerial.ROSTOPIC_V2_ACCEL: RICROSSerial.encodeAccel(0.5, 0, 1, 19),
+        RICROSSerial.ROSTOPIC_V2_POWER_STATUS: RICROSSerial.encodePowerStatus(80, 25, 1600, 2000, -250, 600, 2, 20),
+        RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS: RICROSSerial.encodeRobotStatus(1, 3, 1000, 900, (0, 0, 0), 2, 10),
+    }
+    decoded = {}
+    RICROSSerial.decode(b"".join(RICROSSerial.encode(topicID, payload) for topicID, payload in payloads.items()),
+                0, lambda topicID, payload: decoded.update({topicID: payload}))
+    assert decoded == payloads
+    assert RICROSSerial.extractAccel(decoded[RICROSSerial.ROSTOPIC_V2_ACCEL]) == [0.5, 0, 1]
+    assert RICROSSerial.extractPowerStatus(decoded[RICROSSerial.ROSTOPIC_V2_POWER_STATUS])["battCurrentMA"] == -250
+    robotStatus = RICROSSerial.extractRobotStatus(decoded[RICROSSerial.ROSTOPIC_V2_ROBOT_STATUS])
+    assert robotStatus["isMoving"] and robotStatus["workQCount"] == 3
+
+def test_marty_sim() -> None:
+    marty = Marty("sim")
+    try:
+        assert marty.get_system_info()["SystemVersion"] == "1.2.0"
+        assert marty.get_accelerometer() == [0, 0, 1]
+        assert marty.get_power_status()["battRemainCapacityPercent"] == 80
+        # Trajectories keep the robot moving for their move time
+        startTime = time.time()
+        assert marty.walk(2, move_time=400)
+        assert time.time() - startTime >= 0.8
+        assert not marty.is_moving()
+        assert marty.move_joint("left arm", 30, 100)
+        time.sleep(0.5)
+        assert marty.get_joints()[6]["pos"] == 30
+        publishRates = marty.get_interface_stats()["windowStats"]["1s"]["publishRatesPS"]
+        assert publishRates["robot"] >= 5 and publishRates["imu"] >= 5
+    finally:
+        marty.close()
+
+def test_sim_sessions_stop_their_threads() -> None:
+    def numSchedulerThreads() -> int:
+        return len([thread for thread in threading.enumerate() if thread.name == "RICScheduler"])
+    numThreads = numSchedulerThreads()
+    for _ in range(3):
+        marty = Marty("sim", clock=RICVirtualClock(10))
+        assert marty.get_accelerometer() == [0, 0, 1]
+        marty.close()
+    assert numSchedulerThreads() == numThreads
+
+def test_link_latency_and_bandwidth() -> None:
+    ricIF = _openRICIF(RICCommsSim(latencySecs=0.05))
+    try:
+        startTime = time.time()
+        assert ricIF.cmdRICRESTURLSync("v")["rslt"] == "ok"
+        assert time.time() - startTime >= 0.1
+    finally:
+        ricIF.close()
+    # 10 frames of about 1000 bytes at 20000 bytes per second
+    ricIF = _openRICIF(RICCommsSim(latencySecs=0, bandwidthBPS=20000))
+    try:
+        startTime = time.time()
+        futures = [ricIF.submit("led/LEDeye/color/" + "a" * 1000) for _ in range(10)]
+        assert all(future.result(5)["rslt"] == "ok" for future in futures)
+        assert time.time() - startTime >= 0.45
+    finally:
+        ricIF.close()
+
+def test_link_keeps_order() -> None:
+    # Jitter delays frames by different amounts but they must still arrive in order
+    comms = RICCommsSim(latencySecs=0.001, jitterSecs=0.02, seed=4)
+    delivered = []
+    allDelivered = threading.Event()
+    def onDeliver(data: bytes) -> None:
+        delivered.append(data)
+        if len(delivered) == 200:
+            allDelivered.set()
+    for frameIdx in range(200):
+        comms._sendOverLink(RICCommsSim._DIR_TO_RIC, frameIdx.to_bytes(2, 'big'), 0, onDeliver)
+    assert allDelivered.wait(5)
+    assert delivered == [frameIdx.to_bytes(2, 'big') for frameIdx in range(200)]
+
+def test_upload_with_loss(tmp_path) -> None:
+    comms = RICCommsSim(latencySecs=0.002, lossRate=0.02, seed=1, fileBlockMax=1000, fileBatchAck=5,
+                ackTimeoutSecs=0.05)
+    ricIF = _openRICIF(comms)
+    fileName = tmp_path / "upload.bin"
+    fileName.write_bytes(os.urandom(50000))
+    try:
+        # Command frames can also be lost so the upload is retried like a user would
+        for _ in range(5):
+            try:
+                if ricIF.sendFile(str(fileName), None, "fs"):
+                    break
+            except Exception:
+                pass
+        assert comms.files == {"upload.bin": 50000}
+        assert comms.getSimStats()["framesLost"] > 0
+    finally:
+        ricIF.close()
+
+def test_stream_paced_by_sokto(tmp_path) -> None:
+    comms = RICCommsSim(latencySecs=0.002, streamBytesPerSec=20000, streamBufferBytes=2048)
+    ricIF = _openRICIF(comms)
+    fileName = tmp_path / "sound.mp3"
+    fileName.write_bytes(os.urandom(10000))
+    try:
+        startTime = time.time()
+        assert ricIF.streamSoundFile(str(fileName), "streamaudio")
+        # The buffer only takes 2048 bytes more than has been played
+        assert time.time() - startTime >= (10000 - 2048) / 20000
+    finally:
+        ricIF.close()
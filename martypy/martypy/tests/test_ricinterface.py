@@ -0,0 +1,77 @@
+import time
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.RICInterface import RICInterface
+from martypy.RICCommsSim import RICCommsSim
+from martypy.RICCommsTest import RICCommsTest
+
+class _PollingRICInterface(RICInterface):
+    # Waits for responses by polling every 10ms as was done before responses signalled an event
+    def waitForSyncResult(self, msgNum: int, msgSendTime: float, timeOutSecs: int):
+        while time.time() < msgSendTime + timeOutSecs:
+            with self._msgsOutstanding.lock:
+                msgRec = self._msgsOutstanding.get(msgNum)
+                if msgRec.respValid:
+                    self._msgsOutstanding.release(msgRec)
+                    return msgRec.resp.getJSONDict()
+            time.sleep(0.01)
+        return {"rslt":"failTimeout"}
+
+def _openRICIF(ricIFClass=RICInterface, respDelaySecs: float = 0) -> RICInterface:
+    ricIF = ricIFClass(RICCommsSim(latencySecs=respDelaySecs / 2))
+    ricIF.open({})
+    return ricIF
+
+def test_sync_commands_complete() -> None:
+    ricIF = _openRICIF()
+    assert ricIF.cmdRICRESTRslt("v")
+    assert ricIF.sendRICRESTCmdFrameSync('{"cmdName":"test"}') == {"rslt": "ok"}
+    resp = ricIF.addOnQueryRaw("LeftArm", b"\x01", 2)
+    assert resp == {"rslt": "ok", "dataRead": "0000"}
+    assert len(ricIF._rawQueryOutstanding) == 0
+    assert ricIF.getStats()["msgsInFlight"] == 0
+    ricIF.close()
+
+def test_sync_timeout() -> None:
+    ricIF = RICInterface(RICCommsTest())
+    startTime = time.time()
+    assert ricIF.cmdRICRESTURLSync("v", 0.05) == {"rslt": "failTimeout"}
+    assert 0.04 < time.time() - startTime < 1
+
+def test_sync_round_trip_benchmark(bench) -> None:
+    # Timed against waiting by polling with --bench
+    for name, ricIF in (("polling", _openRICIF(_PollingRICInterface)), ("event", _openRICIF())):
+        assert bench(ricIF.cmdRICRESTURLSync, "v", name=name)["rslt"] == "ok"
+        ricIF.close()
+
+def test_submit_and_gather() -> None:
+    ricIF = _openRICIF()
+    futures = [ricIF.submit(f"traj/joint?jointID={i}") for i in range(10)]
+    assert ricIF.gatherResults(futures) == [{"rslt": "ok"}] * 10
+    assert ricIF.gatherRslt([ricIF.submit("v")])
+    assert ricIF.getStats()["msgsInFlight"] == 0
+    ricIF.close()
+    # Unanswered messages complete with failTimeout when they expire
+    ricIF = RICInterface(RICCommsTest())
+    future = ricIF.submit("v", 0.05)
+    assert ricIF.gatherResults([future], 0.01) == [{"rslt": "failTimeout"}]
+    assert future.result(1) == {"rslt": "failTimeout"}
+    assert len(ricIF._msgsOutstanding) == 0
+    assert ricIF.getStats()["timedOut"] == 1
+    ricIF.commsHandler.close()
+
+def test_cmd_batch_pipelines() -> None:
+    ricIF = _openRICIF(respDelaySecs=0.2)
+    # Outside a batch each command waits for its response
+    assert ricIF.cmdRICRESTRslt("led/LEDfoot/off")
+    assert ricIF.getStats()["msgsInFlight"] == 0
+    # In a batch all are sent before any response arrives
+    ricIF.startCmdBatch()
+    for i in range(10):
+        assert ricIF.cmdRICRESTRslt(f"led/LEDfoot{i}/off")
+    assert ricIF.getStats()["msgsInFlight"] == 10
+    assert ricIF.endCmdBatch()
+    assert ricIF.getStats()["msgsInFlight"] == 0
+    ricIF.close()
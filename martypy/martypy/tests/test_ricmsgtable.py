@@ -0,0 +1,77 @@
+import threading
+import time
+import pytest
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.Exceptions import MartyCommandException
+from martypy.RICMsgTable import RICMsgTable
+from martypy.RICInterface import RICInterface
+from martypy.RICCommsTest import RICCommsTest
+from martypy.RICScheduler import RICScheduler
+
+def test_allocate_skips_in_flight() -> None:
+    table = RICMsgTable()
+    held = table.allocate(10, awaited=True)
+    assert held.msgNum == 1
+    for expMsgNum in range(2, 256):
+        msgRec = table.allocate(10)
+        assert msgRec.msgNum == expMsgNum
+        with table.lock:
+            table.release(msgRec)
+    # Message number 1 is still in flight so wrapping around skips it
+    assert table.allocate(10).msgNum == 2
+    assert table.statsCollisionsAvoided == 1
+    assert len(table) == 2 and 1 in table and 3 not in table
+
+def test_window_full_back_pressure() -> None:
+    table = RICMsgTable(windowFullWaitSecs=5)
+    msgRecs = [table.allocate(10) for _ in range(255)]
+    def releaseOne():
+        time.sleep(0.05)
+        with table.lock:
+            table.release(msgRecs[100])
+    threading.Thread(target=releaseOne).start()
+    assert table.allocate(10).msgNum == 101
+    assert table.statsWindowFullWaits == 1
+    table.windowFullWaitSecs = 0.05
+    with pytest.raises(MartyCommandException):
+        table.allocate(10)
+
+def test_window_full_doesnt_block_scheduler() -> None:
+    scheduler = RICScheduler()
+    ricIF = RICInterface(RICCommsTest(), scheduler=scheduler)
+    for _ in range(255):
+        ricIF.sendRICRESTURL("v")
+    # A send from the timer callback fails at once rather than blocking the scheduler
+    timerSends = []
+    ricIF.setTimerCB(lambda: timerSends.append(ricIF.sendRICRESTURL("subscription")))
+    jobsRun = threading.Event()
+    startTime = time.time()
+    scheduler.callLater(0, ricIF._onTimer)
+    scheduler.callLater(0, jobsRun.set)
+    try:
+        assert jobsRun.wait(5)
+        assert time.time() - startTime < 1
+        assert timerSends == []
+        assert ricIF._msgsOutstanding.statsWindowFullWaits == 1
+    finally:
+        ricIF.close()
+
+def test_late_response_not_matched_to_reused_num() -> None:
+    ricIF = RICInterface(RICCommsTest())
+    sent = ricIF.commsHandler.outputInfo["buf"]
+    # Sync request awaiting a slow response holds its message number
+    heldRec = ricIF._msgsOutstanding.allocate(10, awaited=True)
+    for _ in range(300):
+        ricIF.sendRICRESTURL("v")
+        ricIF._onRxFrameCB(bytearray([sent[-1][0]]) + b'\x42\x00{"rslt":"ok"}\0')
+    assert heldRec.msgNum not in [frame[0] for frame in sent]
+    assert not heldRec.respValid
+    ricIF._onRxFrameCB(bytearray([heldRec.msgNum]) + b'\x42\x00{"rslt":"ok","slow":1}\0')
+    assert ricIF.waitForSyncResult(heldRec.msgNum, heldRec.timeSent, 10) == {"rslt": "ok", "slow": 1}
+    stats = ricIF.getStats()
+    assert stats["msgsInFlight"] == 0
+    assert stats["msgNumCollisionsAvoided"] == 1
+    assert stats["unmatched"] == 0
@@ -0,0 +1,119 @@
+import json
+import sys
+import tracemalloc
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy import RICProtocols as RICProtocolsModule
+from martypy.RICProtocols import DecodedMsg, RICProtocols
+from martypy.RICInterface import RICInterface
+from martypy.RICFileSender import RICFileUpload
+from martypy.RICCommsTest import RICCommsTest
+
+class _RefDecodedMsg:
+    # Eagerly decoded, dict-backed message used before DecodedMsg was made lazy
+    def __init__(self) -> None:
+        self.errMsg = ""
+        self.msgNum = None
+        self.protocolID = None
+        self.isText = None
+        self.payload = None
+        self.restType = None
+        self.msgTypeCode = None
+
+def _refDecodeRICFrame(fr: bytes) -> _RefDecodedMsg:
+    msg = _RefDecodedMsg()
+    msg.msgNum = fr[0]
+    msg.protocolID = fr[1] & 0x3f
+    msg.msgTypeCode = fr[1] >> 6
+    if msg.protocolID == RICProtocols.PROTOCOL_RICREST:
+        msg.restType = fr[2]
+        if msg.restType == RICProtocols.RICREST_ELEM_CODE_URL or msg.restType == RICProtocols.RICREST_ELEM_CODE_JSON:
+            msg.isText = True
+            msg.payload = fr[3:].decode('ascii').rstrip('\x00')
+        else:
+            msg.isText = False
+            msg.payload = fr[3:]
+    elif msg.protocolID == RICProtocols.PROTOCOL_ROSSERIAL:
+        msg.isText = False
+        msg.payload = fr[2:]
+    return msg
+
+def _makeFrames():
+    rosSerialPayload = bytes(range(7)) + bytes(24) + bytes([0])
+    return [
+        bytearray(b'\x05\x42\x00' + json.dumps({"rslt": "ok", "files": ["a", "b"]}).encode() + b'\0'),
+        bytearray(b'\x00\xc2\x00{"msgKey":"12","hexRd":"0102"}\0'),
+        bytearray(b'\x07\x42\x03{"cmdName":"ufStatus"}\0\x01\x02'),
+        bytearray(b'\x00\x80' + rosSerialPayload),
+        bytearray(b'\x00\x81\x01\x02'),
+    ]
+
+def test_decode_matches_reference() -> None:
+    ricProtocols = RICProtocols()
+    for frame in _makeFrames():
+        ref = _refDecodeRICFrame(frame)
+        msg = ricProtocols.decodeRICFrame(frame)
+        assert msg.msgNum == ref.msgNum
+        assert msg.protocolID == ref.protocolID
+        assert msg.msgTypeCode == ref.msgTypeCode
+        assert msg.restType == ref.restType
+        assert msg.isText == ref.isText
+        assert msg.payload == ref.payload
+        assert msg.toString() == DecodedMsg.toString(ref)
+    assert ricProtocols.decodeRICFrame(b'\x01').errMsg != ""
+
+def test_setters_override_frame() -> None:
+    msg = DecodedMsg()
+    assert msg.msgNum is None and msg.payload is None
+    msg.setMsgNum(3)
+    msg.setPayload(True, '{"a":1}')
+    assert msg.msgNum == 3 and msg.isText and msg.payload == '{"a":1}'
+
+def test_decode_allocation_benchmark() -> None:
+    # Published ROSSERIAL frames at 10-50Hz are decoded whether or not the payload is used
+    frames = [bytearray(b'\x00\x80' + bytes(range(7)) + bytes(120) + bytes([i % 256])) for i in range(2000)]
+    ricProtocols = RICProtocols()
+    def measure(decodeFn):
+        tracemalloc.start()
+        msgs = [decodeFn(frame) for frame in frames]
+        memUsed, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return memUsed / len(msgs)
+    refBytesPerMsg = measure(_refDecodeRICFrame)
+    newBytesPerMsg = measure(ricProtocols.decodeRICFrame)
+    assert newBytesPerMsg < refBytesPerMsg / 2
+
+def test_json_parsed_once(monkeypatch) -> None:
+    numParses = [0]
+    def countingLoads(jsonStr):
+        numParses[0] += 1
+        return json.loads(jsonStr)
+    monkeypatch.setattr(RICProtocolsModule, "jsonLoads", countingLoads)
+    ricIF = RICInterface(RICCommsTest())
+    msgRec = ricIF._msgsOutstanding.allocate(10, awaited=True)
+    ricIF._onRxFrameCB(bytearray([msgRec.msgNum]) + b'\x42\x00{"rslt":"ok","hw":[1,2]}\0')
+    resp = ricIF.waitForSyncResult(msgRec.msgNum, msgRec.timeSent, 10)
+    assert resp == {"rslt": "ok", "hw": [1, 2]}
+    assert msgRec.resp.getJSONDict() is resp
+    assert numParses[0] == 1
+    # Unnumbered response is parsed on the rx thread and shared with the callback
+    rxMsgs = []
+    ricIF.setDecodedMsgCB(lambda msg, _: rxMsgs.append(msg))
+    ricIF._fileUpload = RICFileUpload("test.bin", 1000)
+    ricIF._onRxFrameCB(bytearray(b'\x00\x42\x00{"okto":100}\0'))
+    assert ricIF._fileUpload.okTo == 100
+    assert rxMsgs[0].getJSONDict() == {"okto": 100}
+    assert numParses[0] == 2
+
+def test_json_backends(monkeypatch) -> None:
+    msgText = '{"rslt":"ok","val":NaN}'
+    for backend in (RICProtocolsModule.orjson, None):
+        monkeypatch.setattr(RICProtocolsModule, "orjson", backend)
+        msg = DecodedMsg()
+        msg.setPayload(True, msgText)
+        assert msg.getJSONDict()["rslt"] == "ok"
+        assert msg.getJSONError() is None
+        msg.setPayload(True, "not json")
+        assert msg.getJSONDict() == {}
+        assert msg.getJSONError() is not None
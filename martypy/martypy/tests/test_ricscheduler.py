@@ -0,0 +1,78 @@
+import threading
+import time
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.RICScheduler import RICScheduler
+from martypy.RICInterface import RICInterface
+from martypy.RICCommsTest import RICCommsTest
+
+def test_jobs_run_in_deadline_order() -> None:
+    scheduler = RICScheduler()
+    ran = []
+    done = threading.Event()
+    scheduler.callLater(0.06, lambda: (ran.append("c"), done.set()))
+    scheduler.callLater(0.02, ran.append, "a")
+    cancelled = scheduler.callLater(0.03, ran.append, "x")
+    scheduler.callLater(0.04, ran.append, "b")
+    cancelled.cancel()
+    assert done.wait(1)
+    assert ran == ["a", "b", "c"]
+
+def test_periodic_job() -> None:
+    scheduler = RICScheduler()
+    ticks = []
+    job = scheduler.callEvery(0.01, lambda: ticks.append(time.monotonic()))
+    time.sleep(0.1)
+    job.cancel()
+    numTicks = len(ticks)
+    assert 5 <= numTicks <= 11
+    time.sleep(0.03)
+    assert len(ticks) == numTicks
+    # Exceptions in jobs don't stop the scheduler
+    scheduler.callLater(0, lambda: 1/0)
+    done = threading.Event()
+    scheduler.callLater(0.01, done.set)
+    assert done.wait(1)
+
+def test_messages_expire_at_their_timeout() -> None:
+    scheduler = RICScheduler()
+    ricIFs = [RICInterface(RICCommsTest(), scheduler) for _ in range(3)]
+    numThreads = threading.active_count()
+    startTime = time.monotonic()
+    futures = [ricIF.submit("v", 0.05) for ricIF in ricIFs]
+    for future in futures:
+        assert future.result(1) == {"rslt": "failTimeout"}
+    expirySecs = time.monotonic() - startTime
+    assert 0.04 < expirySecs < 0.5
+    assert all(len(ricIF._msgsOutstanding) == 0 for ricIF in ricIFs)
+    # All robots share the one scheduler thread
+    assert threading.active_count() <= numThreads + 1
+    # A message which gets its response has its expiry cancelled
+    ricIF = ricIFs[0]
+    future = ricIF.submit("v", 10)
+    ricIF._onRxFrameCB(bytearray([ricIF.commsHandler.outputInfo["buf"][-1][0]]) + b'\x42\x00{"rslt":"ok"}\0')
+    assert future.result(0) == {"rslt": "ok"}
+    assert ricIF.getStats()["unmatched"] == 0
+
+def test_stop() -> None:
+    scheduler = RICScheduler()
+    ran = []
+    scheduler.callEvery(0.01, ran.append, "tick")
+    scheduler.callLater(10, ran.append, "late")
+    time.sleep(0.05)
+    scheduler.stop()
+    numRan = len(ran)
+    assert scheduler.getNumPending() == 0
+    time.sleep(0.03)
+    assert len(ran) == numRan and "late" not in ran
+    # Adding a job starts it again
+    done = threading.Event()
+    scheduler.callLater(0, done.set)
+    assert done.wait(1)
+    scheduler.stop()
+
+def test_default_scheduler_shared() -> None:
+    assert RICInterface(RICCommsTest())._scheduler is RICScheduler.getDefault()
+    assert RICInterface(RICCommsTest())._scheduler is RICScheduler.getDefault()
@@ -0,0 +1,75 @@
+import os
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.RICClock import RICVirtualClock
+from martypy.RICCommsSim import RICCommsSim
+from martypy.RICInterface import RICInterface
+from martypy.RICStreamHandler import RICStreamHandler
+
+def _mp3Data(frameHeader: bytes, dataLen: int, id3Tag: bytes = b"") -> bytes:
+    return id3Tag + frameHeader + os.urandom(dataLen - len(id3Tag) - len(frameHeader))
+
+def _stream(tmp_path, data: bytes, **simArgs):
+    clock = RICVirtualClock(speed=10)
+    comms = RICCommsSim(clock=clock, **simArgs)
+    ricIF = RICInterface(comms, clock=clock)
+    ricIF.open({})
+    fileName = tmp_path / "sound.mp3"
+    fileName.write_bytes(data)
+    try:
+        assert ricIF.streamSoundFile(str(fileName), "streamaudio")
+        return ricIF.getStreamStats(), comms.getSimStats()
+    finally:
+        ricIF.close()
+
+def test_mp3_bitrate() -> None:
+    # MPEG-1 layer III 128kbits/s
+    assert RICStreamHandler._mp3BytesPerSec(memoryview(b"\xff\xfb\x90\x64" + bytes(100))) == 16000
+    # MPEG-2 layer III 64kbits/s after an ID3v2 tag of 200 bytes
+    id3Tag = b"ID3\x04\x00\x00\x00\x00\x01\x48" + bytes(200)
+    assert RICStreamHandler._mp3BytesPerSec(memoryview(id3Tag + b"\xff\xf3\x80\x64" + bytes(100))) == 8000
+    # Not an MP3 or not layer III
+    assert RICStreamHandler._mp3BytesPerSec(memoryview(b"RIFF" + bytes(100))) is None
+    assert RICStreamHandler._mp3BytesPerSec(memoryview(b"\xff\xfd\x90\x64" + bytes(100))) is None
+
+def test_stream_without_underruns(tmp_path) -> None:
+    # 5s of 64kbits/s audio over a link with latency and jitter
+    id3Tag = b"ID3\x04\x00\x00\x00\x00\x00\x10" + bytes(16)
+    data = _mp3Data(b"\xff\xfb\x50\x64", 40000, id3Tag)
+    streamStats, simStats = _stream(tmp_path, data, latencySecs=0.05, jitterSecs=0.05, seed=1,
+                streamBytesPerSec=8000, streamBufferBytes=16384)
+    assert streamStats["result"] == "ok"
+    assert streamStats["bytesAcked"] == 40000
+    assert simStats["streamUnderruns"] == 0
+    assert streamStats["underruns"] == 0
+    # The first second is sent at once then the rest at the bitrate
+    assert streamStats["prebufferSecs"] < 0.5
+    assert 3.5 < streamStats["durationSecs"] < 6
+    assert 50 <= streamStats["latencyAvgMS"] <= streamStats["latencyMaxMS"] < 500
+
+def test_stream_adapts_rate(tmp_path) -> None:
+    # No bitrate in the file so the default rate is used which is faster than RIC plays
+    streamStats, simStats = _stream(tmp_path, b"RIFF" + os.urandom(16000), latencySecs=0.01,
+                streamBytesPerSec=2000, streamBufferBytes=3072)
+    assert streamStats["result"] == "ok"
+    assert streamStats["bytesAcked"] == 16004
+    assert streamStats["rejects"] > 0
+    assert streamStats["bytesPerSec"] < 3000
+    assert simStats["streamUnderruns"] <= 2
+
+def test_stream_fails_if_not_played(tmp_path) -> None:
+    # RIC never plays so its buffer stays full and the stream times out
+    clock = RICVirtualClock(speed=10)
+    comms = RICCommsSim(clock=clock, latencySecs=0.01, streamBytesPerSec=0, streamBufferBytes=2048)
+    ricIF = RICInterface(comms, clock=clock)
+    ricIF.open({})
+    fileName = tmp_path / "sound.mp3"
+    fileName.write_bytes(b"RIFF" + os.urandom(8000))
+    try:
+        assert not ricIF.streamSoundFile(str(fileName), "streamaudio")
+        assert ricIF.getStreamStats()["result"] == "failTimeout"
+        assert ricIF.getStreamStats()["bytesAcked"] == 2048
+    finally:
+        ricIF.close()
@@ -0,0 +1,70 @@
+import json
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.RICInterface import RICInterface
+from martypy.RICTracer import RICTracer
+from martypy.RICCommsSim import RICCommsSim
+
+def _openRICIF() -> RICInterface:
+    ricIF = RICInterface(RICCommsSim(latencySecs=0.001))
+    ricIF.open({})
+    return ricIF
+
+def test_trace_stages() -> None:
+    ricIF = _openRICIF()
+    tracer = RICTracer()
+    ricIF.setTracer(tracer)
+    try:
+        assert ricIF.cmdRICRESTURLSync("v")["rslt"] == "ok"
+        assert ricIF.submit("traj/wave").result(5) == {"rslt": "ok"}
+        # Lost on the link so never answered
+        ricIF.commsHandler.lossRate = 1
+        ricIF.cmdRICRESTURLSync("led/LEDeye/off", timeOutSecs=0.1)
+    finally:
+        ricIF.close()
+    recs = tracer.getRecs()
+    assert [rec.name for rec in recs] == ["v", "traj/wave", "led/LEDeye/off"]
+    for rec in recs[:2]:
+        assert 0 < rec.encodeStartNs <= rec.encodeEndNs <= rec.writeEndNs <= rec.rxStartNs
+        assert rec.rxStartNs <= rec.rxFrameNs <= rec.matchNs <= rec.wakeNs
+        assert not rec.timedOut
+        assert [stage[0] for stage in tracer._getStages(rec)] == \
+                    ["encode", "write", "inFlight", "rxFrame", "dispatch", "wake"]
+    assert recs[2].timedOut and recs[2].matchNs == 0
+    summary = tracer.getStageSummary()
+    assert summary["wake"]["count"] == 2 and summary["encode"]["count"] == 3
+
+def test_chrome_trace_export(tmp_path) -> None:
+    ricIF = _openRICIF()
+    tracer = RICTracer()
+    ricIF.setTracer(tracer)
+    try:
+        ricIF.cmdRICRESTURLSync("v")
+    finally:
+        ricIF.close()
+    traceFile = tmp_path / "trace.json"
+    tracer.exportChromeTrace(str(traceFile))
+    events = json.loads(traceFile.read_text())["traceEvents"]
+    msgEvents = [event for event in events if event.get("cat") == "msg"]
+    assert [event["ph"] for event in msgEvents if event["name"] == "v"] == ["b", "e"]
+    assert len([event for event in msgEvents if event["ph"] == "b"]) == \
+                len([event for event in msgEvents if event["ph"] == "e"]) == 7
+    assert all(event["id"] == 1 for event in msgEvents)
+
+def test_tracing_disabled() -> None:
+    ricIF = _openRICIF()
+    tracer = RICTracer()
+    ricIF.setTracer(tracer)
+    ricIF.setTracer(None)
+    try:
+        msgRec = ricIF._allocMsg(10)
+        assert msgRec.trace is None
+        with ricIF._msgsOutstanding.lock:
+            ricIF._msgsOutstanding.release(msgRec)
+        assert ricIF.cmdRICRESTURLSync("v")["rslt"] == "ok"
+        assert ricIF.commsHandler.getRxFrameTiming() == (0, 0)
+    finally:
+        ricIF.close()
+    assert tracer.getRecs() == []
@@ -0,0 +1,167 @@
+import time
+import pytest
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.Exceptions import MartyConnectException
+from martypy.RICTxCoalescer import RICTxCoalescer
+from martypy.RICClock import RICVirtualClock
+from martypy.RICScheduler import RICScheduler
+from martypy.RICCommsWiFi import RICCommsWiFi
+from martypy.RICCommsSerial import RICCommsSerial
+from martypy.RICInterface import RICInterface
+from martypy.LikeHDLC import LikeHDLC
+
+class _FakeWebSocket:
+    def __init__(self) -> None:
+        self.frames = []
+
+    def writeBinary(self, inFrame: bytes) -> int:
+        self.frames.append(bytes(inFrame))
+        return len(inFrame)
+
+    def close(self) -> None:
+        pass
+
+class _FakeSerialDevice:
+    def __init__(self) -> None:
+        self.writes = []
+
+    def write(self, data: bytes) -> int:
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def close(self) -> None:
+        pass
+
+def _waitFor(condFn, timeOutSecs: float = 1) -> bool:
+    endTime = time.monotonic() + timeOutSecs
+    while not condFn():
+        if time.monotonic() > endTime:
+            return False
+        time.sleep(0.001)
+    return True
+
+def _countHDLCFrames(data: bytes) -> int:
+    frames = []
+    LikeHDLC(frames.append, lambda: None).decodeBuffer(data)
+    return len(frames)
+
+def test_window_budget_and_explicit_flush() -> None:
+    writes = []
+    coalescer = RICTxCoalescer(writes.append, 0.02, 10, RICScheduler())
+    # Frames within the window are written together when it ends
+    coalescer.add(b"ab")
+    coalescer.add(b"cd")
+    assert writes == []
+    assert _waitFor(lambda: len(writes) == 1)
+    assert writes == [b"abcd"]
+    # A frame that would exceed the byte budget writes the batch first
+    coalescer.add(b"123456")
+    coalescer.add(b"7890")
+    coalescer.add(b"x")
+    assert writes[1:] == [b"1234567890"]
+    coalescer.flush()
+    assert writes[2:] == [b"x"]
+    # Frames as big as the budget aren't held back
+    coalescer.add(b"y" * 10)
+    assert writes[-1] == b"y" * 10
+    stats = coalescer.getStats()
+    assert stats["framesIn"] == 6
+    assert stats["writes"] == len(writes)
+    assert stats["bytesOut"] == 4 + 11 + 10
+    assert stats["windowFlushes"] == 1
+    assert stats["budgetFlushes"] == 1
+    assert stats["explicitFlushes"] == 1
+    # Nothing is written when the window ends after a flush
+    time.sleep(0.05)
+    assert coalescer.getStats()["writes"] == len(writes)
+
+def test_window_write_failure_raised_on_next_add() -> None:
+    writes = []
+    def writeFn(data: bytes) -> None:
+        if data.startswith(b"fail"):
+            raise MartyConnectException("Link gone")
+        writes.append(data)
+    coalescer = RICTxCoalescer(writeFn, 0.01, 100, RICScheduler())
+    coalescer.add(b"fail")
+    coalescer.add(b"ab")
+    assert _waitFor(lambda: coalescer.getStats()["writeFailures"] == 1)
+    # The failure of the batch written at the end of its window is seen by the sender
+    with pytest.raises(MartyConnectException):
+        coalescer.add(b"cd")
+    coalescer.add(b"ef")
+    coalescer.flush()
+    assert writes == [b"ef"]
+    stats = coalescer.getStats()
+    assert stats["framesLost"] == 2
+    assert stats["writeFailures"] == 1
+
+def test_wifi_burst_sent_in_one_websocket_frame() -> None:
+    commsWiFi = RICCommsWiFi(None)
+    commsWiFi.webSocket = _FakeWebSocket()
+    commsWiFi._isOpen = True
+    commsWiFi._initTxCoalescing({"txCoalesceSecs": 0.05}, RICCommsWiFi.TX_COALESCE_MAX_BYTES_DEFAULT)
+    ricIF = RICInterface(commsWiFi)
+    for i in range(10):
+        ricIF.sendRICRESTURL(f"led/LEDfoot/color/{i}")
+    assert commsWiFi.webSocket.frames == []
+    assert _waitFor(lambda: len(commsWiFi.webSocket.frames) == 1)
+    assert _countHDLCFrames(commsWiFi.webSocket.frames[0]) == 10
+    # Latency-critical commands aren't held back
+    ricIF.sendRICRESTURL("led/LEDfoot/off")
+    ricIF.sendRICRESTURL("robot/stop")
+    assert len(commsWiFi.webSocket.frames) == 2
+    assert _countHDLCFrames(commsWiFi.webSocket.frames[1]) == 2
+    linkStats = commsWiFi.getLinkStats()
+    assert linkStats["txCoalesceFramesIn"] == 12
+    assert linkStats["txCoalesceWrites"] == 2
+    assert linkStats["txCoalesceFramesPerWrite"] == 6
+    assert linkStats["txCoalesceExplicitFlushes"] == 1
+    commsWiFi.close()
+
+def test_window_on_interface_scheduler() -> None:
+    # The window is timed by the interface's scheduler - here on a clock 100 times real time
+    commsWiFi = RICCommsWiFi(None)
+    commsWiFi.webSocket = _FakeWebSocket()
+    commsWiFi._isOpen = True
+    ricIF = RICInterface(commsWiFi, clock=RICVirtualClock(speed=100))
+    commsWiFi.setScheduler(ricIF._scheduler)
+    commsWiFi._initTxCoalescing({"txCoalesceSecs": 5}, RICCommsWiFi.TX_COALESCE_MAX_BYTES_DEFAULT)
+    startTime = time.monotonic()
+    ricIF.sendRICRESTURL("led/LEDfoot/color/1")
+    ricIF.sendRICRESTURL("led/LEDfoot/color/2")
+    assert _waitFor(lambda: len(commsWiFi.webSocket.frames) == 1)
+    assert time.monotonic() - startTime < 1
+    assert _countHDLCFrames(commsWiFi.webSocket.frames[0]) == 2
+    ricIF.close()
+
+def test_coalescing_off_by_default() -> None:
+    commsWiFi = RICCommsWiFi(None)
+    commsWiFi.webSocket = _FakeWebSocket()
+    commsWiFi._isOpen = True
+    commsWiFi._initTxCoalescing({}, RICCommsWiFi.TX_COALESCE_MAX_BYTES_DEFAULT)
+    commsWiFi.send(b"abc")
+    commsWiFi.send(b"def")
+    assert len(commsWiFi.webSocket.frames) == 2
+    assert "txCoalesceWrites" not in commsWiFi.getLinkStats()
+    commsWiFi.close()
+
+def test_serial_burst_sent_in_one_write() -> None:
+    commsSerial = RICCommsSerial()
+    commsSerial.serialDevice = _FakeSerialDevice()
+    commsSerial._isOpen = True
+    commsSerial._initTxCoalescing({"txCoalesceSecs": 10, "txCoalesceMaxBytes": 64},
+                RICCommsSerial.TX_COALESCE_MAX_BYTES_DEFAULT)
+    for _ in range(4):
+        commsSerial.send(b"0123456789")
+    assert commsSerial.serialDevice.writes == []
+    # The byte budget limits how much is held back
+    commsSerial.send(b"x" * 40)
+    assert len(commsSerial.serialDevice.writes) == 1
+    assert _countHDLCFrames(commsSerial.serialDevice.writes[0]) == 4
+    # Anything held back is written on close
+    serialDevice = commsSerial.serialDevice
+    commsSerial.close()
+    assert _countHDLCFrames(b"".join(serialDevice.writes)) == 5
@@ -0,0 +1,314 @@
+import threading
+import time
+import tracemalloc
+import zlib
+import pytest
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy import Marty
+from martypy.Exceptions import MartyTransferException
+from martypy.RICInterface import RICInterface
+from martypy.RICUploadManifest import RICUploadManifest
+from martypy.RICFileSender import RICFileSender, RICFileUpload
+from martypy.RICTransferManager import RICTransferJob, RICTransferManager
+from martypy.RICCommsSim import RICCommsSim
+
+class _BatchFileSender(RICFileSender):
+    # Sends a batch of blocks then checks for the okto every second as was done before the sliding window
+    def sendData(self, upload: RICFileUpload, fileData: memoryview, blockMaxSize: int, batchAckSize: int,
+                progressCB=None) -> bool:
+        ricIF = self._ricInterface
+        fileLen = len(fileData)
+        self.statsBlocksSent = 0
+        batchRetryCount = 0
+        while upload.okTo < fileLen:
+            sendFromPos = upload.okTo
+            batchStartPos = sendFromPos
+            batchSize = 1 if sendFromPos == 0 else batchAckSize
+            batchBlockIdx = 0
+            upload.waitForOkTo(0)
+            while batchBlockIdx < batchSize and sendFromPos < fileLen:
+                ricIF.sendRICRESTFileBlock(sendFromPos.to_bytes(4, 'big') +
+                            bytes(fileData[sendFromPos:sendFromPos+blockMaxSize]))
+                sendFromPos += blockMaxSize
+                batchBlockIdx += 1
+                self.statsBlocksSent += 1
+            timeNow = time.time()
+            while time.time() - timeNow < ricIF.BLOCK_ACK_TIMEOUT:
+                if ricIF._sendFileProgressCheckAbort(upload, progressCB, upload.okTo, fileLen):
+                    return False
+                if upload.waitForOkTo(0)[0]:
+                    batchRetryCount = 0
+                    break
+                time.sleep(1)
+            if upload.okTo <= batchStartPos:
+                batchRetryCount += 1
+                if batchRetryCount > ricIF.BATCH_RETRY_MAX:
+                    return False
+        return True
+
+def _makeFile(filePath: pathlib.Path, fileLen: int) -> int:
+    fileCRC = 0
+    chunk = bytes(range(256)) * 256
+    with open(filePath, "wb") as f:
+        for pos in range(0, fileLen, len(chunk)):
+            data = chunk[:fileLen - pos]
+            fileCRC = zlib.crc32(data, fileCRC)
+            f.write(data)
+    return fileCRC
+
+def _openSimRIC(comms: RICCommsSim = None) -> RICInterface:
+    ricIF = RICInterface(comms if comms is not None else RICCommsSim(latencySecs=0))
+    ricIF.open({})
+    return ricIF
+
+def _timeSendFile(ricIF: RICInterface, filePath: pathlib.Path, fileCRC: int, progressCB=None) -> float:
+    startTime = time.monotonic()
+    assert ricIF.sendFile(str(filePath), progressCB)
+    sendTime = time.monotonic() - startTime
+    upload = ricIF.commsHandler.uploads[-1]
+    assert upload["isEnded"]
+    assert upload["crc"] == fileCRC
+    ricIF.close()
+    return sendTime
+
+def _sendFilePeakMem(filePath: pathlib.Path) -> int:
+    # Small batches so the blocks in flight on the simulated link (the window) are few
+    ricIF = _openSimRIC(RICCommsSim(latencySecs=0, fileBatchAck=2))
+    tracemalloc.start()
+    try:
+        assert ricIF.sendFile(str(filePath))
+        _, peakMem = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        ricIF.close()
+    assert ricIF.commsHandler.uploads[-1]["isEnded"]
+    return peakMem
+
+def test_send_file_contents(tmp_path: pathlib.Path) -> None:
+    for fileLen in (0, 1, 4999, 5000, 5001, 123457):
+        filePath = tmp_path / f"file{fileLen}.bin"
+        fileCRC = _makeFile(filePath, fileLen)
+        ricIF = _openSimRIC()
+        try:
+            assert ricIF.sendFile(str(filePath))
+        finally:
+            ricIF.close()
+        upload = ricIF.commsHandler.uploads[-1]
+        assert upload["isEnded"]
+        assert upload["rxPos"] == fileLen
+        assert upload["crc"] == fileCRC
+        assert upload["blockCount"] == (fileLen + 4999) // 5000
+
+def test_send_file_memory_flat(tmp_path: pathlib.Path) -> None:
+    smallFile = tmp_path / "small.bin"
+    largeFile = tmp_path / "large.bin"
+    _makeFile(smallFile, 100_000)
+    _makeFile(largeFile, 16_000_000)
+    # Warm up so one-off allocations aren't counted
+    _sendFilePeakMem(smallFile)
+    smallPeak = _sendFilePeakMem(smallFile)
+    largePeak = _sendFilePeakMem(largeFile)
+    # Peak memory is a few blocks whatever the file size
+    assert largePeak < 200_000
+    assert largePeak < smallPeak + 50_000
+
+def test_sliding_window_benchmark(tmp_path: pathlib.Path, bench) -> None:
+    # 21 blocks - the batch sender sends a batch of 1 then 2 batches of 10 (timed with --bench,
+    # the link time is 0.21s)
+    filePath = tmp_path / "bench.bin"
+    fileCRC = _makeFile(filePath, 42000)
+    def sendFile(useBatchSender: bool) -> float:
+        ricIF = _openSimRIC(RICCommsSim(latencySecs=0.02, bandwidthBPS=200000, fileBlockMax=2000))
+        if useBatchSender:
+            ricIF._fileSender = _BatchFileSender(ricIF)
+        return _timeSendFile(ricIF, filePath, fileCRC)
+    bench(sendFile, True, name="batch")
+    bench(sendFile, False, name="slidingWindow")
+
+def test_sliding_window_resends_lost_data(tmp_path: pathlib.Path) -> None:
+    filePath = tmp_path / "lossy.bin"
+    fileCRC = _makeFile(filePath, 100000)
+    comms = RICCommsSim(latencySecs=0.005, fileBlockMax=2000, ackTimeoutSecs=0.05)
+    ricIF = _openSimRIC(comms)
+    lossStarts = []
+    def onProgress(sent: int, total: int, _) -> bool:
+        # Blocks and oktos sent between the okto for 20000 bytes and the next progress check are lost
+        comms.lossRate = 0
+        if sent >= 20000 and not lossStarts:
+            lossStarts.append(sent)
+            comms.lossRate = 1
+        return True
+    _timeSendFile(ricIF, filePath, fileCRC, onProgress)
+    assert comms.getSimStats()["framesLost"] > 0
+    assert ricIF.getStats()["uploadRetransmits"] >= 1
+
+def test_sliding_window_gives_up_without_okto(tmp_path: pathlib.Path) -> None:
+    filePath = tmp_path / "noack.bin"
+    _makeFile(filePath, 10000)
+    comms = RICCommsSim(latencySecs=0.005)
+    ricIF = _openSimRIC(comms)
+    ricIF.BLOCK_ACK_TIMEOUT = 0.2
+    def onProgress(sent: int, total: int, _) -> bool:
+        # Everything is lost once the upload has started
+        comms.lossRate = 1
+        return True
+    startTime = time.monotonic()
+    assert not ricIF.sendFile(str(filePath), onProgress)
+    assert time.monotonic() - startTime < 3
+    assert ricIF.getStats()["uploadTimeouts"] == ricIF.BATCH_RETRY_MAX + 1
+    ricIF.close()
+
+def _openSimMarty(comms: RICCommsSim, manifestPath: pathlib.Path) -> Marty:
+    marty = Marty("sim", blocking=True, subscribeRateHz=0, ricInterface=RICInterface(comms))
+    marty.client.uploadManifest = RICUploadManifest(str(manifestPath))
+    return marty
+
+def test_send_file_skip_if_same(tmp_path: pathlib.Path) -> None:
+    filePath = tmp_path / "tune.mp3"
+    fileCRC = _makeFile(filePath, 30000)
+    comms = RICCommsSim(latencySecs=0)
+    robotId = comms.systemInfo["SerialNo"]
+    marty = _openSimMarty(comms, tmp_path / "manifest.json")
+    assert marty.send_file(str(filePath), skip_if_same=True)
+    assert comms.uploads[-1]["crc"] == fileCRC
+    assert len(comms.uploads) == 1
+    # Identical file is skipped
+    progress = []
+    assert marty.send_file(str(filePath), lambda sent, total: progress.append((sent, total)) or True,
+                skip_if_same=True)
+    assert len(comms.uploads) == 1
+    assert progress == [(30000, 30000)]
+    # Sent again if changed, missing from the robot, deleted or skip_if_same isn't set
+    with open(filePath, "r+b") as f:
+        f.write(b"changed")
+    assert marty.send_file(str(filePath), skip_if_same=True)
+    assert len(comms.uploads) == 2
+    comms.files.clear()
+    assert marty.send_file(str(filePath), skip_if_same=True)
+    assert len(comms.uploads) == 3
+    assert marty.delete_file("tune.mp3")
+    assert RICUploadManifest(str(tmp_path / "manifest.json")).get(robotId, "tune.mp3") is None
+    assert marty.send_file(str(filePath), skip_if_same=True)
+    assert len(comms.uploads) == 4
+    assert marty.send_file(str(filePath))
+    assert len(comms.uploads) == 5
+    marty.close()
+
+def test_send_file_resume(tmp_path: pathlib.Path, monkeypatch) -> None:
+    filePath = tmp_path / "long.mp3"
+    fileCRC = _makeFile(filePath, 20000)
+    for supportsResume in (True, False):
+        comms = RICCommsSim(latencySecs=0.002, fileBlockMax=1000, fileBatchAck=2, uploadResume=supportsResume)
+        robotId = comms.systemInfo["SerialNo"]
+        marty = _openSimMarty(comms, tmp_path / f"manifest{supportsResume}.json")
+        # Interrupted upload
+        assert not marty.send_file(str(filePath), lambda sent, total: sent < 8000, skip_if_same=True)
+        okTo = marty.client.uploadManifest.get(robotId, "long.mp3")["okTo"]
+        assert 8000 <= okTo < 20000
+        # Failing again before any progress keeps the resume point
+        with monkeypatch.context() as patch:
+            def failingSendFile(*args, **kwargs):
+                raise MartyTransferException("Upload start not acknowledged")
+            patch.setattr(marty.client.ricIF, "sendFile", failingSendFile)
+            with pytest.raises(MartyTransferException):
+                marty.send_file(str(filePath), skip_if_same=True)
+        assert marty.client.uploadManifest.get(robotId, "long.mp3")["okTo"] == okTo
+        # Resumed where the firmware allows it
+        assert marty.send_file(str(filePath), skip_if_same=True)
+        upload = comms.uploads[-1]
+        assert upload["crc"] == fileCRC
+        if supportsResume:
+            assert upload["resumedFrom"] == okTo
+            assert upload["blockCount"] == (20000 - okTo) // 1000
+        else:
+            assert upload["resumedFrom"] is None
+            assert upload["blockCount"] == 20
+        assert marty.client.uploadManifest.get(robotId, "long.mp3")["okTo"] == 20000
+        marty.close()
+
+def test_upload_manifest_shared(tmp_path: pathlib.Path) -> None:
+    # Each manifest object is like a separate program sharing the file
+    manifestPath = str(tmp_path / "manifest.json")
+    def recordFiles(progIdx: int) -> None:
+        manifest = RICUploadManifest(manifestPath)
+        for fileIdx in range(50):
+            manifest.record("robot", f"file{progIdx}_{fileIdx}", fileIdx, "", fileIdx)
+    threads = [threading.Thread(target=recordFiles, args=(progIdx,)) for progIdx in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    manifest = RICUploadManifest(manifestPath)
+    assert all(manifest.get("robot", f"file{progIdx}_{fileIdx}") is not None
+                for progIdx in range(4) for fileIdx in range(50))
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
+
+def test_transfer_manager_priorities_and_progress(tmp_path: pathlib.Path) -> None:
+    fileCRCs = {}
+    for name in ("first.bin", "low.bin", "high.bin"):
+        fileCRCs[name] = _makeFile(tmp_path / name, 40000)
+    comms = RICCommsSim(latencySecs=0.005, bandwidthBPS=1000000, fileBlockMax=2000)
+    ricIF = _openSimRIC(comms)
+    progress = []
+    manager = RICTransferManager(ricIF, lambda prog, _: progress.append(prog))
+    jobs = [manager.add(str(tmp_path / "first.bin"))]
+    assert _waitForState(jobs[0], RICTransferJob.STATE_SENDING)
+    jobs.append(manager.add(str(tmp_path / "low.bin"), priority=-1))
+    jobs.append(manager.add(str(tmp_path / "high.bin"), priority=5))
+    assert manager.waitAll(10)
+    assert all(job.future.result() for job in jobs)
+    # Files waiting are sent in priority order
+    assert [upload["fileName"] for upload in comms.uploads] == ["first.bin", "high.bin", "low.bin"]
+    assert {upload["fileName"]: upload["crc"] for upload in comms.uploads} == fileCRCs
+    finalProgress = manager.getProgress()
+    assert finalProgress["filesDone"] == 3
+    assert finalProgress["bytesDone"] == finalProgress["bytesTotal"] == 120000
+    assert finalProgress["bytesPerSec"] > 0
+    assert finalProgress["etaSecs"] == 0
+    assert progress[-1]["filesDone"] == 3
+    assert any(prog["etaSecs"] is not None and prog["etaSecs"] > 0 for prog in progress)
+    # Upload state is held per transfer
+    assert ricIF._fileUpload is None
+    ricIF.close()
+
+def test_transfer_manager_cancel(tmp_path: pathlib.Path) -> None:
+    for name in ("slow.bin", "queued.bin", "next.bin"):
+        _makeFile(tmp_path / name, 200000)
+    comms = RICCommsSim(latencySecs=0.005, bandwidthBPS=200000, fileBlockMax=2000)
+    ricIF = _openSimRIC(comms)
+    manager = RICTransferManager(ricIF)
+    slowJob = manager.add(str(tmp_path / "slow.bin"))
+    queuedJob = manager.add(str(tmp_path / "queued.bin"))
+    nextJob = manager.add(str(tmp_path / "next.bin"))
+    # Queued job is removed without being started
+    assert queuedJob.cancel()
+    assert queuedJob.future.result(0) is False
+    # Job being sent stops promptly
+    assert _waitForState(slowJob, RICTransferJob.STATE_SENDING)
+    time.sleep(0.2)
+    cancelTime = time.monotonic()
+    assert slowJob.cancel()
+    assert slowJob.future.result(2) is False
+    assert time.monotonic() - cancelTime < 1
+    assert slowJob.state == RICTransferJob.STATE_CANCELLED
+    assert not slowJob.cancel()
+    # Later jobs are still sent
+    assert nextJob.future.result(10)
+    assert [upload["fileName"] for upload in comms.uploads] == ["slow.bin", "next.bin"]
+    assert comms.files == {"next.bin": 200000}
+    progress = manager.getProgress()
+    assert progress["filesCancelled"] == 2
+    assert progress["bytesTotal"] == progress["bytesDone"] == 200000
+    manager.close()
+    ricIF.close()
+
+def _waitForState(job: RICTransferJob, state: str, timeOutSecs: float = 5) -> bool:
+    endTime = time.monotonic() + timeOutSecs
+    while job.state != state:
+        if time.monotonic() > endTime:
+            return False
+        time.sleep(0.01)
+    return True
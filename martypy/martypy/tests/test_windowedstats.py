@@ -0,0 +1,112 @@
+import sys
+import pathlib
+cur_path = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(cur_path.parent.parent.resolve()))
+from martypy.WindowedStats import WindowedCounter, WindowedHistogram
+from martypy.RateAverager import RateAverager
+from martypy.ValueAverager import ValueAverager
+from martypy.RICHWElems import RICHwPublishMonitor
+from martypy.RICROSSerial import RICROSSerial
+from martypy.RICInterface import RICInterface
+from martypy.RICCommsTest import RICCommsTest
+
+class _FakeClock:
+    def __init__(self, timeNow: float = 1000.0) -> None:
+        self.timeNow = timeNow
+
+    def __call__(self) -> float:
+        return self.timeNow
+
+def test_counter_windows() -> None:
+    clock = _FakeClock()
+    counter = WindowedCounter(60, clock)
+    # 10 per second for 30 seconds then 100 per second for 5 seconds
+    for _ in range(30):
+        counter.add(10)
+        clock.timeNow += 1
+    for _ in range(5):
+        counter.add(100)
+        clock.timeNow += 1
+    assert counter.getRate(1) == 100
+    assert counter.getRate(10) == (5 * 100 + 5 * 10) / 10
+    # Only 35 seconds since the counter started
+    assert counter.getRate(60) == (30 * 10 + 5 * 100) / 35
+    assert counter.total == 800
+    # Slots are reused once they are older than the window
+    clock.timeNow += 100
+    counter.add()
+    assert counter.getRate(60) == 0
+    clock.timeNow += 1
+    assert counter.getRate(1) == 1
+
+def test_rate_read_has_no_side_effects() -> None:
+    clock = _FakeClock()
+    rate = RateAverager(1, clock)
+    for _ in range(50):
+        rate.addSample()
+    clock.timeNow += 1
+    # Two readers see the same value
+    assert rate.getAvg() == 50
+    assert rate.getAvg() == 50
+    clock.timeNow += 0.5
+    assert rate.getAvg() == 50
+    assert rate.getTotal() == 50
+
+def test_value_averager_ring() -> None:
+    averager = ValueAverager(4)
+    assert averager.getAvg() == 0
+    averager.add(2)
+    assert averager.getAvg() == 2
+    for val in (10, 20, 30, 40):
+        averager.add(val)
+    assert averager.getAvg() == 25
+
+def test_histogram_percentiles() -> None:
+    clock = _FakeClock()
+    hist = WindowedHistogram(WindowedHistogram.logBucketEdges(0.001, 10, 1.1), 60, clock)
+    # 1..100ms with a few slow values in an earlier second
+    for val in range(1, 101):
+        hist.add(val / 1000)
+    clock.timeNow += 5
+    for _ in range(3):
+        hist.add(2.0)
+    count, (p50, p95, p99) = hist.getPercentiles(1)
+    assert count == 3 and p50 == p99 and 2.0 <= p50 < 2.2
+    count, (p50, p95, p99) = hist.getPercentiles(10)
+    assert count == 103
+    assert 0.05 <= p50 < 0.05 * 1.1
+    assert 0.097 <= p95 < 0.1 * 1.1
+    assert 2.0 <= p99 < 2.2
+    assert hist.getPercentiles(10) == hist.getPercentiles(10)
+    clock.timeNow += 100
+    assert hist.getPercentiles(60) == (0, [0, 0, 0])
+
+def test_publish_rates() -> None:
+    monitor = RICHwPublishMonitor()
+    clock = _FakeClock()
+    monitor._pubCounters[RICROSSerial.ROSTOPIC_V2_ACCEL] = WindowedCounter(60, clock)
+    for _ in range(20):
+        for _ in range(10):
+            monitor.update(RICROSSerial.ROSTOPIC_V2_ACCEL)
+        clock.timeNow += 1
+    assert monitor.getPublishRates(1) == {"imu": 10}
+    assert monitor.getPublishStats() == {"imuPS": 10}
+
+def test_round_trip_percentiles_by_family() -> None:
+    ricIF = RICInterface(RICCommsTest())
+    for msg, rtTime in (("traj/dance", 0.05), ("traj/circle", 0.06), ("led/LEDeye/off", 0.01), ("filelist", 0.2)):
+        msgRec = ricIF._allocMsg(10, family=RICInterface._urlFamily(msg))
+        ricIF.newRoundTrip(rtTime, msgRec.family)
+        with ricIF._msgsOutstanding.lock:
+            ricIF._msgsOutstanding.release(msgRec)
+    ricIF.newRoundTrip(0.1, RICInterface._cmdFrameFamily('{"cmdName":"ufStart","fileLen":10}'))
+    stats = ricIF.getStats()
+    roundTrips = stats["windowStats"]["10s"]["roundTrips"]
+    assert set(roundTrips.keys()) == {"traj", "led", "filelist", "ufStart"}
+    assert roundTrips["traj"]["count"] == 2
+    assert 60 <= roundTrips["traj"]["p99MS"] < 66
+    assert 10 <= roundTrips["led"]["p50MS"] < 11
+    assert 200 <= stats["roundTripP99MS"] < 220
+    assert stats["windowStats"]["1s"].keys() == {"msgRxRatePS", "msgTxRatePS", "roundTrips"}
+    # Reading doesn't change the statistics
+    assert ricIF.getStats()["windowStats"]["60s"] == stats["windowStats"]["60s"]
@@ -28,6 +28,9 @@ setup(
         "tests": [
             "pytest",
         ],
+        "fastjson": [
+            "orjson",
+        ],
     },
     keywords=[
         'ros',